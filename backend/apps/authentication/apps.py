@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.authentication'
\ No newline at end of file
+    name = 'apps.authentication'
+
+    def ready(self):
+        from rest_framework_simplejwt.tokens import Token
+        from .keys import build_backend
+
+        # Every simplejwt token class signs and verifies through the key
+        # ring; keys are loaded here, before gunicorn forks its workers
+        Token._token_backend = build_backend()
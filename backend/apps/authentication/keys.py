@@ -0,0 +1,131 @@
+"""
+JWT signing and verification with a key ring.
+
+With ``HS256`` (the default) tokens are signed and verified with
+``SECRET_KEY``, as simplejwt does. With an asymmetric ``JWT_ALGORITHM``
+(``RS256``, ``ES256`` or ``EdDSA``) every ``*.pem`` file in
+``JWT_KEYS_DIR`` is a key named by its file name (``<kid>.pem`` or
+``<kid>.pub.pem``):
+
+- Tokens are signed with the private key ``JWT_SIGNING_KID`` and carry it
+  in their ``kid`` header.
+- Any key in the directory verifies the tokens carrying its ``kid``, so a
+  process that only verifies (Daphne, other services) needs nothing but
+  the public keys, or the JWKS document served at ``/api/auth/jwks.json``.
+
+Keys are parsed once per process and looked up by ``kid``, rather than
+handing ``jwt.decode`` PEM text to parse on every call as simplejwt does.
+"""
+import json
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms
+from rest_framework_simplejwt.backends import ALLOWED_ALGORITHMS, TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+ASYMMETRIC_ALGORITHMS = {'RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512', 'EdDSA'}
+
+
+def load_keys(directory):
+    """``{kid: (private_key or None, public_key)}`` for the PEM files in ``directory``."""
+    keys = {}
+    for path in sorted(Path(directory).glob('*.pem')):
+        kid = path.name.removesuffix('.pem').removesuffix('.pub')
+        data = path.read_bytes()
+        if b'PRIVATE KEY' in data:
+            private = load_pem_private_key(data, password=None)
+            keys[kid] = (private, private.public_key())
+        elif kid not in keys:
+            keys[kid] = (None, load_pem_public_key(data))
+    return keys
+
+
+class KeyRingBackend(TokenBackend):
+    """simplejwt's backend, signing with a ``kid`` and verifying with parsed keys."""
+
+    def __init__(self, algorithm, keys=None, signing_kid=None, **kwargs):
+        super().__init__(algorithm, **kwargs)
+        self.keys = keys or {}
+        self.signing_kid = signing_kid
+        self.asymmetric = algorithm in ASYMMETRIC_ALGORITHMS
+        if self.asymmetric and not self.keys:
+            raise ImproperlyConfigured(f'{algorithm} needs at least one key in JWT_KEYS_DIR')
+        if signing_kid and signing_kid not in self.keys:
+            raise ImproperlyConfigured(f'JWT_SIGNING_KID {signing_kid!r} is not in JWT_KEYS_DIR')
+        self.verifying_keys = {kid: public for kid, (_private, public) in self.keys.items()}
+        self._jwks = None
+
+    def _validate_algorithm(self, algorithm):
+        # simplejwt 5.3 does not list EdDSA, which PyJWT supports
+        if algorithm not in ALLOWED_ALGORITHMS | ASYMMETRIC_ALGORITHMS:
+            raise TokenBackendError(_("Unrecognized algorithm type '{}'").format(algorithm))
+
+    def get_verifying_key(self, token):
+        if not self.asymmetric:
+            return super().get_verifying_key(token)
+        kid = jwt.get_unverified_header(token).get('kid')
+        try:
+            return self.verifying_keys[kid]
+        except KeyError:
+            raise TokenBackendError(_('Token is invalid or expired')) from None
+
+    def encode(self, payload):
+        if not self.asymmetric:
+            return super().encode(payload)
+        private = self.keys.get(self.signing_kid, (None, None))[0]
+        if private is None:
+            raise TokenBackendError(_('This process holds no signing key'))
+
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+        return jwt.encode(
+            jwt_payload,
+            private,
+            algorithm=self.algorithm,
+            headers={'kid': self.signing_kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def jwks(self):
+        """The public keys as a JWK Set (empty for HMAC algorithms)."""
+        if self._jwks is None:
+            entries = []
+            if self.asymmetric:
+                algorithm = get_default_algorithms()[self.algorithm]
+                for kid, public in self.verifying_keys.items():
+                    entry = json.loads(algorithm.to_jwk(public))
+                    entry.update(kid=kid, alg=self.algorithm, use='sig')
+                    entries.append(entry)
+            self._jwks = {'keys': entries}
+        return self._jwks
+
+
+def build_backend():
+    algorithm = settings.JWT_ALGORITHM
+    asymmetric = algorithm in ASYMMETRIC_ALGORITHMS
+    return KeyRingBackend(
+        algorithm,
+        keys=load_keys(settings.JWT_KEYS_DIR) if asymmetric else None,
+        signing_kid=(settings.JWT_SIGNING_KID or None) if asymmetric else None,
+        signing_key=api_settings.SIGNING_KEY,
+        verifying_key=api_settings.VERIFYING_KEY,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+
+
+def active_backend():
+    """The backend installed by ``AuthenticationConfig.ready``."""
+    return Token._token_backend
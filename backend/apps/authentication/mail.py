@@ -0,0 +1,86 @@
+"""
+Batched outbound mail.
+
+Web workers never talk to SMTP. Instead, each queued email is parked in a
+short-lived cache bucket; the first email in a bucket schedules a single
+Celery flush, which delivers the whole bucket in chunks of
+``EMAIL_BATCH_SIZE`` messages, each chunk over one SMTP connection.
+"""
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from .tokens import make_verification_token
+
+VERIFICATION_BUCKET_PREFIX = 'mail:verify'
+
+
+def send_batched(messages, batch_size=None):
+    """Send ``messages`` reusing one connection per batch; return the number sent.
+
+    ``messages`` may be any iterable; it is consumed one batch at a time.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    messages = iter(messages)
+    sent = 0
+    while batch := list(islice(messages, batch_size)):
+        with get_connection() as connection:
+            sent += connection.send_messages(batch) or 0
+    return sent
+
+
+def build_verification_email(user):
+    token = make_verification_token(user)
+    context = {
+        'user': user,
+        'verification_url': settings.EMAIL_VERIFICATION_URL.format(token=token),
+    }
+    return EmailMessage(
+        subject='Verify your email address',
+        body=render_to_string('authentication/email/verify_email.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+def _bucket_timeout():
+    # Buckets outlive their flush by a wide margin so a delayed worker
+    # still finds the queued ids.
+    return settings.EMAIL_BATCH_WINDOW * 10 + 60
+
+
+def verification_bucket(now=None):
+    now = time.time() if now is None else now
+    return f'{VERIFICATION_BUCKET_PREFIX}:{int(now // settings.EMAIL_BATCH_WINDOW)}'
+
+
+def queue_verification_email(user_id):
+    """Queue a verification email for ``user_id`` in the current bucket."""
+    from .tasks import flush_verification_emails
+
+    bucket = verification_bucket()
+    timeout = _bucket_timeout()
+    cache.add(f'{bucket}:count', 0, timeout=timeout)
+    index = cache.incr(f'{bucket}:count')
+    cache.set(f'{bucket}:{index}', user_id, timeout=timeout)
+
+    if index == 1:
+        # The bucket closes at most EMAIL_BATCH_WINDOW seconds from now.
+        flush_verification_emails.apply_async(
+            args=[bucket],
+            countdown=settings.EMAIL_BATCH_WINDOW + 1
+        )
+    return bucket
+
+
+def drain_bucket(bucket):
+    """Remove and return the user ids queued in ``bucket``."""
+    count = cache.get(f'{bucket}:count') or 0
+    keys = [f'{bucket}:{index}' for index in range(1, count + 1)]
+    queued = cache.get_many(keys)
+    cache.delete_many(keys + [f'{bucket}:count'])
+    return [queued[key] for key in keys if key in queued]
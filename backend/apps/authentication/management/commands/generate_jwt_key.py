@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+GENERATORS = {
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def generate_key(algorithm):
+    return GENERATORS[algorithm]()
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a new signing key pair as <kid>.pem and <kid>.pub.pem. To '
+        'rotate, deploy the new public key to every verifying process, then '
+        'set JWT_SIGNING_KID to the new kid, and remove the old key once the '
+        'tokens it signed have expired (REFRESH_TOKEN_LIFETIME).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kid', help='Key id, carried in the kid header of the tokens it signs')
+        parser.add_argument('--algorithm', choices=sorted(GENERATORS), default=settings.JWT_ALGORITHM
+                            if settings.JWT_ALGORITHM in GENERATORS else 'EdDSA')
+        parser.add_argument('--dir', default=settings.JWT_KEYS_DIR, help='Directory to write the key files to')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'])
+        directory.mkdir(parents=True, exist_ok=True)
+        private_path = directory / f'{options["kid"]}.pem'
+        public_path = directory / f'{options["kid"]}.pub.pem'
+        if private_path.exists() or public_path.exists():
+            raise CommandError(f'Key {options["kid"]!r} already exists in {directory}')
+
+        key = generate_key(options['algorithm'])
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        # Private key readable by the owner only
+        fd = os.open(private_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(private_pem)
+        public_path.write_bytes(public_pem)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {private_path} and {public_path}; copy only the .pub.pem file to verifying hosts'
+        ))
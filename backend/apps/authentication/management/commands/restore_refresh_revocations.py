@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.authentication.refresh import restore_revocations, snapshot_revocations
+
+
+class Command(BaseCommand):
+    help = (
+        'Load unexpired blacklisted refresh tokens from the database into '
+        'the cache. Run after the cache was flushed or replaced, before '
+        'serving traffic, so revoked and rotated tokens stay refused. Use '
+        '--snapshot-first before a planned flush, with traffic stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot-first', action='store_true',
+                            help='Copy any journalled entries still in the cache to the database first')
+
+    def handle(self, *args, **options):
+        if options['snapshot_first']:
+            # The journal head is only settled by a previous run; two passes copy everything
+            written = snapshot_revocations() + snapshot_revocations()
+            self.stdout.write(f'Snapshotted {written} journal entries')
+        restored = restore_revocations()
+        self.stdout.write(self.style.SUCCESS(f'Restored {restored} revoked refresh tokens'))
@@ -0,0 +1,232 @@
+"""
+Refresh token rotation with its state in the cache instead of the database.
+
+Each refresh token's ``jti`` has one cache entry, kept until the token
+would expire anyway:
+
+- ``rotating``: a refresh of this token is in progress.
+- ``rotated``: it was exchanged for ``pair``. A repeat within
+  ``REFRESH_ROTATION_GRACE`` seconds (another tab holding the same token)
+  gets the same pair. Later repeats are refused.
+- ``revoked``: logged out.
+
+A forced logout (the bulk admin actions) stores, per user, the time
+before which that user's tokens are refused; see ``invalidate_user_tokens``.
+
+A refresh is one ``get`` and one ``add``/``set``, with no queries. Every
+rotation and revocation is also appended to a journal. The
+``snapshot_refresh_revocations`` task copies the journal into simplejwt's
+outstanding/blacklist tables, so Postgres keeps a durable record.
+``restore_revocations`` loads that record back after the cache is lost.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+ROTATING = 'rotating'
+ROTATED = 'rotated'
+REVOKED = 'revoked'
+
+JOURNAL_SEQ_KEY = 'refresh:journal:seq'
+JOURNAL_DONE_KEY = 'refresh:journal:done'
+JOURNAL_SETTLED_KEY = 'refresh:journal:settled'
+JOURNAL_TTL = 86400
+ROTATION_POLL = 0.05
+# Longest a concurrent refresh waits for the rotation in progress. Short and
+# independent of the grace window: the wait holds a sync worker, and the
+# other request may have died before storing its pair.
+ROTATION_WAIT = 1.5
+
+
+class CachedRefreshToken(Token):
+    """A refresh token whose revocation state lives in the cache.
+
+    Unlike simplejwt's ``RefreshToken`` it neither queries the blacklist on
+    decode nor inserts an ``OutstandingToken`` row when issued.
+    """
+
+    token_type = 'refresh'
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = RefreshToken.no_copy_claims
+    access_token_class = AccessToken
+    access_token = RefreshToken.access_token
+
+
+def state_key(jti):
+    return f'refresh:jti:{jti}'
+
+
+def valid_after_key(user_id):
+    return f'refresh:user:{user_id}:valid_after'
+
+
+def _remaining(token):
+    return max(1, int(token['exp'] - time.time()))
+
+
+def _journal(token, reason):
+    key = JOURNAL_SEQ_KEY
+    try:
+        seq = cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        seq = cache.incr(key)
+    cache.set(f'refresh:journal:{seq}', {
+        'jti': token[api_settings.JTI_CLAIM],
+        'user_id': token.get(api_settings.USER_ID_CLAIM),
+        'token': str(token),
+        'iat': token.get('iat'),
+        'exp': token['exp'],
+        'reason': reason,
+    }, timeout=JOURNAL_TTL)
+
+
+def _issue(token):
+    """The new access (and, when rotating, refresh) token for ``token``."""
+    data = {'access': str(token.access_token)}
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        rotated = CachedRefreshToken(str(token), verify=False)
+        rotated.set_jti()
+        rotated.set_exp()
+        rotated.set_iat()
+        data['refresh'] = str(rotated)
+    return data
+
+
+def _replay(key, state):
+    """The pair a concurrent refresh produced, if still within the grace window."""
+    deadline = time.monotonic() + min(ROTATION_WAIT, settings.REFRESH_ROTATION_GRACE)
+    while state and state['state'] == ROTATING and time.monotonic() < deadline:
+        time.sleep(ROTATION_POLL)
+        state = cache.get(key)
+    if state and state['state'] == ROTATED and time.time() - state['at'] <= settings.REFRESH_ROTATION_GRACE:
+        return state['pair']
+    raise TokenError('Token is blacklisted')
+
+
+def rotate(token):
+    """Exchange a verified refresh token, at most once per token."""
+    key = state_key(token[api_settings.JTI_CLAIM])
+    user_key = valid_after_key(token.get(api_settings.USER_ID_CLAIM))
+    found = cache.get_many([key, user_key])
+    # Same second as the logout counts as before it, as in issued_before_logout
+    if user_key in found and token.get('iat', 0) <= found[user_key]:
+        raise TokenError('Token is blacklisted')
+
+    state = found.get(key)
+    if not api_settings.ROTATE_REFRESH_TOKENS:
+        if state:
+            raise TokenError('Token is blacklisted')
+        return _issue(token)
+
+    if state is None and cache.add(key, {'state': ROTATING, 'at': time.time()}, timeout=_remaining(token)):
+        try:
+            pair = _issue(token)
+        except Exception:
+            cache.delete(key)
+            raise
+        cache.set(key, {'state': ROTATED, 'at': time.time(), 'pair': pair}, timeout=_remaining(token))
+        _journal(token, ROTATED)
+        return pair
+    return _replay(key, state if state is not None else cache.get(key))
+
+
+def revoke(token):
+    """Refuse any further refresh with ``token``."""
+    cache.set(state_key(token[api_settings.JTI_CLAIM]), {'state': REVOKED}, timeout=_remaining(token))
+    _journal(token, REVOKED)
+
+
+def invalidate_user_tokens(user_ids, at=None):
+    """Refuse refresh tokens of ``user_ids`` issued before ``at`` (default now).
+
+    Callers also store ``at`` in ``User.tokens_valid_after``, which access
+    token authentication checks and ``restore_revocations`` reloads from.
+    """
+    at = at or timezone.now()
+    cache.set_many(
+        {valid_after_key(user_id): int(at.timestamp()) for user_id in user_ids},
+        timeout=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    )
+
+
+def _persist(entries):
+    User = get_user_model()
+    user_ids = {entry['user_id'] for entry in entries}
+    existing_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    now = timezone.now()
+    with transaction.atomic():
+        OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                user_id=entry['user_id'] if entry['user_id'] in existing_users else None,
+                jti=entry['jti'],
+                token=entry['token'],
+                created_at=datetime_from_epoch(entry['iat']) if entry['iat'] else now,
+                expires_at=datetime_from_epoch(entry['exp']),
+            )
+            for entry in entries
+        ], ignore_conflicts=True)
+        outstanding = OutstandingToken.objects.filter(jti__in=[entry['jti'] for entry in entries])
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=pk) for pk in outstanding.values_list('pk', flat=True)],
+            ignore_conflicts=True
+        )
+
+
+def snapshot_revocations(batch_size=1000):
+    """Copy journalled rotations and revocations to the blacklist tables.
+
+    Only entries journalled before the previous run are copied: an entry's
+    sequence number is taken before the entry is written, so a newer one
+    may not be in the cache yet.
+    """
+    done = cache.get(JOURNAL_DONE_KEY) or 0
+    settled = cache.get(JOURNAL_SETTLED_KEY) or 0
+    cache.set(JOURNAL_SETTLED_KEY, cache.get(JOURNAL_SEQ_KEY) or 0, timeout=None)
+
+    written = 0
+    for start in range(done + 1, settled + 1, batch_size):
+        keys = [f'refresh:journal:{seq}' for seq in range(start, min(settled, start + batch_size - 1) + 1)]
+        # Missing entries have expired; nothing is left to copy for them
+        entries = list(cache.get_many(keys).values())
+        if entries:
+            _persist(entries)
+            written += len(entries)
+        cache.set(JOURNAL_DONE_KEY, start + len(keys) - 1, timeout=None)
+    return written
+
+
+def restore_revocations(batch_size=1000):
+    """Load unexpired blacklisted tokens into the cache, e.g. after a Redis flush."""
+    now = timezone.now()
+    blacklisted = (
+        OutstandingToken.objects
+        .filter(blacklistedtoken__isnull=False, expires_at__gt=now)
+        .values_list('jti', 'expires_at')
+    )
+    restored = 0
+    for jti, expires_at in blacklisted.iterator(chunk_size=batch_size):
+        timeout = max(1, int((expires_at - now).total_seconds()))
+        # Never replace a live rotation record, only fill gaps
+        cache.add(state_key(jti), {'state': REVOKED}, timeout=timeout)
+        restored += 1
+
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    logged_out = (
+        get_user_model().objects
+        .filter(tokens_valid_after__gt=now - lifetime)
+        .values_list('pk', 'tokens_valid_after')
+    )
+    for user_id, valid_after in logged_out.iterator(chunk_size=batch_size):
+        timeout = max(1, int((valid_after + lifetime - now).total_seconds()))
+        cache.add(valid_after_key(user_id), int(valid_after.timestamp()), timeout=timeout)
+    return restored
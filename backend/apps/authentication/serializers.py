@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate, get_user_model
+from django.core import signing
 from apps.users.serializers import UserCreateSerializer
+from .refresh import CachedRefreshToken, rotate
+from .tokens import read_verification_token
 
 User = get_user_model()
 
@@ -29,6 +32,14 @@ class RegisterSerializer(UserCreateSerializer):
     pass
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        return rotate(CachedRefreshToken(attrs['refresh']))
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True, min_length=8)
@@ -43,4 +54,16 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError("Old password is incorrect")
-        return value
\ No newline at end of file
+        return value
+
+
+class VerifyEmailSerializer(serializers.Serializer):
+    token = serializers.CharField(required=True)
+
+    def validate_token(self, value):
+        try:
+            return read_verification_token(value)
+        except signing.SignatureExpired:
+            raise serializers.ValidationError("Verification link has expired")
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid verification token")
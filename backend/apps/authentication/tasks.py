@@ -0,0 +1,35 @@
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .mail import build_verification_email, drain_bucket, send_batched
+from .refresh import snapshot_revocations
+
+User = get_user_model()
+
+
+def _unverified_users(user_ids, chunk_size):
+    for start in range(0, len(user_ids), chunk_size):
+        yield from User.objects.filter(
+            pk__in=user_ids[start:start + chunk_size],
+            is_active=True,
+            is_verified=False
+        ).only('id', 'email', 'first_name')
+
+
+@shared_task
+def flush_verification_emails(bucket):
+    """Deliver every verification email queued in ``bucket``."""
+    user_ids = drain_bucket(bucket)
+    batch_size = settings.EMAIL_BATCH_SIZE
+    messages = (
+        build_verification_email(user)
+        for user in _unverified_users(user_ids, batch_size)
+    )
+    return send_batched(messages, batch_size)
+
+
+@shared_task
+def snapshot_refresh_revocations():
+    """Persist refresh token rotations and revocations recorded in the cache."""
+    return snapshot_revocations()
@@ -1,17 +1,36 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, Token
 import json
-from tests.utils import generate_test_password
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+import jwt
+from tests.utils import generate_test_password, query_budget
+from .keys import KeyRingBackend, load_keys
+from .mail import queue_verification_email, send_batched, build_verification_email
+from .tasks import flush_verification_emails
+from .refresh import ROTATING, CachedRefreshToken, restore_revocations, snapshot_revocations, state_key
+from .throttling import parse_rate
+from .tokens import make_verification_token, read_verification_token
 
 User = get_user_model()
 
 
 class AuthenticationViewsTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.test_password = generate_test_password()
         self.user_data = {
             'email': 'test@example.com',
@@ -38,6 +57,16 @@ class AuthenticationViewsTest(APITestCase):
         self.assertIn('user', response.data)
         self.assertEqual(response.data['user']['email'], 'test@example.com')
 
+    def test_login_query_budget(self):
+        # User lookup; refresh tokens are not recorded per issue
+        with query_budget(1):
+            response = self.client.post(self.login_url, {
+                'email': 'test@example.com',
+                'password': self.test_password
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_login_with_invalid_credentials(self):
         wrong_password = generate_test_password()
         response = self.client.post(self.login_url, {
@@ -77,6 +106,22 @@ class AuthenticationViewsTest(APITestCase):
         user = User.objects.get(email='newuser@example.com')
         self.assertEqual(user.username, 'newuser')
 
+    def test_registration_query_budget(self):
+        password = generate_test_password()
+
+        # Username and email uniqueness checks, user insert
+        with query_budget(3):
+            response = self.client.post(self.register_url, {
+                'email': 'budget@example.com',
+                'username': 'budgetuser',
+                'first_name': 'Budget',
+                'last_name': 'User',
+                'password': password,
+                'password_confirm': password
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_registration_with_duplicate_email(self):
         duplicate_password = generate_test_password()
         duplicate_user_data = {
@@ -92,6 +137,25 @@ class AuthenticationViewsTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_login_and_registration_ignore_email_case(self):
+        response = self.client.post(self.login_url, {'email': ' Test@Example.COM', 'password': self.test_password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        password = generate_test_password()
+        response = self.client.post(self.register_url, {
+            'email': 'TEST@example.com', 'username': 'shouting', 'first_name': 'Loud', 'last_name': 'User',
+            'password': password, 'password_confirm': password,
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+        response = self.client.post(self.register_url, {
+            'email': 'New.User@Example.com', 'username': 'newuser', 'first_name': 'New', 'last_name': 'User',
+            'password': password, 'password_confirm': password,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['user']['email'], 'new.user@example.com')
+
     def test_registration_with_password_mismatch(self):
         password1 = generate_test_password()
         password2 = generate_test_password()
@@ -247,8 +311,123 @@ class AuthenticationViewsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+@override_settings(AUTH_THROTTLE_LOCKOUT=60, REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '4/min', 'login_email': '2/min', 'register_ip': '2/hour', 'register_email': '2/hour',
+        'resend_verification_ip': '4/hour', 'resend_verification_user': '2/hour',
+    },
+})
+class LoginThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = generate_test_password()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            first_name='Test',
+            last_name='User',
+            password=self.password
+        )
+        self.login_url = reverse('auth:login')
+        # Early in a window, so no attempt is discounted by a window change
+        clock = patch('apps.authentication.throttling.time')
+        clock.start().time.return_value = 1_800_000_005.0
+        self.addCleanup(clock.stop)
+
+    def login(self, email, password='wrong', ip='10.0.0.1'):
+        return self.client.post(self.login_url, {'email': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5/min'), (5, 60))
+        self.assertEqual(parse_rate('10/hour'), (10, 3600))
+
+    def test_failures_lock_out_the_email_from_that_address(self):
+        for _ in range(2):
+            self.assertEqual(self.login('Test@example.com').status_code, 400)
+
+        with patch('apps.authentication.serializers.authenticate') as mock_authenticate:
+            # Even the right password is refused from the failing address
+            response = self.login('test@example.com ', self.password)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+        mock_authenticate.assert_not_called()
+
+    def test_owner_not_locked_out_by_failures_from_elsewhere(self):
+        for index in range(3):
+            self.login('test@example.com', ip=f'10.0.0.{index}')
+
+        response = self.login('test@example.com', self.password, ip='10.0.1.1')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_successful_logins_not_counted(self):
+        for _ in range(3):
+            self.assertEqual(self.login('test@example.com', self.password).status_code, status.HTTP_200_OK)
+
+    def test_success_clears_failures(self):
+        self.login('test@example.com')
+        self.login('test@example.com', self.password)
+
+        for _ in range(2):
+            self.assertEqual(self.login('test@example.com').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login('test@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_ip_limit_spans_emails(self):
+        for index in range(4):
+            self.login(f'user{index}@example.com')
+
+        self.assertEqual(self.login('other@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('other@example.com', ip='10.0.0.2').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_throttled_attempt_runs_no_queries(self):
+        for _ in range(2):
+            self.login('test@example.com')
+
+        with self.assertNumQueries(0):
+            response = self.login('test@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_register_limited_per_ip(self):
+        register_url = reverse('auth:register')
+        for index in range(2):
+            self.client.post(register_url, {'email': f'new{index}@example.com'}, REMOTE_ADDR='10.0.0.9')
+
+        response = self.client.post(register_url, {'email': 'late@example.com'}, REMOTE_ADDR='10.0.0.9')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_register_limited_per_email(self):
+        register_url = reverse('auth:register')
+        for index in range(2):
+            self.client.post(register_url, {'email': 'new@example.com'}, REMOTE_ADDR=f'10.0.0.{index}')
+
+        response = self.client.post(register_url, {'email': 'NEW@example.com'}, REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @patch('apps.authentication.views.queue_verification_email')
+    def test_resend_verification_limited_per_user(self, mock_queue):
+        resend_url = reverse('auth:resend_verification')
+        other = User.objects.create_user(
+            email='other@example.com', username='other', first_name='Other', last_name='User', password=self.password
+        )
+        self.client.force_authenticate(user=self.user)
+        for index in range(2):
+            self.assertEqual(self.client.post(resend_url, REMOTE_ADDR=f'10.0.0.{index}').status_code, 200)
+
+        response = self.client.post(resend_url, REMOTE_ADDR='10.0.0.9')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(mock_queue.call_count, 2)
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.post(resend_url, REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+
 class TokenRefreshTest(APITestCase):
     def setUp(self):
+        cache.clear()
         test_password = generate_test_password()
         self.user_data = {
             'email': 'test@example.com',
@@ -270,9 +449,300 @@ class TokenRefreshTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
 
+    def test_token_refresh_query_budget(self):
+        refresh = RefreshToken.for_user(self.user)
+
+        # Rotation state is in the cache
+        with query_budget(0):
+            response = self.client.post(self.refresh_url, {'refresh': str(refresh)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_concurrent_refresh_gets_same_pair(self):
+        refresh = str(CachedRefreshToken.for_user(self.user))
+
+        first = self.client.post(self.refresh_url, {'refresh': refresh})
+        second = self.client.post(self.refresh_url, {'refresh': refresh})
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertNotEqual(first.data['refresh'], refresh)
+
+    @patch('apps.authentication.refresh.ROTATION_WAIT', 0.1)
+    def test_abandoned_rotation_is_not_waited_on_for_the_grace_window(self):
+        refresh = CachedRefreshToken.for_user(self.user)
+        # Left by a request that died between claiming the token and storing its pair
+        cache.set(state_key(refresh['jti']), {'state': ROTATING, 'at': time.time()})
+
+        started = time.monotonic()
+        response = self.client.post(self.refresh_url, {'refresh': str(refresh)})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertLess(time.monotonic() - started, 2)
+
+    @override_settings(REFRESH_ROTATION_GRACE=0)
+    def test_reuse_after_grace_is_rejected(self):
+        refresh = str(CachedRefreshToken.for_user(self.user))
+        self.client.post(self.refresh_url, {'refresh': refresh})
+
+        response = self.client.post(self.refresh_url, {'refresh': refresh})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_refresh_token(self):
+        refresh = CachedRefreshToken.for_user(self.user)
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('auth:logout'), {'refresh': str(refresh)})
+
+        response = self.client.post(self.refresh_url, {'refresh': str(refresh)})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_snapshot_survives_cache_loss(self):
+        refresh = CachedRefreshToken.for_user(self.user)
+        self.client.post(self.refresh_url, {'refresh': str(refresh)})
+
+        # The first run only marks what has settled; the next one copies it
+        self.assertEqual(snapshot_revocations(), 0)
+        self.assertEqual(snapshot_revocations(), 1)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=refresh['jti'], token__user=self.user).exists())
+        self.assertEqual(snapshot_revocations(), 0)
+
+        cache.clear()
+        self.assertEqual(restore_revocations(), 1)
+        response = self.client.post(self.refresh_url, {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_restore_command_snapshots_first(self):
+        refresh = CachedRefreshToken.for_user(self.user)
+        self.client.post(self.refresh_url, {'refresh': str(refresh)})
+        out = StringIO()
+
+        call_command('restore_refresh_revocations', snapshot_first=True, stdout=out)
+
+        self.assertIn('Snapshotted 1 journal entries', out.getvalue())
+        self.assertIn('Restored 1 revoked refresh tokens', out.getvalue())
+
     def test_token_refresh_with_invalid_token(self):
         response = self.client.post(self.refresh_url, {
             'refresh': 'invalid_refresh_token'
         })
         
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class KeyRingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='keys@example.com', username='keys', first_name='Key', last_name='Ring',
+            password=generate_test_password()
+        )
+        self.keys_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.keys_dir)
+        for kid in ('2024-01', '2024-02'):
+            call_command('generate_jwt_key', kid, algorithm='EdDSA', dir=self.keys_dir, stdout=StringIO())
+
+    def use_backend(self, backend):
+        patcher = patch.object(Token, '_token_backend', backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backend(self, signing_kid, keys=None):
+        return KeyRingBackend('EdDSA', keys=keys or load_keys(self.keys_dir), signing_kid=signing_kid)
+
+    def test_tokens_carry_kid_and_authenticate(self):
+        self.use_backend(self.backend('2024-02'))
+        access = AccessToken.for_user(self.user)
+
+        self.assertEqual(jwt.get_unverified_header(str(access))['kid'], '2024-02')
+        response = self.client.get(reverse('users:me'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tokens_of_retired_signing_key_still_verify(self):
+        self.use_backend(self.backend('2024-01'))
+        old = str(AccessToken.for_user(self.user))
+        self.use_backend(self.backend('2024-02'))
+
+        self.assertEqual(AccessToken(old)['user_id'], self.user.id)
+
+    def test_verifying_process_needs_only_public_keys(self):
+        token = self.backend('2024-02').encode({'user_id': 1, 'token_type': 'access'})
+        public_only = {kid: (None, public) for kid, (_private, public) in load_keys(self.keys_dir).items()}
+        verifier = self.backend(None, keys=public_only)
+
+        self.assertEqual(verifier.decode(token)['user_id'], 1)
+        with self.assertRaises(TokenBackendError):
+            verifier.encode({'user_id': 1})
+
+    def test_rejects_unknown_kid_and_hmac_tokens(self):
+        hmac_token = str(AccessToken.for_user(self.user))
+        self.use_backend(self.backend('2024-02', keys={
+            kid: pair for kid, pair in load_keys(self.keys_dir).items() if kid == '2024-02'
+        }))
+        with self.assertRaises(TokenError):
+            AccessToken(hmac_token)
+
+        other = self.backend('2024-01').encode({'user_id': 1, 'token_type': 'access', 'exp': 2_000_000_000})
+        with self.assertRaises(TokenError):
+            AccessToken(other)
+
+    def test_jwks_verifies_issued_tokens(self):
+        self.use_backend(self.backend('2024-02'))
+        access = str(AccessToken.for_user(self.user))
+
+        response = self.client.get(reverse('auth:jwks'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('public', response['Cache-Control'])
+        keys = {entry['kid']: entry for entry in response.json()['keys']}
+        self.assertEqual(set(keys), {'2024-01', '2024-02'})
+        self.assertNotIn('d', keys['2024-02'])
+        public = jwt.PyJWK(keys['2024-02']).key
+        self.assertEqual(jwt.decode(access, public, algorithms=['EdDSA'])['user_id'], self.user.id)
+
+
+class EmailVerificationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            first_name='Test',
+            last_name='User',
+            password=generate_test_password()
+        )
+        self.verify_url = reverse('auth:verify_email')
+        self.resend_url = reverse('auth:resend_verification')
+
+    def test_token_round_trip(self):
+        token = make_verification_token(self.user)
+        self.assertEqual(read_verification_token(token), (self.user.pk, 'test@example.com'))
+
+    def test_verify_email(self):
+        token = make_verification_token(self.user)
+
+        response = self.client.post(self.verify_url, {'token': token})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_verify_email_with_tampered_token(self):
+        token = make_verification_token(self.user)
+
+        response = self.client.post(self.verify_url, {'token': token[:-2] + 'xx'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_verified)
+
+    @override_settings(EMAIL_VERIFICATION_TOKEN_MAX_AGE=-1)
+    def test_verify_email_with_expired_token(self):
+        token = make_verification_token(self.user)
+
+        response = self.client.post(self.verify_url, {'token': token})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verify_email_after_email_change(self):
+        token = make_verification_token(self.user)
+        self.user.email = 'changed@example.com'
+        self.user.save()
+
+        response = self.client.post(self.verify_url, {'token': token})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Invalid token')
+
+    @patch('apps.authentication.views.queue_verification_email')
+    def test_registration_queues_verification_email(self, mock_queue):
+        password = generate_test_password()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('auth:register'), {
+                'email': 'newuser@example.com',
+                'username': 'newuser',
+                'first_name': 'New',
+                'last_name': 'User',
+                'password': password,
+                'password_confirm': password
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_queue.assert_called_once_with(User.objects.get(email='newuser@example.com').pk)
+
+    @patch('apps.authentication.tasks.flush_verification_emails.apply_async')
+    @patch('apps.authentication.mail.verification_bucket', return_value='mail:verify:test')
+    def test_queued_emails_share_one_flush(self, mock_bucket, mock_apply_async):
+        users = [self.user] + [
+            User.objects.create_user(
+                email=f'user{i}@example.com',
+                username=f'user{i}',
+                first_name='User',
+                last_name=str(i),
+                password=generate_test_password()
+            )
+            for i in range(2)
+        ]
+
+        buckets = {queue_verification_email(user.pk) for user in users}
+
+        self.assertEqual(len(buckets), 1)
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args[1]['args'], [buckets.pop()])
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    @patch('apps.authentication.tasks.flush_verification_emails.apply_async')
+    def test_flush_sends_one_connection_per_batch(self, mock_apply_async):
+        for i in range(4):
+            User.objects.create_user(
+                email=f'user{i}@example.com',
+                username=f'user{i}',
+                first_name='User',
+                last_name=str(i),
+                password=generate_test_password()
+            )
+        verified = User.objects.get(email='user0@example.com')
+        verified.is_verified = True
+        verified.save()
+
+        with patch('apps.authentication.mail.verification_bucket', return_value='mail:verify:test'):
+            for user in User.objects.all():
+                bucket = queue_verification_email(user.pk)
+
+        with patch('apps.authentication.mail.get_connection', wraps=mail.get_connection) as mock_connection:
+            sent = flush_verification_emails(bucket)
+
+        self.assertEqual(sent, 4)
+        self.assertEqual(mock_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertNotIn('user0@example.com', [message.to[0] for message in mail.outbox])
+        # The bucket is drained, so a duplicate flush sends nothing.
+        self.assertEqual(flush_verification_emails(bucket), 0)
+
+    def test_verification_email_contains_link(self):
+        message = build_verification_email(self.user)
+        token = message.body.split('token=')[1].split()[0]
+
+        self.assertEqual(message.to, ['test@example.com'])
+        self.assertEqual(read_verification_token(token), (self.user.pk, 'test@example.com'))
+
+    def test_send_batched_empty(self):
+        self.assertEqual(send_batched([]), 0)
+
+    @patch('apps.authentication.views.queue_verification_email')
+    def test_resend_verification(self, mock_queue):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(self.resend_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_queue.assert_called_once_with(self.user.pk)
+
+    def test_resend_verification_when_verified(self):
+        self.user.is_verified = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(self.resend_url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,154 @@
+"""
+Sliding-window throttles for the auth endpoints.
+
+Views opt in with ``throttle_scope``. Each ``<scope>_<kind>`` entry in
+``DEFAULT_THROTTLE_RATES`` adds a limit, where kind is ``ip`` (the client
+address), ``email`` (the submitted email, hashed) or ``user`` (the
+authenticated user). Throttles run before the view, so throttled attempts
+never reach password hashing or queue emails.
+
+Each limit keeps two fixed-window counters in the cache. The sliding
+count is the current window plus the previous window weighted by how much
+of it still overlaps. A client over any limit is locked out for
+``AUTH_THROTTLE_LOCKOUT`` seconds; an email limit locks out only the
+client address that exceeded it, so nobody can lock an account's owner
+out by sending its email. A check is one ``get_many``, plus one ``incr``
+per limit when the request is allowed.
+
+Kinds listed in a view's ``throttle_failures_only`` are not counted per
+request: the view calls ``record_failure`` when credentials are rejected
+and ``reset`` when they are accepted. Only the lockout is checked for
+them before the view.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """``'5/min'`` -> ``(5, 60)``, in DRF's rate format."""
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+def throttle_scope(scope):
+    """Set ``throttle_scope`` on an ``@api_view`` function; apply above ``@api_view``."""
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    kinds = ('ip', 'email', 'user')
+
+    def __init__(self):
+        self.retry_after = None
+
+    def identify(self, kind, request):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'user':
+            return request.user.pk if request.user.is_authenticated else None
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return hashlib.blake2b(email.strip().lower().encode(), digest_size=16).hexdigest()
+
+    def limits(self, request, view):
+        """``[(key, kind, num_requests, duration), ...]`` that apply to this request."""
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return []
+        limits = []
+        for kind in self.kinds:
+            rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{kind}')
+            ident = rate and self.identify(kind, request)
+            if ident:
+                limits.append((f'throttle:{scope}_{kind}:{ident}', kind, *parse_rate(rate)))
+        return limits
+
+    def lock_key(self, key, kind, request):
+        if kind in ('ip', 'user'):
+            return f'{key}:lock'
+        return f'{key}:lock:{self.get_ident(request)}'
+
+    def lock(self, key, kind, request, now):
+        lockout = settings.AUTH_THROTTLE_LOCKOUT
+        if lockout > 0:
+            cache.set(self.lock_key(key, kind, request), now + lockout, timeout=lockout)
+        return lockout
+
+    def count(self, values, key, duration, now):
+        window = int(now // duration)
+        overlap = 1 - (now / duration - window)
+        return values.get(f'{key}:{window}', 0) + values.get(f'{key}:{window - 1}', 0) * overlap, overlap
+
+    def increment(self, key, duration, now):
+        counter = f'{key}:{int(now // duration)}'
+        # Kept for two windows: the next one still weighs this count
+        if not cache.add(counter, 1, timeout=duration * 2):
+            try:
+                cache.incr(counter)
+            except ValueError:
+                cache.add(counter, 1, timeout=duration * 2)
+
+    def allow_request(self, request, view):
+        limits = self.limits(request, view)
+        if not limits:
+            return True
+
+        failures_only = getattr(view, 'throttle_failures_only', ())
+        now = time.time()
+        keys = []
+        for key, kind, _, duration in limits:
+            window = int(now // duration)
+            keys += [self.lock_key(key, kind, request), f'{key}:{window}', f'{key}:{window - 1}']
+        values = cache.get_many(keys)
+
+        for key, kind, num_requests, duration in limits:
+            locked_until = values.get(self.lock_key(key, kind, request))
+            if locked_until:
+                self.retry_after = max(0.0, locked_until - now)
+                return False
+            if kind in failures_only and settings.AUTH_THROTTLE_LOCKOUT > 0:
+                # Counted by record_failure, which sets the lock
+                continue
+            count, overlap = self.count(values, key, duration, now)
+            if count >= num_requests:
+                self.retry_after = self.lock(key, kind, request, now) or duration * overlap
+                return False
+
+        for key, kind, _, duration in limits:
+            if kind not in failures_only:
+                self.increment(key, duration, now)
+        return True
+
+    def record_failure(self, request, view):
+        """Count a rejected attempt; lock the client out once it reaches a limit."""
+        now = time.time()
+        for key, kind, num_requests, duration in self.limits(request, view):
+            if kind not in getattr(view, 'throttle_failures_only', ()):
+                continue
+            self.increment(key, duration, now)
+            window = int(now // duration)
+            count, _ = self.count(cache.get_many([f'{key}:{window}', f'{key}:{window - 1}']), key, duration, now)
+            if count >= num_requests:
+                self.lock(key, kind, request, now)
+
+    def reset(self, request, view):
+        """Forget the failures counted for this request's identities."""
+        now = time.time()
+        for key, kind, _, duration in self.limits(request, view):
+            if kind in getattr(view, 'throttle_failures_only', ()):
+                window = int(now // duration)
+                cache.delete_many([f'{key}:{window}', f'{key}:{window - 1}'])
+
+    def wait(self):
+        return self.retry_after
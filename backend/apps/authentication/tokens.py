@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core import signing
+
+EMAIL_VERIFICATION_SALT = 'apps.authentication.email_verification'
+
+
+def make_verification_token(user):
+    """Create a signed, timestamped email verification token.
+
+    The token carries the user id and the email it was issued for, so
+    verifying it needs no token table and a later email change invalidates it.
+    """
+    return signing.dumps(
+        {'uid': user.pk, 'email': user.email},
+        salt=EMAIL_VERIFICATION_SALT,
+        compress=True
+    )
+
+
+def read_verification_token(token):
+    """Return ``(user_id, email)`` from a verification token.
+
+    Raises ``signing.BadSignature`` (or its subclass ``SignatureExpired``)
+    when the token is tampered with or older than
+    ``EMAIL_VERIFICATION_TOKEN_MAX_AGE``.
+    """
+    data = signing.loads(
+        token,
+        salt=EMAIL_VERIFICATION_SALT,
+        max_age=settings.EMAIL_VERIFICATION_TOKEN_MAX_AGE
+    )
+    return data['uid'], data['email']
@@ -1,13 +1,15 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 from . import views
 
 app_name = 'auth'
 
 urlpatterns = [
     path('login/', views.CustomTokenObtainPairView.as_view(), name='login'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh/', views.TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', views.register, name='register'),
     path('logout/', views.logout, name='logout'),
     path('change-password/', views.change_password, name='change_password'),
+    path('verify-email/', views.verify_email, name='verify_email'),
+    path('resend-verification/', views.resend_verification, name='resend_verification'),
+    path('jwks.json', views.jwks, name='jwks'),
 ]
\ No newline at end of file
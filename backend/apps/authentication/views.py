@@ -1,44 +1,70 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenViewBase
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
 from apps.users.serializers import UserSerializer
-from .serializers import LoginSerializer, RegisterSerializer, ChangePasswordSerializer
+from .keys import active_backend
+from .mail import queue_verification_email
+from .refresh import CachedRefreshToken, revoke
+from .serializers import (
+    LoginSerializer, RegisterSerializer, ChangePasswordSerializer, VerifyEmailSerializer, TokenRefreshSerializer
+)
+from .throttling import SlidingWindowThrottle, throttle_scope
 
 User = get_user_model()
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
+    # A correct password never counts against the email's limit
+    throttle_failures_only = ('email',)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError:
+            SlidingWindowThrottle().record_failure(request, self)
+            raise
+        SlidingWindowThrottle().reset(request, self)
         user = serializer.validated_data['user']
         
-        refresh = RefreshToken.for_user(user)
+        refresh = CachedRefreshToken.for_user(user)
         
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
-            'user': UserSerializer(user).data
+            'user': UserSerializer.represent(user)
         })
 
 
+class TokenRefreshView(TokenViewBase):
+    serializer_class = TokenRefreshSerializer
+
+
+@throttle_scope('register')
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        transaction.on_commit(lambda: queue_verification_email(user.pk))
+        refresh = CachedRefreshToken.for_user(user)
         
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
-            'user': UserSerializer(user).data
+            'user': UserSerializer.represent(user)
         }, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -49,8 +75,7 @@ def register(request):
 def logout(request):
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
-        token.blacklist()
+        revoke(CachedRefreshToken(refresh_token))
         return Response({"message": "Successfully logged out"}, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
@@ -66,4 +91,40 @@ def change_password(request):
         user.save()
         return Response({"message": "Password changed successfully"}, status=status.HTTP_200_OK)
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def verify_email(request):
+    serializer = VerifyEmailSerializer(data=request.data)
+    if serializer.is_valid():
+        user_id, email = serializer.validated_data['token']
+        # The token is self-contained, so verification is a single UPDATE.
+        updated = User.objects.filter(pk=user_id, email=email).update(
+            is_verified=True,
+            updated_at=timezone.now()
+        )
+        if updated:
+            return Response({"message": "Email verified successfully"}, status=status.HTTP_200_OK)
+        return Response({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@throttle_scope('resend_verification')
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def resend_verification(request):
+    if request.user.is_verified:
+        return Response({"error": "Email already verified"}, status=status.HTTP_400_BAD_REQUEST)
+
+    queue_verification_email(request.user.pk)
+    return Response({"message": "Verification email sent"}, status=status.HTTP_200_OK)
+
+
+@require_GET
+@cache_control(public=True, max_age=settings.JWKS_MAX_AGE)
+def jwks(request):
+    """Public keys that verify access tokens, for processes without the signing key"""
+    return JsonResponse(active_backend().jwks())
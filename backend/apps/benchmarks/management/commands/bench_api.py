@@ -0,0 +1,301 @@
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import factory
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.refresh import CachedRefreshToken
+from apps.benchmarks.utils import summarize, write_report
+from apps.metrics.instrumentation import SQL_QUERIES
+from apps.users.factories import DEFAULT_PASSWORD, UserFactory
+
+# A request is (method, body or None, bearer token or None)
+
+
+def _login(users, count, tag):
+    return [('POST', {'email': users[i % len(users)].email, 'password': DEFAULT_PASSWORD}, None)
+            for i in range(count)]
+
+
+def _refresh(users, count, tag):
+    # Rotation refuses a refresh token the second time, so each request gets its own
+    return [('POST', {'refresh': str(CachedRefreshToken.for_user(users[i % len(users)]))}, None)
+            for i in range(count)]
+
+
+def _register(users, count, tag):
+    return [('POST', {'username': f'{tag}r{i}', 'email': f'{tag}r{i}@example.com', 'first_name': 'Load',
+                      'last_name': 'Registered', 'password': DEFAULT_PASSWORD, 'password_confirm': DEFAULT_PASSWORD},
+             None)
+            for i in range(count)]
+
+
+def _access_tokens(users):
+    return [str(AccessToken.for_user(user)) for user in users]
+
+
+def _me(users, count, tag):
+    tokens = _access_tokens(users)
+    return [('GET', None, tokens[i % len(tokens)]) for i in range(count)]
+
+
+def _profile_update(users, count, tag):
+    tokens = _access_tokens(users)
+    # Names unique to the run, so no update is skipped as unchanged
+    return [('PATCH', {'first_name': f'{i} {tag}'[:30]}, tokens[i % len(tokens)]) for i in range(count)]
+
+
+# name: (URL name, which is also the view label of the SQL metrics, request builder)
+SCENARIOS = {
+    'login': ('auth:login', _login),
+    'refresh': ('auth:token_refresh', _refresh),
+    'me': ('users:me', _me),
+    'profile_update': ('users:profile', _profile_update),
+    'register': ('auth:register', _register),
+}
+
+HASHERS = {
+    # Password hashing dominates login and register; 'fast' measures the rest
+    'fast': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'default': None,
+}
+
+
+def _payload(body):
+    return b'' if body is None else json.dumps(body).encode()
+
+
+def _call_wsgi(app, path, request):
+    method, body, token = request
+    payload = _payload(body)
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': BytesIO(payload),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if body is not None:
+        environ['CONTENT_TYPE'] = 'application/json'
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    statuses = []
+    started = time.perf_counter()
+    result = app(environ, lambda status, headers, exc_info=None: statuses.append(int(status.split()[0])))
+    try:
+        for _chunk in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return time.perf_counter() - started, statuses[0]
+
+
+def run_wsgi(app, path, requests, concurrency):
+    """``(wall seconds, [(latency, status), ...])``, ``concurrency`` requests at a time on threads."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda request: _call_wsgi(app, path, request), requests))
+    return time.perf_counter() - started, results
+
+
+async def _call_asgi(app, path, request):
+    method, body, token = request
+    payload = _payload(body)
+    headers = [(b'host', b'localhost'), (b'content-length', str(len(payload)).encode())]
+    if body is not None:
+        headers.append((b'content-type', b'application/json'))
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'https',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 443),
+    }
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    finished = asyncio.Event()
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Django listens for a disconnect while the view runs
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    finished.set()
+    return time.perf_counter() - started, status
+
+
+def run_asgi(app, path, requests, concurrency):
+    """Like :func:`run_wsgi`, with ``concurrency`` connections on one event loop."""
+    results = [None] * len(requests)
+    pending = iter(range(len(requests)))
+
+    async def connection_loop():
+        for index in pending:
+            results[index] = await _call_asgi(app, path, requests[index])
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(connection_loop() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    return asyncio.run(main()), results
+
+
+SERVERS = {
+    'wsgi': run_wsgi,
+    'asgi': run_asgi,
+}
+
+
+def _load_app(server):
+    if server == 'wsgi':
+        from core.wsgi import application
+    else:
+        from core.asgi import application
+    return application
+
+
+def _sql_totals(view):
+    """``(queries, requests)`` recorded so far for ``view`` by the metrics middleware."""
+    entry = SQL_QUERIES.snapshot()['values'].get((view,))
+    return (entry[1], entry[2]) if entry else (0.0, 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the auth and user endpoints offline: seed users with '
+        'factory-boy, then drive login, refresh, me, profile updates and '
+        'registration concurrently through the project\'s WSGI and ASGI '
+        'applications in this process. Reports req/s, latency percentiles, '
+        'SQL queries per request and non-2xx responses as one JSON line to '
+        'diff between releases. Throttles are off; seeded and registered '
+        'users are deleted afterwards. Works against SQLite or Postgres; '
+        'registration enqueues verification mail, so without Redis set '
+        'CELERY_BROKER_URL=memory://.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario and server')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests before each measurement')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+        parser.add_argument('--servers', default=','.join(SERVERS), help='Comma-separated: wsgi, asgi')
+        parser.add_argument('--hasher', choices=sorted(HASHERS), default='fast',
+                            help="'default' keeps the production password hasher")
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        servers = [name for name in options['servers'].split(',') if name]
+        unknown = (set(scenarios) - set(SCENARIOS)) | (set(servers) - set(SERVERS))
+        if unknown:
+            raise CommandError(f'Unknown scenarios or servers: {", ".join(sorted(unknown))}')
+        if options['users'] < 1 or options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--users, --requests and --concurrency must be positive')
+
+        overrides = {
+            # The metrics middleware counts SQL queries per request
+            'METRICS_SAMPLE_RATE': 1.0,
+            'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+        }
+        if HASHERS[options['hasher']]:
+            overrides['PASSWORD_HASHERS'] = HASHERS[options['hasher']]
+
+        prefix = f'load{uuid.uuid4().hex[:8]}'
+        try:
+            with override_settings(**overrides):
+                users = self.seed(prefix, options['users'])
+                results = {
+                    server: {name: self.measure(server, name, users, f'{prefix}{server}', options) for name in scenarios}
+                    for server in servers
+                }
+        finally:
+            get_user_model().objects.filter(username__startswith=prefix).delete()
+
+        write_report({
+            'label': options['label'],
+            'database': connection.vendor,
+            'users': options['users'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'hasher': options['hasher'],
+            'servers': results,
+        }, options['output'], self.stdout)
+
+    def seed(self, prefix, count):
+        User = get_user_model()
+        password = factory.Transformer.Force(make_password(DEFAULT_PASSWORD))
+        User.objects.bulk_create(UserFactory.build_batch(count, prefix=f'{prefix}u', password=password),
+                                 batch_size=1000)
+        return list(User.objects.filter(username__startswith=f'{prefix}u').order_by('pk'))
+
+    def measure(self, server, name, users, tag, options):
+        view, build = SCENARIOS[name]
+        path = reverse(view)
+        app = _load_app(server)
+        requests = build(users, options['warmup'] + options['requests'], f'{tag}{name[:3]}')
+        warmup, measured = requests[:options['warmup']], requests[options['warmup']:]
+        if warmup:
+            SERVERS[server](app, path, warmup, options['concurrency'])
+
+        queries_before, count_before = _sql_totals(view)
+        wall, results = SERVERS[server](app, path, measured, options['concurrency'])
+        queries_after, count_after = _sql_totals(view)
+
+        statuses = Counter(status for _latency, status in results)
+        return {
+            'requests_per_second': round(len(results) / max(wall, 1e-9), 1),
+            'latency_ms': summarize([latency for latency, _status in results]),
+            'queries_per_request': round((queries_after - queries_before) / max(count_after - count_before, 1), 2),
+            'errors': sum(count for status, count in statuses.items() if not 200 <= status < 300),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
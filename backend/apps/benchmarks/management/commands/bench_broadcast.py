@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels_redis.core import RedisChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from redis import asyncio as aioredis
+
+from apps.benchmarks.utils import BENCH_CHANNEL_PREFIX, summarize, write_report
+
+LAYERS = ('core', 'pubsub')
+
+
+def _make_layer(mode, hosts, capacity):
+    if mode == 'pubsub':
+        return RedisPubSubChannelLayer(hosts=hosts, prefix=BENCH_CHANNEL_PREFIX)
+    return RedisChannelLayer(hosts=hosts, prefix=BENCH_CHANNEL_PREFIX, capacity=capacity)
+
+
+async def _redis_commands(hosts):
+    """Total commands processed by all hosts, from INFO stats."""
+    total = 0
+    for host in hosts:
+        client = aioredis.Redis.from_url(host)
+        try:
+            total += (await client.info('stats'))['total_commands_processed']
+        finally:
+            await client.aclose()
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the cost of one group_send to rooms of increasing size on '
+        'the core (per-member queue) and pubsub (one publish per group) '
+        'channel layers: sender time, time until every member received it, '
+        'and Redis commands per broadcast.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', default=None,
+                            help='Comma-separated Redis URLs (default: CHANNEL_REDIS_URLS)')
+        parser.add_argument('--layers', default=','.join(LAYERS), help='Layers to compare: core, pubsub')
+        parser.add_argument('--sizes', default='10,100,1000,10000', help='Comma-separated room sizes')
+        parser.add_argument('--processes', type=int, default=4, help='Simulated server processes per room')
+        parser.add_argument('--rounds', type=int, default=5, help='Broadcasts per room size')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for one broadcast')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON reports to this file')
+
+    def handle(self, *args, **options):
+        if options['hosts']:
+            hosts = [host.strip() for host in options['hosts'].split(',') if host.strip()]
+        else:
+            hosts = settings.CHANNEL_REDIS_URLS
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        for mode in options['layers'].split(','):
+            for size in sizes:
+                report = async_to_sync(self.measure)(mode, hosts, size, options)
+                report.update({'label': options['label'], 'layer': mode, 'room_size': size})
+                write_report(report, options['output'], self.stdout)
+
+    async def measure(self, mode, hosts, size, options):
+        processes = max(1, min(options['processes'], size))
+        layers = [_make_layer(mode, hosts, capacity=options['rounds'] + 10) for _ in range(processes)]
+        group = f'chat_bench{size}'
+        members = []
+        for index in range(size):
+            layer = layers[index % processes]
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            members.append((layer, channel))
+
+        send_times, fanout_times, commands = [], [], []
+        try:
+            for _ in range(options['rounds']):
+                receivers = [asyncio.ensure_future(layer.receive(channel)) for layer, channel in members]
+                # Let every receiver start listening before the clock starts
+                await asyncio.sleep(0.1)
+                before = await _redis_commands(hosts)
+                started = time.perf_counter()
+                await layers[0].group_send(group, {'type': 'chat.message', 'message': 'x' * 64})
+                send_times.append(time.perf_counter() - started)
+                await asyncio.wait_for(asyncio.gather(*receivers), options['timeout'])
+                fanout_times.append(time.perf_counter() - started)
+                # Minus the INFO call itself
+                commands.append(await _redis_commands(hosts) - before - len(hosts))
+        finally:
+            for layer, channel in members:
+                await layer.group_discard(group, channel)
+            for layer in layers:
+                # Drops the benchmark's keys and subscriptions, then closes connections
+                await layer.flush()
+
+        return {
+            'processes': processes,
+            'group_send_ms': summarize(send_times),
+            'fanout_ms': summarize(fanout_times),
+            'redis_commands_per_broadcast': round(sum(commands) / len(commands), 1),
+        }
@@ -0,0 +1,69 @@
+import time
+
+from celery import current_app
+from django.core.management.base import BaseCommand
+
+from apps.benchmarks.tasks import bench_task
+from apps.benchmarks.utils import summarize, write_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Enqueue benchmark tasks and report throughput plus queue-wait and '
+        'end-to-end latency. Run it once per worker configuration, tagging '
+        'each run with --label, to compare prefetch/acks/autoscale settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000, help='Number of tasks to enqueue')
+        parser.add_argument('--queue', default='default', help='Queue to route the tasks to')
+        parser.add_argument('--priority', type=int, default=None, help='Message priority (0 is highest)')
+        parser.add_argument('--work-ms', type=int, default=0, help='Simulated work per task in milliseconds')
+        parser.add_argument('--mode', choices=['io', 'cpu'], default='io', help='How the work is simulated')
+        parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait for all results')
+        parser.add_argument('--label', default='', help='Free-form name of the worker configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        count = options['tasks']
+        start = time.time()
+        results = [
+            bench_task.apply_async(
+                args=[time.time(), options['work_ms'], options['mode']],
+                queue=options['queue'],
+                priority=options['priority'],
+            )
+            for _ in range(count)
+        ]
+        enqueue_seconds = time.time() - start
+
+        deadline = start + options['timeout']
+        timings = [
+            result.get(timeout=max(0.0, deadline - time.time()))
+            for result in results
+        ]
+        for result in results:
+            result.forget()
+
+        finished = max((timing['finished_at'] for timing in timings), default=start)
+        elapsed = max(finished - start, 1e-9)
+        conf = current_app.conf
+
+        report = {
+            'label': options['label'],
+            'queue': options['queue'],
+            'priority': options['priority'],
+            'tasks': count,
+            'work_ms': options['work_ms'],
+            'mode': options['mode'],
+            'config': {
+                'worker_prefetch_multiplier': conf.worker_prefetch_multiplier,
+                'task_acks_late': conf.task_acks_late,
+                'task_always_eager': conf.task_always_eager,
+            },
+            'enqueue_per_second': round(count / max(enqueue_seconds, 1e-9), 1),
+            'tasks_per_second': round(count / elapsed, 1),
+            'queue_wait_ms': summarize(t['started_at'] - t['enqueued_at'] for t in timings),
+            'end_to_end_ms': summarize(t['finished_at'] - t['enqueued_at'] for t in timings),
+        }
+        write_report(report, options['output'], self.stdout)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.benchmarks.utils import BENCH_CHANNEL_PREFIX, summarize, write_report
+
+
+def shard_distribution(layer, names):
+    """Number of ``names`` hashed to each of the layer's hosts."""
+    counts = Counter(layer.consistent_hash(name) for name in names)
+    return [counts.get(index, 0) for index in range(layer.ring_size)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Report how groups and process channels spread over the channel '
+        'layer Redis hosts, then measure group_send throughput and delivery '
+        'latency. Run it once per host count (scripts/bench-channel-shards.sh '
+        'starts local Redis instances) to check that throughput scales.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', default=None,
+                            help='Comma-separated Redis URLs (default: CHANNEL_REDIS_URLS)')
+        parser.add_argument('--groups', type=int, default=10000, help='Group names to hash')
+        parser.add_argument('--processes', type=int, default=8, help='Simulated server processes')
+        parser.add_argument('--messages', type=int, default=2000,
+                            help='group_send calls to time (0 only reports the distribution)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Concurrent group_send calls')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for delivery')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['hosts']:
+            hosts = [host.strip() for host in options['hosts'].split(',') if host.strip()]
+        else:
+            hosts = settings.CHANNEL_REDIS_URLS
+        layers = [
+            RedisChannelLayer(hosts=hosts, prefix=BENCH_CHANNEL_PREFIX, capacity=max(100, options['messages']))
+            for _ in range(options['processes'])
+        ]
+        groups = [f'chat_room{index}' for index in range(options['groups'])]
+
+        report = {
+            'label': options['label'],
+            'hosts': len(hosts),
+            'group_shards': shard_distribution(layers[0], groups),
+            # Messages for a process's sockets all live on one host, picked per process
+            'process_shards': shard_distribution(layers[0], [f'specific.{layer.client_prefix}!' for layer in layers]),
+        }
+        if options['messages']:
+            report.update(async_to_sync(self.measure)(layers, groups, options))
+        write_report(report, options['output'], self.stdout)
+
+    async def measure(self, layers, groups, options):
+        count = options['messages']
+        active = groups[:min(len(groups), count)]
+        channels = [await layer.new_channel() for layer in layers]
+        members = {group: index % len(layers) for index, group in enumerate(active)}
+        for group, index in members.items():
+            await layers[index].group_add(group, channels[index])
+
+        expected = Counter(members[active[i % len(active)]] for i in range(count))
+        delivery = []
+
+        async def drain(index):
+            for _ in range(expected[index]):
+                message = await layers[index].receive(channels[index])
+                delivery.append(time.time() - message['sent_at'])
+
+        send_times = []
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def send(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await layers[0].group_send(active[i % len(active)], {'type': 'bench', 'sent_at': time.time()})
+                send_times.append(time.perf_counter() - started)
+
+        receivers = [asyncio.ensure_future(drain(index)) for index in range(len(layers))]
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(send(i) for i in range(count)))
+            await asyncio.wait_for(asyncio.gather(*receivers), options['timeout'])
+        finally:
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            for receiver in receivers:
+                receiver.cancel()
+            await layers[0].flush()
+            for layer in layers:
+                await layer.close_pools()
+
+        return {
+            'messages': count,
+            'delivered': len(delivery),
+            'messages_per_second': round(len(delivery) / elapsed, 1),
+            'group_send_ms': summarize(send_times),
+            'delivery_ms': summarize(delivery),
+        }
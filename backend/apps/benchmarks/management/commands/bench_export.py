@@ -0,0 +1,140 @@
+import gc
+import gzip
+import time
+import tracemalloc
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.benchmarks.utils import write_report
+from apps.users.serializers import UserSerializer
+from apps.users.views import export_users
+from core.middleware import CompressionMiddleware
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def buffered_export(request):
+    """The same list rendered the stock way: one serializer, one body."""
+    return Response(UserSerializer(get_user_model().objects.order_by('pk'), many=True).data)
+
+
+VIEWS = {
+    'buffered': buffered_export,
+    'streaming': export_users,
+}
+
+DECODERS = {
+    'identity': lambda body: body,
+    'gzip': gzip.decompress,
+    'br': brotli.decompress,
+}
+
+
+def _rendered(view):
+    def handler(request):
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    return CompressionMiddleware(handler)
+
+
+def _fetch(view, admin, encoding):
+    """``(time to first byte, total time, body)`` of one request."""
+    request = APIRequestFactory().get('/api/users/export/', HTTP_ACCEPT_ENCODING=encoding)
+    force_authenticate(request, user=admin)
+    # Garbage left by the previous run would otherwise be collected in this one
+    gc.collect()
+    started = time.perf_counter()
+    response = _rendered(view)(request)
+    if response.streaming:
+        chunks = []
+        first = None
+        for chunk in response.streaming_content:
+            if first is None:
+                first = time.perf_counter() - started
+            chunks.append(chunk)
+        body = b''.join(chunks)
+    else:
+        body = response.content
+        first = time.perf_counter() - started
+    total = time.perf_counter() - started
+    if response.get('Content-Encoding', 'identity') != encoding:
+        raise CommandError(f'expected {encoding}, got {response.get("Content-Encoding")}')
+    return first, total, body
+
+
+def _peak(view, admin, encoding):
+    """Peak traced Python memory of one request, in bytes."""
+    tracemalloc.start()
+    try:
+        request = APIRequestFactory().get('/api/users/export/', HTTP_ACCEPT_ENCODING=encoding)
+        force_authenticate(request, user=admin)
+        response = _rendered(view)(request)
+        if response.streaming:
+            for _chunk in response.streaming_content:
+                pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare exporting every user as one DRF response against the streaming '
+        'export endpoint, uncompressed, gzip and brotli: time to first byte, '
+        'total time, bytes sent and peak Python memory. Rows are created in a '
+        'transaction that is rolled back. Bodies are checked to be identical.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Users to export')
+        parser.add_argument('--encodings', default='identity,gzip,br', help='Comma-separated encodings to measure')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        encodings = [encoding for encoding in options['encodings'].split(',') if encoding]
+        unknown = set(encodings) - set(DECODERS)
+        if unknown:
+            raise CommandError(f'Unknown encodings: {", ".join(sorted(unknown))}')
+
+        User = get_user_model()
+        password = make_password(None)
+        results = {}
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(email=f'export{i}@example.com', username=f'export{i}', first_name='Export',
+                     last_name=f'User {i}', password=password, is_verified=bool(i % 2))
+                for i in range(options['rows'])
+            ], batch_size=5000)
+            admin = User.objects.create(email='export-admin@example.com', username='export-admin',
+                                        password=password, is_staff=True)
+
+            reference = None
+            for mode, view in VIEWS.items():
+                for encoding in encodings:
+                    first, total, body = _fetch(view, admin, encoding)
+                    decoded = DECODERS[encoding](body)
+                    if reference is None:
+                        reference = decoded
+                    elif decoded != reference:
+                        raise CommandError(f'{mode}/{encoding}: body differs from buffered/{encodings[0]}')
+                    results[f'{mode}/{encoding}'] = {
+                        'ttfb_ms': round(first * 1000, 1),
+                        'total_ms': round(total * 1000, 1),
+                        'bytes': len(body),
+                        'peak_memory_mb': round(_peak(view, admin, encoding) / 2 ** 20, 1),
+                    }
+            transaction.set_rollback(True)
+
+        write_report({'label': options['label'], 'rows': options['rows'] + 1, 'results': results},
+                     options['output'], self.stdout)
@@ -0,0 +1,72 @@
+import time
+
+from cryptography.hazmat.primitives import serialization
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.backends import ALLOWED_ALGORITHMS, TokenBackend
+
+from apps.authentication.keys import KeyRingBackend
+from apps.authentication.management.commands.generate_jwt_key import generate_key
+from apps.benchmarks.utils import summarize, write_report
+
+ALGORITHMS = ('HS256', 'RS256', 'ES256', 'EdDSA')
+PAYLOAD = {'token_type': 'access', 'exp': 4_000_000_000, 'iat': 1_700_000_000,
+           'jti': '5f0c7a3e9b2d4f1e8a6c0b7d3e2f1a9c', 'user_id': 12345}
+
+
+def _backends(algorithm):
+    """``(key ring backend, simplejwt's backend)`` for ``algorithm`` with a fresh key."""
+    if algorithm.startswith('HS'):
+        secret = 'bench-secret-' + 'x' * 40
+        return KeyRingBackend(algorithm, signing_key=secret), TokenBackend(algorithm, signing_key=secret)
+    key = generate_key(algorithm)
+    ring = KeyRingBackend(algorithm, keys={'bench': (key, key.public_key())}, signing_kid='bench')
+    if algorithm not in ALLOWED_ALGORITHMS:
+        # simplejwt's backend cannot verify it at all
+        return ring, None
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return ring, TokenBackend(algorithm, verifying_key=public_pem)
+
+
+def _time(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure access token signing and verification cost per algorithm. '
+        '"verify" uses the key ring with parsed keys; "verify_pem" is '
+        'simplejwt\'s backend, which parses the PEM verifying key per call.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Operations per measurement')
+        parser.add_argument('--algorithms', default=','.join(ALGORITHMS), help='Comma-separated algorithms')
+        parser.add_argument('--label', default='', help='Free-form name of the host or configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        results = {}
+        for algorithm in options['algorithms'].split(','):
+            ring, stock = _backends(algorithm)
+            token = ring.encode(PAYLOAD)
+            verify = _time(lambda: ring.decode(token), iterations)
+            result = {
+                'token_bytes': len(token),
+                'sign_us': summarize(_time(lambda: ring.encode(PAYLOAD), iterations), scale=1e6),
+                'verify_us': summarize(verify, scale=1e6),
+                'verifies_per_second': round(iterations / max(sum(verify), 1e-9), 1),
+            }
+            if stock is not None:
+                result['verify_pem_us'] = summarize(_time(lambda: stock.decode(token), iterations), scale=1e6)
+            results[algorithm] = result
+
+        write_report({'label': options['label'], 'iterations': iterations, 'algorithms': results},
+                     options['output'], self.stdout)
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.benchmarks.utils import write_report
+from apps.notifications.models import Notification
+from apps.notifications.serializers import NotificationSerializer
+from apps.users.serializers import UserSerializer
+from core.serializers import compile_fields
+
+CREATED_AT = datetime(2024, 1, 15, 12, 30, 45, 123456, tzinfo=timezone.utc)
+
+
+def _users(count):
+    User = get_user_model()
+    return [
+        User(id=i, email=f'bench{i}@example.com', username=f'bench{i}', first_name='Bench',
+             last_name=f'User {i}', is_verified=bool(i % 2), created_at=CREATED_AT)
+        for i in range(1, count + 1)
+    ]
+
+
+def _notifications(count):
+    return [
+        Notification(id=i, user_id=1, notification_type=('info', 'warning')[i % 2],
+                     message=f'Notification number {i}', is_read=bool(i % 3), created_at=CREATED_AT)
+        for i in range(1, count + 1)
+    ]
+
+
+def _rows(serializer_class, instances):
+    """What ``serializer_class.values()`` fetches for ``instances``."""
+    sources = [source for _name, source, _convert in compile_fields(serializer_class)]
+    return [{source: getattr(instance, source) for source in sources} for instance in instances]
+
+
+SUBJECTS = {
+    'user': (UserSerializer, _users),
+    'notification': (NotificationSerializer, _notifications),
+}
+
+
+def _rate(count, render, rounds):
+    """Best objects/sec of ``rounds`` runs, and the output of the last one."""
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        output = render()
+        best = min(best, time.perf_counter() - started)
+    return round(count / max(best, 1e-9), 1), output
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare objects/sec of DRF serializers with their precompiled read '
+        'path (core.serializers.FastReadMixin), per object as the detail '
+        'views render, per list, and from values() rows. Outputs are checked '
+        'to be identical.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=5000, help='Objects per measurement')
+        parser.add_argument('--rounds', type=int, default=5, help='Runs per measurement; the best is reported')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        count = options['objects']
+        results = {}
+        for subject, (serializer_class, build) in SUBJECTS.items():
+            instances = build(count)
+            rows = _rows(serializer_class, instances)
+            modes = {
+                'drf_each': lambda: [serializer_class(instance).data for instance in instances],
+                'drf_many': lambda: serializer_class(instances, many=True).data,
+                'fast_each': lambda: [serializer_class.represent(instance) for instance in instances],
+                'fast_values': lambda: serializer_class.represent_values(rows),
+            }
+            rates = {}
+            outputs = {}
+            for mode, render in modes.items():
+                rates[mode], outputs[mode] = _rate(count, render, options['rounds'])
+            reference = [dict(item) for item in outputs['drf_many']]
+            for mode, output in outputs.items():
+                if [dict(item) for item in output] != reference:
+                    raise CommandError(f'{subject}: {mode} output differs from the DRF serializer')
+            results[subject] = {
+                'objects_per_second': rates,
+                'speedup_each': round(rates['fast_each'] / rates['drf_each'], 2),
+                'speedup_list': round(rates['fast_values'] / rates['drf_many'], 2),
+            }
+
+        write_report({'label': options['label'], 'objects': count, 'rounds': options['rounds'], 'serializers': results},
+                     options['output'], self.stdout)
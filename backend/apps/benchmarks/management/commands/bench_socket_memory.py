@@ -0,0 +1,129 @@
+import asyncio
+import gc
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.benchmarks.utils import write_report
+from apps.websockets.consumers import ChatConsumer, NotificationConsumer
+from apps.websockets.identity import SocketUser, group_name
+
+CONSUMERS = {'chat': ChatConsumer, 'notifications': NotificationConsumer}
+MODES = ('orm', 'record')
+
+
+async def _discard(message):
+    pass
+
+
+def _scope(kind, index, key):
+    """A scope shaped like the one daphne builds for each connection."""
+    route = {'room_name': key} if kind == 'chat' else {'user_id': key}
+    return {
+        'type': 'websocket',
+        'path': f'/ws/{kind}/{key}/',
+        'query_string': f'token={"x" * 240}{index}'.encode(),
+        'headers': [
+            (name.encode(), value.encode()) for name, value in (
+                ('host', 'example.com'), ('origin', 'https://example.com'),
+                ('user-agent', 'Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/120.0'),
+                ('sec-websocket-version', '13'), ('sec-websocket-key', f'{index:024d}'),
+                ('connection', 'Upgrade'), ('upgrade', 'websocket'),
+            )
+        ],
+        'client': ['10.0.0.1', 40000 + index % 20000],
+        'server': ['10.0.0.2', 8000],
+        'subprotocols': [],
+        'url_route': {'args': (), 'kwargs': route},
+    }
+
+
+def _orm_user(index):
+    """A ``User`` as a full-row query loads it."""
+    User = get_user_model()
+    fields = [field.attname for field in User._meta.concrete_fields]
+    template = User(
+        id=index, username=f'bench{index}', email=f'bench{index}@example.com',
+        first_name='Bench', last_name='User', password='pbkdf2_sha256$600000$' + 'x' * 66,
+    )
+    return User.from_db('default', fields, [getattr(template, name) for name in fields])
+
+
+async def _open(kind, mode, index, rooms):
+    """An accepted, idle consumer holding what connect() leaves behind."""
+    consumer = CONSUMERS[kind]()
+    key = str(index % rooms) if kind == 'chat' else str(index)
+    consumer.scope = _scope(kind, index, key)
+    consumer.channel_name = f'specific.bench!{index:016x}'
+    consumer.base_send = _discard
+    if mode == 'orm':
+        # State as consumers kept it before: a User instance, one group
+        # name string per socket and an eagerly created digest buffer
+        consumer.user = _orm_user(index)
+        consumer.room_group_name = f'{"chat" if kind == "chat" else "notifications"}_{key}'
+        if kind == 'notifications':
+            consumer.held_items = deque(maxlen=settings.NOTIFICATIONS_DIGEST_PREVIEW)
+    else:
+        consumer.user = SocketUser(index, f'bench{index}')
+        consumer.room_group_name = group_name('chat' if kind == 'chat' else 'notifications', key)
+    if kind == 'chat':
+        consumer.room_name = key
+    else:
+        consumer.user_id = key
+    await consumer.accept()
+    return consumer
+
+
+async def _bytes_per_socket(kind, mode, sockets, rooms):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        consumers = [await _open(kind, mode, index, rooms) for index in range(sockets)]
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    for consumer in consumers:
+        if consumer.heartbeat_task:
+            consumer.heartbeat_task.cancel()
+    await asyncio.sleep(0)
+    return used / sockets
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure Python heap bytes per idle WebSocket connection, comparing '
+        'consumers that hold a User instance (orm) with the compact '
+        'identity record they keep now (record).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', choices=sorted(CONSUMERS), default='chat', help='Consumer to measure')
+        parser.add_argument('--sockets', type=int, default=10000, help='Idle connections to open')
+        parser.add_argument('--rooms', type=int, default=100, help='Chat rooms the sockets are spread over')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        kind, sockets = options['consumer'], options['sockets']
+        per_socket = {
+            mode: round(asyncio.run(_bytes_per_socket(kind, mode, sockets, max(1, options['rooms']))))
+            for mode in MODES
+        }
+        saved = per_socket['orm'] - per_socket['record']
+        report = {
+            'label': options['label'],
+            'consumer': kind,
+            'sockets': sockets,
+            'rooms': options['rooms'],
+            'heartbeats': settings.WEBSOCKET_HEARTBEAT_INTERVAL > 0,
+            'bytes_per_socket': per_socket,
+            'saved_per_socket': saved,
+            'saved_percent': round(100.0 * saved / per_socket['orm'], 1) if per_socket['orm'] else 0.0,
+            'saved_per_100k_mb': round(saved * 100000 / 2 ** 20, 1),
+        }
+        write_report(report, options['output'], self.stdout)
@@ -0,0 +1,84 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView as BlacklistRefreshView
+
+from apps.authentication.refresh import CachedRefreshToken
+from apps.authentication.views import TokenRefreshView
+from apps.benchmarks.utils import summarize, write_report
+
+PATHS = {
+    # simplejwt's view: blacklist lookup, OutstandingToken and BlacklistedToken rows per refresh
+    'blacklist': (BlacklistRefreshView, RefreshToken),
+    # Rotation state in the cache, persisted by snapshot_refresh_revocations
+    'cache': (TokenRefreshView, CachedRefreshToken),
+}
+
+
+def _refresh_chain(view_class, token_class, user, count):
+    """Refresh ``count`` times, each with the token the previous refresh returned."""
+    view = view_class.as_view()
+    factory = APIRequestFactory()
+    token = str(token_class.for_user(user))
+    samples = []
+    queries = 0
+    for _ in range(count):
+        request = factory.post('/api/auth/refresh/', {'refresh': token}, format='json')
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = view(request)
+            samples.append(time.perf_counter() - started)
+        queries += len(captured)
+        if response.status_code != 200:
+            raise CommandError(f'Refresh failed with {response.status_code}: {response.data}')
+        token = response.data['refresh']
+    return {
+        'refreshes_per_second': round(count / max(sum(samples), 1e-9), 1),
+        'latency_ms': summarize(samples),
+        'queries_per_refresh': round(queries / count, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare token refresh throughput of simplejwt\'s blacklist-backed '
+        'view with the cache-backed rotation in apps.authentication.refresh. '
+        'Database rows are rolled back; journal entries of the cache path '
+        'expire on their own.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refreshes', type=int, default=1000, help='Refreshes per path')
+        parser.add_argument('--paths', default=','.join(PATHS), help='Paths to compare: blacklist, cache')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        count = options['refreshes']
+        results = {}
+        with transaction.atomic():
+            name = f'bench-refresh-{uuid.uuid4().hex[:12]}'
+            user = get_user_model().objects.create_user(
+                email=f'{name}@example.com', username=name, first_name='Bench', last_name='User'
+            )
+            for path in options['paths'].split(','):
+                view_class, token_class = PATHS[path]
+                results[path] = _refresh_chain(view_class, token_class, user, count)
+            transaction.set_rollback(True)
+
+        report = {
+            'label': options['label'],
+            'refreshes': count,
+            'paths': results,
+        }
+        if 'blacklist' in results and 'cache' in results:
+            report['speedup'] = round(
+                results['cache']['refreshes_per_second'] / max(results['blacklist']['refreshes_per_second'], 1e-9), 2
+            )
+        write_report(report, options['output'], self.stdout)
@@ -0,0 +1,194 @@
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.benchmarks.utils import summarize, write_report
+
+TARGETS = {
+    'wsgi': 'import core.wsgi',
+    'asgi': 'import core.asgi',
+    'celery': 'from core.celery import app; app.loader.import_default_modules()',
+}
+
+PROBE = '''
+import json, os, resource, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+started = time.perf_counter()
+{load}
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+}}))
+'''
+
+
+def parse_importtime(stderr):
+    """``[(module, self_us, cumulative_us), ...]`` from ``-X importtime`` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def _probe(target, importtime=False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE.format(load=TARGETS[target])]
+    result = subprocess.run(args, cwd=settings.BASE_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise CommandError(f'Importing the {target} entry point failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as handle:
+            return [int(child) for child in handle.read().split()]
+    except OSError:
+        return []
+
+
+def _memory(pid):
+    """Resident, proportional, shared and private kB from ``smaps_rollup``."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as handle:
+        for line in handle:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def _request(port):
+    """True once a worker answers; any status (404, an SSL redirect) will do."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        connection.request('GET', '/__startup_probe__/', headers={'Host': 'localhost'})
+        connection.getresponse().read()
+    except OSError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+def _mean(values):
+    values = list(values)
+    return round(sum(values) / len(values)) if values else 0
+
+
+def _serve(preload, workers, port, requests, timeout):
+    """Boot gunicorn, wait for every worker to load the app, then read memory."""
+    env = {
+        **os.environ,
+        'GUNICORN_PRELOAD': 'true' if preload else 'false',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+    }
+    with tempfile.TemporaryFile(mode='w+') as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'core.wsgi:application'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log,
+        )
+        try:
+            while True:
+                if process.poll() is not None:
+                    log.seek(0)
+                    raise CommandError(f'gunicorn exited during boot:\n{log.read()[-2000:]}')
+                if time.perf_counter() - started > timeout:
+                    raise CommandError(f'gunicorn did not boot {workers} workers in {timeout}s')
+                log.seek(0)
+                if log.read().count('Worker ready') >= workers and _request(port):
+                    break
+                time.sleep(0.05)
+            boot_seconds = time.perf_counter() - started
+
+            # Let the workers handle requests before measuring, as in service
+            for _ in range(requests):
+                _request(port)
+            per_worker = [_memory(pid) for pid in _children(process.pid)]
+            master = _memory(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        'boot_seconds': round(boot_seconds, 3),
+        'master_rss_kb': master['rss_kb'],
+        'worker': {key: _mean(worker[key] for worker in per_worker) for key in master},
+        'total_pss_kb': master['pss_kb'] + sum(worker['pss_kb'] for worker in per_worker),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile process start-up: time and peak RSS to import an entry point '
+        '(wsgi, asgi or celery), the slowest packages and modules from '
+        '-X importtime, and optionally gunicorn boot time and memory per '
+        'worker with and without --preload.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='wsgi', help='Entry point to import')
+        parser.add_argument('--runs', type=int, default=5, help='Timed imports, each in a fresh interpreter')
+        parser.add_argument('--top', type=int, default=15, help='Slowest packages and modules to list')
+        parser.add_argument('--gunicorn-workers', type=int, default=0,
+                            help='Also boot gunicorn with this many workers, with and without preload')
+        parser.add_argument('--port', type=int, default=8765, help='Port for the gunicorn runs')
+        parser.add_argument('--requests', type=int, default=200, help='Requests served before reading memory')
+        parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for gunicorn to boot')
+        parser.add_argument('--label', default='', help='Free-form name of the configuration')
+        parser.add_argument('--output', default=None, help='Append the JSON report to this file')
+
+    def handle(self, *args, **options):
+        target, top = options['target'], options['top']
+        _, stderr = _probe(target, importtime=True)
+        modules = parse_importtime(stderr)
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split('.')[0]] += self_us
+
+        runs = [_probe(target)[0] for _ in range(max(1, options['runs']))]
+        report = {
+            'label': options['label'],
+            'target': target,
+            'import_ms': summarize(run['seconds'] for run in runs),
+            'max_rss_kb': max(run['max_rss_kb'] for run in runs),
+            'modules': runs[0]['modules'],
+            'slowest_packages': [
+                {'package': name, 'ms': round(self_us / 1000, 1)}
+                for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+            ],
+            'slowest_modules': [
+                {'module': name, 'self_ms': round(self_us / 1000, 1), 'cumulative_ms': round(cumulative_us / 1000, 1)}
+                for name, self_us, cumulative_us in sorted(modules, key=lambda item: -item[1])[:top]
+            ],
+        }
+        if options['gunicorn_workers']:
+            report['gunicorn'] = {
+                'workers': options['gunicorn_workers'],
+                **{
+                    'preload' if preload else 'no_preload': _serve(
+                        preload, options['gunicorn_workers'], options['port'],
+                        options['requests'], options['timeout'],
+                    )
+                    for preload in (False, True)
+                },
+            }
+        write_report(report, options['output'], self.stdout)
@@ -0,0 +1,21 @@
+import time
+
+from celery import shared_task
+
+
+@shared_task(ignore_result=False)
+def bench_task(enqueued_at, work_ms=0, mode='io'):
+    """Benchmark probe: optionally simulate work, then report its timings."""
+    started_at = time.time()
+    if work_ms:
+        if mode == 'cpu':
+            deadline = time.perf_counter() + work_ms / 1000.0
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            time.sleep(work_ms / 1000.0)
+    return {
+        'enqueued_at': enqueued_at,
+        'started_at': started_at,
+        'finished_at': time.time(),
+    }
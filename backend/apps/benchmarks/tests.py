@@ -0,0 +1,182 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.celery import app as celery_app
+from .management.commands.profile_startup import parse_importtime
+from .utils import percentile, summarize
+
+
+class SummarizeTest(SimpleTestCase):
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.50), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize_reports_milliseconds(self):
+        summary = summarize([0.001, 0.002, 0.003])
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['p50'], 2.0)
+        self.assertEqual(summary['max'], 3.0)
+
+    def test_summarize_empty(self):
+        self.assertEqual(summarize([])['count'], 0)
+
+
+class CeleryConfigTest(SimpleTestCase):
+    def test_task_routes(self):
+        route = celery_app.amqp.router.route({}, 'apps.authentication.tasks.flush_verification_emails')
+        self.assertEqual(route['queue'].name, 'default')
+
+    def test_worker_tuning(self):
+        self.assertTrue(celery_app.conf.task_acks_late)
+        self.assertEqual(celery_app.conf.worker_prefetch_multiplier, 1)
+        self.assertTrue(celery_app.conf.task_ignore_result)
+        self.assertIsNotNone(celery_app.conf.result_expires)
+
+
+class BenchCeleryCommandTest(SimpleTestCase):
+    def test_reports_throughput_and_latency(self):
+        out = StringIO()
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        call_command('bench_celery', tasks=5, label='eager', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['label'], 'eager')
+        self.assertEqual(report['tasks'], 5)
+        self.assertEqual(report['end_to_end_ms']['count'], 5)
+        self.assertGreater(report['tasks_per_second'], 0)
+
+
+class BenchChannelLayerCommandTest(SimpleTestCase):
+    def test_channel_layer_uses_configured_hosts(self):
+        config = settings.CHANNEL_LAYERS['default']['CONFIG']
+        self.assertEqual(config['hosts'], settings.CHANNEL_REDIS_URLS)
+
+    def test_groups_spread_evenly_over_hosts(self):
+        out = StringIO()
+        hosts = ','.join(f'redis://127.0.0.1:{6400 + i}/0' for i in range(4))
+
+        # No messages: only hashing, so no Redis server is needed
+        call_command('bench_channel_layer', hosts=hosts, groups=8000, messages=0, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['hosts'], 4)
+        self.assertEqual(sum(report['group_shards']), 8000)
+        for count in report['group_shards']:
+            self.assertAlmostEqual(count, 2000, delta=200)
+        self.assertEqual(sum(report['process_shards']), 8)
+
+
+class BenchSocketMemoryCommandTest(SimpleTestCase):
+    def test_record_is_smaller_than_orm_user(self):
+        out = StringIO()
+
+        call_command('bench_socket_memory', consumer='notifications', sockets=200, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['sockets'], 200)
+        self.assertLess(report['bytes_per_socket']['record'], report['bytes_per_socket']['orm'])
+        self.assertGreater(report['saved_per_socket'], 0)
+
+
+class ProfileStartupCommandTest(SimpleTestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     decouple\n'
+            'import time:      2500 |       2620 |   core.settings\n'
+        )
+        self.assertEqual(parse_importtime(stderr), [('decouple', 120, 120), ('core.settings', 2500, 2620)])
+
+    def test_reports_import_profile(self):
+        out = StringIO()
+
+        call_command('profile_startup', target='wsgi', runs=1, top=5, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['import_ms']['count'], 1)
+        self.assertEqual(len(report['slowest_modules']), 5)
+        self.assertGreater(report['max_rss_kb'], 0)
+        self.assertNotIn('gunicorn', report)
+
+
+class BenchTokenRefreshCommandTest(TestCase):
+    def test_compares_both_paths(self):
+        out = StringIO()
+
+        call_command('bench_token_refresh', refreshes=5, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['paths']['cache']['queries_per_refresh'], 0)
+        self.assertGreater(report['paths']['blacklist']['queries_per_refresh'], 0)
+        self.assertIn('speedup', report)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='bench-refresh-').exists())
+
+
+class BenchJwtCommandTest(SimpleTestCase):
+    def test_reports_each_algorithm(self):
+        out = StringIO()
+
+        call_command('bench_jwt', iterations=3, algorithms='HS256,EdDSA', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['algorithms']), {'HS256', 'EdDSA'})
+        self.assertIn('verify_pem_us', report['algorithms']['HS256'])
+        self.assertNotIn('verify_pem_us', report['algorithms']['EdDSA'])
+        self.assertEqual(report['algorithms']['EdDSA']['verify_us']['count'], 3)
+
+
+class BenchSerializersCommandTest(SimpleTestCase):
+    def test_reports_rates_for_each_mode(self):
+        out = StringIO()
+
+        call_command('bench_serializers', objects=20, rounds=1, stdout=out)
+
+        report = json.loads(out.getvalue())
+        for subject in ('user', 'notification'):
+            rates = report['serializers'][subject]['objects_per_second']
+            self.assertEqual(set(rates), {'drf_each', 'drf_many', 'fast_each', 'fast_values'})
+
+
+class BenchExportCommandTest(TestCase):
+    def test_reports_each_mode_and_encoding(self):
+        out = StringIO()
+
+        call_command('bench_export', rows=30, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['rows'], 31)
+        self.assertEqual(set(report['results']), {
+            f'{mode}/{encoding}' for mode in ('buffered', 'streaming') for encoding in ('identity', 'gzip', 'br')
+        })
+        self.assertLess(report['results']['streaming/br']['bytes'], report['results']['streaming/identity']['bytes'])
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class BenchApiCommandTest(TransactionTestCase):
+    def test_reports_every_scenario_on_both_servers(self):
+        out = StringIO()
+
+        # Registration would publish verification mail to the broker
+        with patch('apps.authentication.views.queue_verification_email'):
+            call_command('bench_api', users=3, requests=4, warmup=1, concurrency=2, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['servers']), {'wsgi', 'asgi'})
+        for server, scenarios in report['servers'].items():
+            self.assertEqual(set(scenarios), {'login', 'refresh', 'me', 'profile_update', 'register'})
+            for name, result in scenarios.items():
+                with self.subTest(server=server, scenario=name):
+                    self.assertEqual(result['errors'], 0, result['statuses'])
+                    self.assertEqual(result['latency_ms']['count'], 4)
+            self.assertEqual(scenarios['refresh']['queries_per_request'], 0)
+        self.assertFalse(get_user_model().objects.exists())
@@ -0,0 +1,43 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import json
+import statistics
+
+# Channel layer benchmarks write under this prefix, so their cleanup flush
+# never touches the application's groups or channels.
+BENCH_CHANNEL_PREFIX = 'asgi-bench'
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, scale=1000.0):
+    """Summarize latency samples in seconds, reported in milliseconds by default."""
+    ordered = sorted(sample * scale for sample in samples)
+    if not ordered:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p50': round(percentile(ordered, 0.50), 3),
+        'p95': round(percentile(ordered, 0.95), 3),
+        'p99': round(percentile(ordered, 0.99), 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def write_report(report, output=None, stdout=None):
+    """Append ``report`` as one JSON line to ``output`` and echo it to ``stdout``."""
+    line = json.dumps(report, sort_keys=True)
+    if output:
+        with open(output, 'a') as fh:
+            fh.write(line + '\n')
+    if stdout is not None:
+        stdout.write(json.dumps(report, indent=2, sort_keys=True))
+    return line
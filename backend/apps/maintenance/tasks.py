@@ -0,0 +1,103 @@
+import logging
+import time
+from datetime import timedelta
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from apps.notifications.models import Notification
+
+from .utils import delete_in_batches
+
+logger = logging.getLogger(__name__)
+
+
+def _run_cleanup(task, queryset):
+    started = time.monotonic()
+    deleted, complete = delete_in_batches(queryset)
+    report = {
+        'task': task.name,
+        'deleted': deleted,
+        'complete': complete,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    logger.info('%(task)s deleted %(deleted)d rows in %(seconds).3fs (complete=%(complete)s)', report)
+
+    if not complete:
+        # Out of time budget: continue shortly in a fresh task instead of
+        # holding the worker (and the table) any longer.
+        task.apply_async(countdown=settings.MAINTENANCE_CONTINUATION_DELAY)
+    return report
+
+
+@shared_task(bind=True)
+def flush_expired_tokens(self):
+    """Delete expired outstanding refresh tokens and their blacklist entries."""
+    return _run_cleanup(self, OutstandingToken.objects.filter(expires_at__lt=timezone.now()))
+
+
+@shared_task(bind=True)
+def flush_expired_sessions(self):
+    """Delete expired ``django_session`` rows."""
+    return _run_cleanup(self, Session.objects.filter(expire_date__lt=timezone.now()))
+
+
+@shared_task(bind=True)
+def prune_notifications(self):
+    """Delete read notifications older than ``NOTIFICATIONS_RETENTION_DAYS``."""
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATIONS_RETENTION_DAYS)
+    return _run_cleanup(self, Notification.objects.filter(is_read=True, created_at__lt=cutoff))
+
+
+def _dead_tuple_ratio(cursor, table):
+    cursor.execute(
+        'SELECT n_live_tup, n_dead_tup FROM pg_stat_user_tables WHERE relname = %s',
+        [table]
+    )
+    row = cursor.fetchone()
+    if not row or not (row[0] + row[1]):
+        return 0.0
+    return row[1] / (row[0] + row[1])
+
+
+@shared_task
+def analyze_tables():
+    """Refresh planner statistics for hot tables.
+
+    On PostgreSQL, tables whose dead-tuple ratio exceeds
+    ``MAINTENANCE_VACUUM_THRESHOLD`` are vacuumed as well.
+    """
+    report = []
+    is_postgres = connection.vendor == 'postgresql'
+    # VACUUM cannot run inside a transaction block.
+    can_vacuum = is_postgres and not connection.in_atomic_block
+
+    with connection.cursor() as cursor:
+        for label in settings.MAINTENANCE_ANALYZE_MODELS:
+            table = apps.get_model(label)._meta.db_table
+            quoted = connection.ops.quote_name(table)
+            started = time.monotonic()
+            action = 'analyze'
+
+            if is_postgres:
+                ratio = _dead_tuple_ratio(cursor, table)
+                if can_vacuum and ratio > settings.MAINTENANCE_VACUUM_THRESHOLD:
+                    action = 'vacuum'
+                    cursor.execute(f'VACUUM (ANALYZE) {quoted}')
+                else:
+                    cursor.execute(f'ANALYZE {quoted}')
+            else:
+                cursor.execute(f'ANALYZE {quoted}')
+
+            report.append({
+                'table': table,
+                'action': action,
+                'seconds': round(time.monotonic() - started, 3),
+            })
+            logger.info('%s %s in %.3fs', action, table, report[-1]['seconds'])
+
+    return report
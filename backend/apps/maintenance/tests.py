@@ -0,0 +1,95 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from tests.utils import generate_test_password
+from .tasks import analyze_tables, flush_expired_sessions, flush_expired_tokens
+from .utils import delete_in_batches
+
+User = get_user_model()
+
+
+class MaintenanceTaskTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            first_name='Test',
+            last_name='User',
+            password=generate_test_password()
+        )
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=self.user,
+                jti=f'expired-{i}',
+                token=f'expired-{i}',
+                expires_at=now - timedelta(days=1)
+            )
+            BlacklistedToken.objects.create(token=token)
+        OutstandingToken.objects.create(
+            user=self.user,
+            jti='active',
+            token='active',
+            expires_at=now + timedelta(days=1)
+        )
+
+    def test_delete_in_batches(self):
+        deleted, complete = delete_in_batches(
+            OutstandingToken.objects.filter(jti__startswith='expired'),
+            batch_size=2,
+            time_budget=60
+        )
+
+        self.assertEqual(deleted, 5)
+        self.assertTrue(complete)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+    def test_delete_in_batches_stops_at_time_budget(self):
+        deleted, complete = delete_in_batches(
+            OutstandingToken.objects.filter(jti__startswith='expired'),
+            batch_size=2,
+            time_budget=0
+        )
+
+        self.assertEqual(deleted, 2)
+        self.assertFalse(complete)
+        self.assertEqual(OutstandingToken.objects.count(), 4)
+
+    def test_flush_expired_tokens(self):
+        report = flush_expired_tokens()
+
+        self.assertEqual(report['deleted'], 5)
+        self.assertTrue(report['complete'])
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['active'])
+
+    @override_settings(MAINTENANCE_BATCH_SIZE=2, MAINTENANCE_TIME_BUDGET=0)
+    @patch('apps.maintenance.tasks.flush_expired_tokens.apply_async')
+    def test_flush_expired_tokens_continues_when_out_of_budget(self, mock_apply_async):
+        report = flush_expired_tokens()
+
+        self.assertEqual(report['deleted'], 2)
+        self.assertFalse(report['complete'])
+        mock_apply_async.assert_called_once()
+
+    def test_flush_expired_sessions(self):
+        now = timezone.now()
+        Session.objects.create(session_key='expired', session_data='', expire_date=now - timedelta(hours=1))
+        Session.objects.create(session_key='active', session_data='', expire_date=now + timedelta(hours=1))
+
+        report = flush_expired_sessions()
+
+        self.assertEqual(report['deleted'], 1)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+    def test_analyze_tables(self):
+        report = analyze_tables()
+
+        self.assertIn('users_user', [entry['table'] for entry in report])
+        self.assertTrue(all(entry['action'] in ('analyze', 'vacuum') for entry in report))
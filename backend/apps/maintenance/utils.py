@@ -0,0 +1,34 @@
+"""
+Bounded-size, time-boxed bulk operations for housekeeping tasks.
+
+Every batch is its own short transaction, so a large cleanup never holds
+row locks for long and concurrent requests interleave between batches.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+
+def delete_in_batches(queryset, batch_size=None, time_budget=None):
+    """Delete the rows of ``queryset`` in primary-key batches.
+
+    Stops once nothing matches or ``time_budget`` seconds have elapsed.
+    Returns ``(deleted, complete)`` where ``deleted`` counts rows of
+    ``queryset``'s model (cascaded rows are not included).
+    """
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    time_budget = settings.MAINTENANCE_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    manager = queryset.model._base_manager
+    deleted = 0
+
+    while True:
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted, True
+        with transaction.atomic():
+            manager.filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if time.monotonic() >= deadline:
+            return deleted, False
@@ -0,0 +1,33 @@
+"""
+Cache backends that count hits and misses for the metrics middleware.
+
+Use ``apps.metrics.cache.RedisCache`` / ``LocMemCache`` in ``CACHES``
+in place of the Django backends of the same name.
+"""
+from django.core.cache.backends import locmem, redis
+
+from .instrumentation import record_cache
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if not key.startswith('metrics:'):
+            record_cache(value is not _missing, value is _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class RedisCache(CacheMetricsMixin, redis.RedisCache):
+    pass
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
@@ -0,0 +1,102 @@
+"""
+Metric definitions and the per-request context the collectors write to.
+
+Collectors (SQL wrapper, cache backend, serializer and consumer mixins)
+only do work while a sampled request or message has set
+``current_stats``; with sampling off they cost one context variable
+lookup. Connection gauges and frame counters are kept for every socket
+while metrics are enabled, since a sampled gauge would drift.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .registry import COUNT_BUCKETS, registry
+
+current_stats = ContextVar('metrics_current_stats', default=None)
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by view.', ('view', 'method'))
+REQUESTS = registry.counter(
+    'http_requests_total', 'Sampled requests by view and status.', ('view', 'method', 'status'))
+SQL_QUERIES = registry.histogram(
+    'http_request_sql_queries', 'SQL queries per request by view.', ('view',), buckets=COUNT_BUCKETS)
+SQL_DURATION = registry.histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request by view.', ('view',))
+SERIALIZER_DURATION = registry.histogram(
+    'serializer_duration_seconds', 'Serializer .data time per request by view.', ('view',))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by view and result.', ('view', 'result'))
+CONSUMER_HANDLER_DURATION = registry.histogram(
+    'websocket_handler_duration_seconds', 'Consumer message handling latency.', ('consumer', 'type'))
+WEBSOCKET_CONNECTIONS = registry.gauge(
+    'websocket_connections', 'Open sockets by consumer.', ('consumer',))
+WEBSOCKET_GROUPS = registry.gauge(
+    'websocket_groups', 'Groups with at least one local socket, by consumer.', ('consumer',))
+WEBSOCKET_HANDSHAKES = registry.counter(
+    'websocket_handshakes_total', 'Handshakes by consumer and result.', ('consumer', 'result'))
+WEBSOCKET_HANDSHAKE_DURATION = registry.histogram(
+    'websocket_handshake_duration_seconds', 'Time from connect to accept.', ('consumer',))
+WEBSOCKET_MESSAGES = registry.counter(
+    'websocket_messages_total', 'Frames by consumer, direction and type.', ('consumer', 'direction', 'type'))
+WEBSOCKET_REAPED = registry.counter(
+    'websocket_reaped_total', 'Sockets closed for missing heartbeats.', ('consumer',))
+WEBSOCKET_DELIVERY_LATENCY = registry.histogram(
+    'websocket_delivery_latency_seconds', 'Time from group_send to the frame being sent.', ('consumer', 'type'))
+
+
+def enabled():
+    return settings.METRICS_SAMPLE_RATE > 0
+
+
+def sampled():
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+class Stats:
+    """Counters accumulated over one sampled request or consumer message."""
+
+    __slots__ = ('sql_queries', 'sql_seconds', 'serializer_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_queries += 1
+            self.sql_seconds += time.perf_counter() - started
+
+    def emit(self, view, sql=True):
+        """Record the accumulated counters under ``view``."""
+        if sql:
+            SQL_QUERIES.observe(self.sql_queries, view=view)
+            SQL_DURATION.observe(self.sql_seconds, view=view)
+        if self.serializer_seconds:
+            SERIALIZER_DURATION.observe(self.serializer_seconds, view=view)
+        if self.cache_hits:
+            CACHE_REQUESTS.inc(self.cache_hits, view=view, result='hit')
+        if self.cache_misses:
+            CACHE_REQUESTS.inc(self.cache_misses, view=view, result='miss')
+
+
+def record_cache(hits, misses):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record_serializer(seconds):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.serializer_seconds += seconds
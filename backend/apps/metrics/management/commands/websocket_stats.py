@@ -0,0 +1,106 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.metrics.registry import histogram_quantile, registry
+
+
+def _values(snapshot, name, **match):
+    """``(labels, value)`` pairs of metric ``name`` whose labels match ``match``."""
+    metric = snapshot.get(name)
+    if not metric:
+        return []
+    pairs = []
+    for key, value in metric['values'].items():
+        labels = dict(zip(metric['labelnames'], key))
+        if all(labels.get(label) == wanted for label, wanted in match.items()):
+            pairs.append((labels, value))
+    return pairs
+
+
+def _total(snapshot, name, **match):
+    return sum(value for _, value in _values(snapshot, name, **match))
+
+
+def _quantiles_ms(snapshot, name, quantiles, **match):
+    metric = snapshot.get(name)
+    pairs = _values(snapshot, name, **match)
+    if not pairs:
+        return [None] * len(quantiles)
+    counts = [sum(column) for column in zip(*(value[0] for _, value in pairs))]
+    return [histogram_quantile(q, metric['buckets'], counts) for q in quantiles]
+
+
+def _ms(value):
+    return '-' if value is None else f'{value * 1000:.1f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Print a live summary of WebSocket metrics merged across every '
+        'process: open sockets and groups, handshake outcomes and latency, '
+        'frame rates and group_send-to-socket delivery latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between refreshes (default: METRICS_PUBLISH_INTERVAL)')
+        parser.add_argument('--once', action='store_true', help='Print one summary and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.METRICS_PUBLISH_INTERVAL
+        previous, previous_at = None, None
+        while True:
+            snapshot = registry.collect(publish=False)
+            now = time.monotonic()
+            self.stdout.write(self.render(snapshot, previous, now - previous_at if previous else None))
+            if options['once']:
+                return
+            previous, previous_at = snapshot, now
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
+
+    def render(self, snapshot, previous, elapsed):
+        consumers = sorted({
+            labels['consumer']
+            for name in ('websocket_connections', 'websocket_handshakes_total', 'websocket_messages_total')
+            for labels, _ in _values(snapshot, name)
+        })
+        lines = [time.strftime('%H:%M:%S')]
+        if not consumers:
+            lines.append('  no WebSocket metrics published yet')
+        for consumer in consumers:
+            counts = {
+                key: _total(snapshot, name, consumer=consumer, **match)
+                for key, name, match in (
+                    ('connections', 'websocket_connections', {}),
+                    ('groups', 'websocket_groups', {}),
+                    ('accepted', 'websocket_handshakes_total', {'result': 'accepted'}),
+                    ('rejected', 'websocket_handshakes_total', {'result': 'rejected'}),
+                    ('in', 'websocket_messages_total', {'direction': 'in'}),
+                    ('out', 'websocket_messages_total', {'direction': 'out'}),
+                )
+            }
+            rates = ''
+            if previous is not None and elapsed:
+                rate_in = (counts['in'] - _total(previous, 'websocket_messages_total', consumer=consumer,
+                                                 direction='in')) / elapsed
+                rate_out = (counts['out'] - _total(previous, 'websocket_messages_total', consumer=consumer,
+                                                   direction='out')) / elapsed
+                rates = f' ({rate_in:.1f}/s in, {rate_out:.1f}/s out)'
+            handshake = _quantiles_ms(snapshot, 'websocket_handshake_duration_seconds', (0.5, 0.95),
+                                      consumer=consumer)
+            delivery = _quantiles_ms(snapshot, 'websocket_delivery_latency_seconds', (0.5, 0.95, 0.99),
+                                     consumer=consumer)
+            lines.extend([
+                f'  {consumer}',
+                f'    sockets {counts["connections"]:g}, groups {counts["groups"]:g}',
+                f'    handshakes {counts["accepted"]:g} accepted, {counts["rejected"]:g} rejected, '
+                f'p50 {_ms(handshake[0])} ms, p95 {_ms(handshake[1])} ms',
+                f'    frames {counts["in"]:g} in, {counts["out"]:g} out{rates}',
+                f'    delivery p50 {_ms(delivery[0])} ms, p95 {_ms(delivery[1])} ms, p99 {_ms(delivery[2])} ms',
+            ])
+        return '\n'.join(lines)
@@ -0,0 +1,69 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .instrumentation import REQUEST_DURATION, REQUESTS, Stats, current_stats, sampled
+from .queries import QueryInspector
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """Record latency, SQL, cache and serializer metrics for sampled requests.
+
+    Place it first in ``MIDDLEWARE`` so the latency covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sampled():
+            return self.get_response(request)
+
+        stats = Stats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats.sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        REQUEST_DURATION.observe(duration, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        stats.emit(view)
+
+        registry.maybe_publish()
+        return response
+
+
+class QueryInspectionMiddleware:
+    """Development aid: log SQL templates repeated within one request.
+
+    A template run ``QUERY_INSPECTION_THRESHOLD`` or more times in a request
+    is almost always an N+1; the log entry includes where the first
+    repetition was issued. Adds an ``X-Query-Count`` response header.
+    Enable with ``QUERY_INSPECTION=True``; never in production.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryInspector(capture_stacks=True) as inspector:
+            response = self.get_response(request)
+
+        for sql, times, stack in inspector.repeated(settings.QUERY_INSPECTION_THRESHOLD):
+            logger.warning(
+                'Possible N+1 on %s %s: query repeated %d times\n%s\nFirst repeated at:\n%s',
+                request.method, request.path, times, sql, stack
+            )
+        response['X-Query-Count'] = str(inspector.count)
+        return response
@@ -0,0 +1,119 @@
+import json
+import time
+from collections import Counter
+
+from .instrumentation import (
+    CONSUMER_HANDLER_DURATION, WEBSOCKET_CONNECTIONS, WEBSOCKET_DELIVERY_LATENCY, WEBSOCKET_GROUPS,
+    WEBSOCKET_HANDSHAKE_DURATION, WEBSOCKET_HANDSHAKES, WEBSOCKET_MESSAGES, Stats, current_stats,
+    enabled, record_serializer, sampled,
+)
+from .registry import registry
+
+# Local sockets per (consumer, group), for the websocket_groups gauge
+_group_sockets = Counter()
+
+
+class SerializerMetricsMixin:
+    """Time ``.data`` (i.e. ``to_representation``) of a DRF serializer."""
+
+    @property
+    def data(self):
+        if current_stats.get() is None:
+            return super().data
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serializer(time.perf_counter() - started)
+
+
+class ConsumerMetricsMixin:
+    """Record connections, frames and per-message latency for a consumer.
+
+    Open sockets and groups are tracked from ``accept`` to disconnect; the
+    group is read from ``room_group_name``. Group events carrying a
+    ``sent_at`` timestamp record how long they took to reach the socket.
+    Consumers send frames with ``send_json`` and report parsed inbound
+    frames with ``record_inbound`` so both are counted by type; types not
+    listed in ``frame_types`` are counted as ``other`` to keep client-chosen
+    values out of the label set.
+
+    SQL is not counted here: consumer queries run in the
+    ``database_sync_to_async`` thread pool, outside this task's connection.
+    """
+
+    frame_types = frozenset()
+    metrics_connected = False
+    metrics_connect_started = None
+
+    async def dispatch(self, message):
+        if not enabled():
+            return await super().dispatch(message)
+
+        name = type(self).__name__
+        handler = message.get('type', '')
+        if handler == 'websocket.connect':
+            self.metrics_connect_started = time.perf_counter()
+
+        stats = Stats() if sampled() else None
+        token = current_stats.set(stats) if stats else None
+        started = time.perf_counter()
+        try:
+            return await super().dispatch(message)
+        finally:
+            if stats:
+                current_stats.reset(token)
+                CONSUMER_HANDLER_DURATION.observe(time.perf_counter() - started, consumer=name, type=handler)
+                stats.emit(f'{name}.{handler}', sql=False)
+            if 'sent_at' in message:
+                WEBSOCKET_DELIVERY_LATENCY.observe(
+                    max(0.0, time.time() - message['sent_at']), consumer=name, type=handler)
+            if handler == 'websocket.connect' and not self.metrics_connected:
+                result = 'throttled' if getattr(self, 'admission_rejected', False) else 'rejected'
+                WEBSOCKET_HANDSHAKES.inc(consumer=name, result=result)
+            elif handler == 'websocket.disconnect':
+                self.metrics_disconnected()
+            registry.maybe_publish()
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        # Sockets accepted only to be told to retry later are not connections
+        if not enabled() or self.metrics_connected or getattr(self, 'admission_rejected', False):
+            return
+
+        name = type(self).__name__
+        self.metrics_connected = True
+        WEBSOCKET_HANDSHAKES.inc(consumer=name, result='accepted')
+        WEBSOCKET_CONNECTIONS.inc(consumer=name)
+        if self.metrics_connect_started is not None:
+            WEBSOCKET_HANDSHAKE_DURATION.observe(time.perf_counter() - self.metrics_connect_started, consumer=name)
+        group = getattr(self, 'room_group_name', None)
+        if group:
+            _group_sockets[name, group] += 1
+            WEBSOCKET_GROUPS.set(sum(1 for consumer, _ in _group_sockets if consumer == name), consumer=name)
+
+    def metrics_disconnected(self):
+        if not self.metrics_connected:
+            return
+
+        name = type(self).__name__
+        self.metrics_connected = False
+        WEBSOCKET_CONNECTIONS.dec(consumer=name)
+        group = getattr(self, 'room_group_name', None)
+        if group:
+            _group_sockets[name, group] -= 1
+            if _group_sockets[name, group] <= 0:
+                del _group_sockets[name, group]
+            WEBSOCKET_GROUPS.set(sum(1 for consumer, _ in _group_sockets if consumer == name), consumer=name)
+
+    def count_frame(self, direction, frame_type):
+        if enabled():
+            label = frame_type if frame_type in self.frame_types else 'other'
+            WEBSOCKET_MESSAGES.inc(consumer=type(self).__name__, direction=direction, type=label)
+
+    def record_inbound(self, frame_type):
+        self.count_frame('in', frame_type)
+
+    async def send_json(self, content):
+        self.count_frame('out', content.get('type'))
+        await self.send(text_data=json.dumps(content))
@@ -0,0 +1,99 @@
+"""
+Query counting for tests and N+1 detection for development.
+
+``query_budget`` fails when a block runs more queries than allowed;
+``QueryInspector`` groups the queries of a request by SQL template so
+repeated templates (the N+1 signature) can be reported with a stack trace.
+"""
+import traceback
+from collections import defaultdict
+from contextlib import ContextDecorator, ExitStack
+
+from django.db import connections
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _app_stack(limit):
+    """Stack frames outside Django and third-party packages, innermost last."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if 'site-packages' not in frame.filename and '/django/' not in frame.filename
+    ]
+    return ''.join(traceback.format_list(frames[-limit:]))
+
+
+class QueryInspector:
+    """Record every query on all database connections while active."""
+
+    def __init__(self, capture_stacks=False, stack_limit=8):
+        self.capture_stacks = capture_stacks
+        self.stack_limit = stack_limit
+        self.queries = []
+        self.templates = defaultdict(int)
+        self.stacks = {}
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        self.templates[sql] += 1
+        if self.capture_stacks and self.templates[sql] == 2:
+            # Only the first repetition of a template pays for a stack trace
+            self.stacks[sql] = _app_stack(self.stack_limit)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=2):
+        """``[(sql, times, stack), ...]`` for templates run at least ``threshold`` times."""
+        report = [
+            (sql, times, self.stacks.get(sql, ''))
+            for sql, times in self.templates.items()
+            if times >= threshold
+        ]
+        return sorted(report, key=lambda item: -item[1])
+
+
+class query_budget(ContextDecorator):
+    """Fail if the wrapped block or function runs more than ``max_queries`` queries.
+
+        with query_budget(2):
+            self.client.get(url)
+
+        @query_budget(5)
+        def test_list(self): ...
+    """
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.inspector = None
+
+    def __enter__(self):
+        self.inspector = QueryInspector().__enter__()
+        return self.inspector
+
+    def __exit__(self, exc_type, exc, tb):
+        self.inspector.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.inspector.count > self.max_queries:
+            listing = '\n'.join(
+                f'{index}. {sql} {params}'
+                for index, (sql, params) in enumerate(self.inspector.queries, 1)
+            )
+            raise QueryBudgetExceeded(
+                f'{self.inspector.count} queries executed, budget is {self.max_queries}:\n{listing}'
+            )
+        return False
@@ -0,0 +1,251 @@
+"""
+Process-local metrics with Prometheus text exposition.
+
+Each process (gunicorn/daphne/celery worker) records into its own
+``registry`` and publishes a snapshot to the shared cache at most every
+``METRICS_PUBLISH_INTERVAL`` seconds. The ``/metrics`` endpoint merges the
+snapshots of every live process, so one scrape covers the whole node; see
+``store`` for how counters of exited processes are kept.
+"""
+import bisect
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+from .store import RedisStore, flatten, local_store, unflatten
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _process_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+PROCESS_ID = _process_id()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), lock=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = lock or threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with self.lock:
+            return {'kind': self.kind, 'help': self.documentation,
+                    'labelnames': self.labelnames, 'values': dict(self.values)}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, lock=None):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            values = {key: [list(entry[0]), entry[1], entry[2]] for key, entry in self.values.items()}
+        return {'kind': self.kind, 'help': self.documentation, 'labelnames': self.labelnames,
+                'buckets': self.buckets, 'values': values}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.published_at = 0.0
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    def clear(self):
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                metric.values.clear()
+
+    def publish(self):
+        """Store this process's snapshot in the shared cache."""
+        now = time.time()
+        store().publish(PROCESS_ID, now, *flatten(self.snapshot()))
+        self.published_at = now
+
+    def maybe_publish(self):
+        if time.time() - self.published_at >= settings.METRICS_PUBLISH_INTERVAL:
+            self.publish()
+
+    def collect(self, publish=True):
+        """Merged snapshot of every process that published recently."""
+        if publish:
+            self.publish()
+        # Not published for this long: the process is taken for dead
+        cutoff = time.time() - settings.METRICS_PUBLISH_INTERVAL * 6
+        return unflatten(*store().collect(cutoff))
+
+
+def store():
+    backend = caches['default']
+    return RedisStore(backend) if isinstance(backend, RedisCache) else local_store
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            for key, value in metric['values'].items():
+                if metric['kind'] == 'histogram':
+                    current = target['values'].get(key)
+                    if current is None:
+                        target['values'][key] = [list(value[0]), value[1], value[2]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                else:
+                    target['values'][key] = target['values'].get(key, 0) + value
+    return merged
+
+
+def histogram_quantile(q, buckets, counts):
+    """Estimate the ``q`` quantile from per-bucket counts, as Prometheus does."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(list(buckets) + [float('inf')], counts):
+        if count and cumulative + count >= rank:
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(snapshot):
+    """Render a (merged) snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        labelnames = metric['labelnames']
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["kind"]}')
+        for key in sorted(metric['values']):
+            value = metric['values'][key]
+            if metric['kind'] == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric['buckets']) + [float('inf')], counts):
+                    cumulative += bucket_count
+                    le = _labels(labelnames, key, [('le', _number(bound))])
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labelnames, key)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(labelnames, key)} {count}')
+            else:
+                lines.append(f'{name}{_labels(labelnames, key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _after_fork():
+    # Preforking servers (gunicorn --preload, the Celery pool) import this
+    # module in the parent; each child publishes under its own id
+    global PROCESS_ID
+    PROCESS_ID = _process_id()
+    registry.clear()
+    registry.published_at = 0.0
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,214 @@
+"""
+Shared storage of per-process metric snapshots.
+
+Every process writes its snapshot to its own hash and records when it did
+in one sorted set (the index), both in a single transaction, so publishing
+never overwrites another process's entry.
+
+A process that has not published for a while is taken for dead and folded
+into a base total: its counters and histograms are added to the base and
+it leaves the index. Merged counters therefore never go down when a
+process exits, which Prometheus would read as a counter reset. Gauges of
+dead processes are dropped.
+
+What was folded is remembered per process, so a process that was only
+idle and publishes again contributes just what it counted since.
+
+``RedisStore`` works on the Redis client behind Django's ``RedisCache``;
+``LocalStore`` keeps the same structures in memory for ``LocMemCache``
+(tests and ``runserver``, one process).
+"""
+import json
+import threading
+from collections import defaultdict
+
+from redis.exceptions import WatchError
+
+INDEX_KEY = 'metrics:processes'
+BASE_KEY = 'metrics:base'
+META_KEY = 'metrics:meta'
+# Process snapshots and fold records outlive any idle gap a live process has
+SNAPSHOT_TTL = 86400
+TRANSACTION_RETRIES = 5
+
+
+def process_key(pid):
+    return f'metrics:process:{pid}'
+
+
+def folded_key(pid):
+    return f'metrics:folded:{pid}'
+
+
+def flatten(snapshot):
+    """``(fields, meta)`` of a registry snapshot: one number per series part.
+
+    Field names are JSON ``[cumulative, name, label values, part]``, where
+    part is a histogram bucket index, ``"sum"`` or ``"count"``.
+    """
+    fields, meta = {}, {}
+    for name, metric in snapshot.items():
+        meta[name] = json.dumps({key: value for key, value in metric.items() if key != 'values'})
+        cumulative = metric['kind'] != 'gauge'
+        for key, value in metric['values'].items():
+            if metric['kind'] == 'histogram':
+                counts, total, count = value
+                parts = [*enumerate(counts), ('sum', total), ('count', count)]
+            else:
+                parts = [(None, value)]
+            for part, number in parts:
+                fields[json.dumps([cumulative, name, list(key), part])] = number
+    return fields, meta
+
+
+def unflatten(fields, meta):
+    """The registry snapshot shape of ``fields``, for ``render``."""
+    snapshot = {}
+    for field, number in fields.items():
+        _cumulative, name, key, part = json.loads(field)
+        if name not in meta:
+            continue
+        metric = snapshot.get(name)
+        if metric is None:
+            metric = snapshot[name] = json.loads(meta[name])
+            metric['labelnames'] = tuple(metric['labelnames'])
+            if 'buckets' in metric:
+                metric['buckets'] = tuple(metric['buckets'])
+            metric['values'] = {}
+        key = tuple(key)
+        number = int(number) if float(number).is_integer() else float(number)
+        if metric['kind'] == 'histogram':
+            entry = metric['values'].setdefault(key, [[0] * (len(metric['buckets']) + 1), 0, 0])
+            if part == 'sum':
+                entry[1] = number
+            elif part == 'count':
+                entry[2] = number
+            else:
+                entry[0][part] = number
+        else:
+            metric['values'][key] = number
+    return snapshot
+
+
+def is_cumulative(field):
+    return field.startswith('[true')
+
+
+def fold(raw, folded):
+    """``(increments, new folded)``: what of ``raw`` is not yet in the base."""
+    increments, now_folded = {}, {}
+    for field, number in raw.items():
+        if is_cumulative(field):
+            increment = number - folded.get(field, 0)
+            if increment > 0:
+                increments[field] = increment
+            now_folded[field] = number
+    return increments, now_folded
+
+
+def combine(base, processes):
+    """Base plus each process's values not yet folded (gauges as they are)."""
+    fields = defaultdict(float, base)
+    for raw, folded in processes:
+        for field, number in raw.items():
+            fields[field] += number - folded.get(field, 0) if is_cumulative(field) else number
+    return dict(fields)
+
+
+def _decode(mapping):
+    return {field.decode(): float(number) for field, number in mapping.items()}
+
+
+class RedisStore:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def key(self, key):
+        return self.cache.make_and_validate_key(key)
+
+    def client(self):
+        return self.cache._cache.get_client(write=True)
+
+    def publish(self, pid, now, fields, meta):
+        pipe = self.client().pipeline(transaction=True)
+        pipe.delete(self.key(process_key(pid)))
+        if fields:
+            pipe.hset(self.key(process_key(pid)), mapping=fields)
+        pipe.expire(self.key(process_key(pid)), SNAPSHOT_TTL)
+        if meta:
+            pipe.hset(self.key(META_KEY), mapping=meta)
+        pipe.zadd(self.key(INDEX_KEY), {pid: now})
+        pipe.execute()
+
+    def collect(self, cutoff):
+        """``(fields, meta)`` merged over live processes and the base, after folding dead ones."""
+        index = self.key(INDEX_KEY)
+        with self.client().pipeline() as pipe:
+            for _attempt in range(TRANSACTION_RETRIES):
+                try:
+                    # Every publish and fold changes the index, so watching it
+                    # makes folding and reading one consistent step
+                    pipe.watch(index)
+                    seen = {pid.decode(): score for pid, score in pipe.zrange(index, 0, -1, withscores=True)}
+                    stale = [pid for pid, score in seen.items() if score < cutoff]
+                    dead = {
+                        pid: (_decode(pipe.hgetall(self.key(process_key(pid)))),
+                              _decode(pipe.hgetall(self.key(folded_key(pid)))))
+                        for pid in stale
+                    }
+                    live = [pid for pid in seen if pid not in dead]
+
+                    pipe.multi()
+                    for pid, (raw, folded) in dead.items():
+                        increments, now_folded = fold(raw, folded)
+                        for field, increment in increments.items():
+                            pipe.hincrbyfloat(self.key(BASE_KEY), field, increment)
+                        if now_folded:
+                            pipe.hset(self.key(folded_key(pid)), mapping=now_folded)
+                            pipe.expire(self.key(folded_key(pid)), SNAPSHOT_TTL)
+                        pipe.zrem(index, pid)
+                    pipe.hgetall(self.key(META_KEY))
+                    pipe.hgetall(self.key(BASE_KEY))
+                    for pid in live:
+                        pipe.hgetall(self.key(process_key(pid)))
+                        pipe.hgetall(self.key(folded_key(pid)))
+                    results = pipe.execute()
+                    break
+                except WatchError:
+                    continue
+            else:
+                raise WatchError('Metrics index kept changing while collecting')
+
+        results = results[len(results) - 2 - 2 * len(live):]
+        meta = {name.decode(): value.decode() for name, value in results[0].items()}
+        processes = [(_decode(raw), _decode(folded)) for raw, folded in zip(results[2::2], results[3::2])]
+        return combine(_decode(results[1]), processes), meta
+
+
+class LocalStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.index, self.processes, self.folded, self.base, self.meta = {}, {}, {}, {}, {}
+
+    def publish(self, pid, now, fields, meta):
+        with self.lock:
+            self.processes[pid] = dict(fields)
+            self.meta.update(meta)
+            self.index[pid] = now
+
+    def collect(self, cutoff):
+        with self.lock:
+            for pid in [pid for pid, seen in self.index.items() if seen < cutoff]:
+                increments, now_folded = fold(self.processes.get(pid, {}), self.folded.get(pid, {}))
+                for field, increment in increments.items():
+                    self.base[field] = self.base.get(field, 0) + increment
+                self.folded[pid] = now_folded
+                del self.index[pid]
+            processes = [(self.processes.get(pid, {}), self.folded.get(pid, {})) for pid in self.index]
+            return combine(self.base, processes), dict(self.meta)
+
+
+local_store = LocalStore()
@@ -0,0 +1,303 @@
+import os
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from apps.notifications.models import Notification
+from tests.utils import generate_test_password
+from .instrumentation import (
+    WEBSOCKET_CONNECTIONS, WEBSOCKET_DELIVERY_LATENCY, WEBSOCKET_HANDSHAKES, WEBSOCKET_MESSAGES, Stats,
+    current_stats,
+)
+from .queries import QueryBudgetExceeded, QueryInspector, query_budget
+from . import registry as registry_module
+from .registry import Registry, histogram_quantile, merge, registry, render
+from .store import LocalStore, flatten, unflatten
+
+User = get_user_model()
+
+
+class RegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge_render(self):
+        self.registry.counter('jobs_total', 'Jobs.', ('queue',)).inc(queue='bulk')
+        self.registry.counter('jobs_total', 'Jobs.', ('queue',)).inc(2, queue='bulk')
+        self.registry.gauge('sockets', 'Open sockets.').set(3)
+
+        text = render(self.registry.snapshot())
+
+        self.assertIn('# TYPE jobs_total counter', text)
+        self.assertIn('jobs_total{queue="bulk"} 3', text)
+        self.assertIn('sockets 3', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5):
+            histogram.observe(value)
+
+        text = render(self.registry.snapshot())
+
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count 4', text)
+        self.assertIn('latency_seconds_sum 6.25', text)
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('odd_total', 'Odd.', ('view',)).inc(view='a"b')
+        self.assertIn('odd_total{view="a\\"b"} 1', render(self.registry.snapshot()))
+
+    def test_histogram_quantile_interpolates(self):
+        # 10 observations in (0, 0.1], 10 in (0.1, 0.2]
+        self.assertAlmostEqual(histogram_quantile(0.5, (0.1, 0.2), [10, 10, 0]), 0.1)
+        self.assertAlmostEqual(histogram_quantile(0.75, (0.1, 0.2), [10, 10, 0]), 0.15)
+        self.assertIsNone(histogram_quantile(0.5, (0.1, 0.2), [0, 0, 0]))
+
+    def test_merge_sums_processes(self):
+        other = Registry()
+        for reg in (self.registry, other):
+            reg.counter('requests_total', 'Requests.').inc()
+            reg.histogram('latency_seconds', 'Latency.', buckets=(1.0,)).observe(0.5)
+
+        merged = merge([self.registry.snapshot(), other.snapshot()])
+
+        self.assertEqual(merged['requests_total']['values'][()], 2)
+        self.assertEqual(merged['latency_seconds']['values'][()][2], 2)
+
+    def test_forked_child_publishes_as_itself(self):
+        registry.counter('requests_total', 'Requests.').inc()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if not pid:
+            # Child of a preloading server: own id, nothing inherited
+            values = registry.snapshot()['requests_total']['values']
+            os.write(write_end, f'{registry_module.PROCESS_ID}|{len(values)}'.encode())
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        process_id, inherited = os.read(read_end, 200).decode().split('|')
+        os.close(read_end)
+
+        self.assertTrue(process_id.endswith(f':{pid}'))
+        self.assertNotEqual(process_id, registry_module.PROCESS_ID)
+        self.assertEqual(inherited, '0')
+
+
+class MetricsStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.store = LocalStore()
+
+    def publish(self, pid, at, requests, sockets=0):
+        process = Registry()
+        process.counter('requests_total', 'Requests.').inc(requests)
+        process.gauge('sockets', 'Open sockets.').set(sockets)
+        process.histogram('latency_seconds', 'Latency.', buckets=(1.0,)).observe(0.5)
+        self.store.publish(pid, at, *flatten(process.snapshot()))
+
+    def collect(self, cutoff):
+        return unflatten(*self.store.collect(cutoff))
+
+    def test_processes_publish_side_by_side(self):
+        self.publish('a', 100, 2, sockets=1)
+        self.publish('b', 100, 3, sockets=4)
+
+        merged = self.collect(cutoff=50)
+
+        self.assertEqual(merged['requests_total']['values'][()], 5)
+        self.assertEqual(merged['sockets']['values'][()], 5)
+        self.assertEqual(merged['latency_seconds']['values'][()], [[2, 0], 1, 2])
+
+    def test_exited_process_counts_are_kept(self):
+        self.publish('a', 100, 2, sockets=1)
+        self.publish('b', 200, 3, sockets=4)
+
+        merged = self.collect(cutoff=150)
+
+        self.assertEqual(self.store.index.keys(), {'b'})
+        self.assertEqual(merged['requests_total']['values'][()], 5)
+        self.assertEqual(merged['latency_seconds']['values'][()][2], 2)
+        # A gauge describes a live process only
+        self.assertEqual(merged['sockets']['values'][()], 4)
+
+    def test_idle_process_is_not_counted_twice(self):
+        self.publish('a', 100, 2)
+        self.collect(cutoff=150)
+
+        self.publish('a', 200, 7)
+
+        self.assertEqual(self.collect(cutoff=150)['requests_total']['values'][()], 7)
+        self.assertEqual(self.collect(cutoff=250)['requests_total']['values'][()], 7)
+
+    def test_flatten_round_trips(self):
+        process = Registry()
+        process.counter('jobs_total', 'Jobs.', ('queue',)).inc(3, queue='bulk')
+        process.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0)).observe(0.5)
+
+        self.assertEqual(render(unflatten(*flatten(process.snapshot()))), render(process.snapshot()))
+
+
+@override_settings(METRICS_TOKEN='secret')
+class RequestMetricsMiddlewareTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            first_name='Test',
+            last_name='User',
+            password=generate_test_password()
+        )
+
+    def scrape(self):
+        return self.client.get(reverse('metrics:metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    def test_records_view_latency_and_sql(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('users:me'))
+
+        text = self.scrape()
+
+        self.assertIn('http_request_duration_seconds_count{view="users:me",method="GET"} 1', text)
+        self.assertIn('http_requests_total{view="users:me",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_sql_queries_count{view="users:me"} 1', text)
+        self.assertIn('serializer_duration_seconds_count{view="users:me"} 1', text)
+
+    def test_records_cache_hits_and_misses(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('notifications:unread_count'))
+        self.client.get(reverse('notifications:unread_count'))
+
+        text = self.scrape()
+
+        self.assertIn('cache_requests_total{view="notifications:unread_count",result="miss"} 1', text)
+        self.assertIn('cache_requests_total{view="notifications:unread_count",result="hit"} 1', text)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_records_nothing(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('users:me'))
+
+        self.assertNotIn('view="users:me"', self.scrape())
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics:metrics')).status_code, 403)
+
+        response = self.client.get(reverse('metrics:metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_token_required_unless_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics:metrics')).status_code, 403)
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics:metrics')).status_code, 200)
+
+
+class StatsTest(TestCase):
+    def test_sql_wrapper_counts_queries(self):
+        from django.db import connection
+
+        stats = Stats()
+        with connection.execute_wrapper(stats.sql_wrapper):
+            User.objects.count()
+            User.objects.exists()
+
+        self.assertEqual(stats.sql_queries, 2)
+        self.assertIsNone(current_stats.get())
+
+
+class QueryBudgetTest(TestCase):
+    def test_within_budget(self):
+        with query_budget(2) as inspector:
+            User.objects.count()
+            User.objects.exists()
+
+        self.assertEqual(inspector.count, 2)
+
+    def test_over_budget_lists_queries(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(1):
+                User.objects.count()
+                User.objects.exists()
+
+        self.assertIn('2 queries executed, budget is 1', str(raised.exception))
+        self.assertIn('users_user', str(raised.exception))
+
+    def test_as_decorator(self):
+        @query_budget(0)
+        def run_query():
+            User.objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            run_query()
+
+    def test_inspector_reports_repeated_templates(self):
+        with QueryInspector(capture_stacks=True) as inspector:
+            for user_id in range(4):
+                User.objects.filter(pk=user_id).exists()
+            User.objects.count()
+
+        repeated = inspector.repeated(threshold=3)
+        self.assertEqual(len(repeated), 1)
+        sql, times, stack = repeated[0]
+        self.assertEqual(times, 4)
+        self.assertIn('test_inspector_reports_repeated_templates', stack)
+
+
+class QueryInspectionMiddlewareTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            first_name='Test',
+            last_name='User',
+            password=generate_test_password()
+        )
+
+    @override_settings(QUERY_INSPECTION_THRESHOLD=1)
+    def test_logs_repeated_queries(self):
+        from django.conf import settings
+
+        middleware = ['apps.metrics.middleware.QueryInspectionMiddleware'] + settings.MIDDLEWARE
+        Notification.objects.create(user=self.user, message='Hello')
+        self.client.force_authenticate(user=self.user)
+
+        with override_settings(MIDDLEWARE=middleware):
+            with self.assertLogs('apps.metrics.middleware', level='WARNING') as logs:
+                response = self.client.get(reverse('notifications:list'))
+
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertIn('Possible N+1 on GET /api/notifications/', logs.output[0])
+
+
+class WebSocketStatsCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_prints_summary(self):
+        WEBSOCKET_CONNECTIONS.inc(3, consumer='ChatConsumer')
+        WEBSOCKET_HANDSHAKES.inc(4, consumer='ChatConsumer', result='accepted')
+        WEBSOCKET_MESSAGES.inc(7, consumer='ChatConsumer', direction='out', type='chat_message')
+        WEBSOCKET_DELIVERY_LATENCY.observe(0.02, consumer='ChatConsumer', type='chat_message')
+        registry.publish()
+        out = StringIO()
+
+        call_command('websocket_stats', '--once', stdout=out)
+
+        self.assertIn('ChatConsumer', out.getvalue())
+        self.assertIn('sockets 3', out.getvalue())
+        self.assertIn('handshakes 4 accepted, 0 rejected', out.getvalue())
+        self.assertIn('frames 0 in, 7 out', out.getvalue())
+        self.assertIn('delivery p50 17.5 ms', out.getvalue())
@@ -0,0 +1,24 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .registry import registry, render
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint covering every process on this node"""
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        # Metrics name every view and its traffic; never public in production
+        return HttpResponseForbidden('METRICS_TOKEN is not set')
+
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,49 @@
+"""
+Denormalized per-user unread notification counters.
+
+The counter lives in the shared cache (Redis in production) so the unread
+badge is a single GET instead of a ``COUNT(*)``. A missing key is rebuilt
+from the database on the next read, keys expire after
+``NOTIFICATIONS_UNREAD_TTL`` seconds, and ``reconcile_unread_counters``
+periodically overwrites them with fresh counts, so drift is bounded.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def get_unread_count(user_id):
+    count = cache.get(unread_key(user_id))
+    if count is None:
+        count = count_unread(user_id)
+        cache.add(unread_key(user_id), count, timeout=settings.NOTIFICATIONS_UNREAD_TTL)
+    return count
+
+
+def set_unread_count(user_id, count):
+    cache.set(unread_key(user_id), count, timeout=settings.NOTIFICATIONS_UNREAD_TTL)
+
+
+def incr_unread(user_id, delta=1):
+    try:
+        cache.incr(unread_key(user_id), delta)
+    except ValueError:
+        # Not cached: the next read rebuilds it from the database.
+        pass
+
+
+def decr_unread(user_id, delta=1):
+    try:
+        if cache.decr(unread_key(user_id), delta) < 0:
+            cache.delete(unread_key(user_id))
+    except ValueError:
+        pass
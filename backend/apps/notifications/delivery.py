@@ -0,0 +1,105 @@
+"""
+Notification delivery.
+
+Bursts are coalesced per ``(user, notification_type)``: the first
+notification in a ``NOTIFICATIONS_COALESCE_WINDOW`` is pushed straight
+away, later ones in the same window are parked in the cache and sent as a
+single ``notification_digest`` frame when the window closes.
+"""
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.websockets.sequencing import stamp
+from .counters import incr_unread
+from .models import Notification
+
+
+def notification_group(user_id):
+    return f'notifications_{user_id}'
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'notification_type': notification.notification_type,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'timestamp': notification.created_at.isoformat(),
+    }
+
+
+def push(user_id, event):
+    group = notification_group(user_id)
+    async_to_sync(get_channel_layer().group_send)(group, stamp(group, event))
+
+
+def _coalesce_key(user_id, notification_type):
+    return f'notifications:coalesce:{user_id}:{notification_type}'
+
+
+def coalesce(user_id, payload):
+    """Push ``payload`` now or park it for the digest; return True if pushed."""
+    window = settings.NOTIFICATIONS_COALESCE_WINDOW
+    key = _coalesce_key(user_id, payload['notification_type'])
+    now = time.time()
+
+    # The window key holds the window's start time; whoever creates it
+    # opens a new window and is delivered immediately.
+    if window <= 0 or cache.add(f'{key}:window', now, timeout=window):
+        push(user_id, {'type': 'notification_message', **payload})
+        return True
+
+    opened_at = cache.get(f'{key}:window', now)
+    pending = f'{key}:{opened_at}'
+    timeout = window * 2 + 60
+    cache.add(f'{pending}:count', 0, timeout=timeout)
+    index = cache.incr(f'{pending}:count')
+    cache.set(f'{pending}:{index}', payload, timeout=timeout)
+
+    if index == 1:
+        from .tasks import flush_notification_digest
+
+        flush_notification_digest.apply_async(
+            args=[user_id, payload['notification_type'], opened_at],
+            countdown=max(0.0, opened_at + window - now)
+        )
+    return False
+
+
+def flush_digest(user_id, notification_type, opened_at):
+    """Send everything parked during the window opened at ``opened_at``."""
+    pending = f'{_coalesce_key(user_id, notification_type)}:{opened_at}'
+    count = cache.get(f'{pending}:count') or 0
+    keys = [f'{pending}:{index}' for index in range(1, count + 1)]
+    parked = cache.get_many(keys)
+    cache.delete_many(keys + [f'{pending}:count'])
+    items = [parked[key] for key in keys if key in parked]
+
+    if len(items) == 1:
+        push(user_id, {'type': 'notification_message', **items[0]})
+    elif items:
+        push(user_id, {
+            'type': 'notification_digest',
+            'notification_type': notification_type,
+            'count': len(items),
+            'message': f'{len(items)} new notifications',
+            'notifications': items[-settings.NOTIFICATIONS_DIGEST_PREVIEW:],
+            'timestamp': items[-1]['timestamp'],
+        })
+    return len(items)
+
+
+def notify(user_id, message, notification_type='info'):
+    """Store a notification, bump the unread counter and push it to open sockets."""
+    notification = Notification.objects.create(
+        user_id=user_id,
+        message=message,
+        notification_type=notification_type
+    )
+    incr_unread(user_id)
+    coalesce(user_id, serialize_notification(notification))
+    return notification
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import models
+
+
+class Notification(models.Model):
+    TYPE_CHOICES = (
+        ('info', 'Info'),
+        ('success', 'Success'),
+        ('warning', 'Warning'),
+        ('error', 'Error'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    notification_type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='info')
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+            models.Index(
+                fields=['user'],
+                condition=models.Q(is_read=False),
+                name='notification_user_unread_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.message[:50]}'
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from core.serializers import FastReadMixin
+from .models import Notification
+
+
+class NotificationSerializer(FastReadMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ('id', 'notification_type', 'message', 'is_read', 'created_at')
+        read_only_fields = fields
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .counters import unread_key
+from .delivery import flush_digest, notify
+from .models import Notification
+
+
+@shared_task
+def send_notification(user_id, message, notification_type='info'):
+    return notify(user_id, message, notification_type).id
+
+
+@shared_task
+def flush_notification_digest(user_id, notification_type, opened_at):
+    return flush_digest(user_id, notification_type, opened_at)
+
+
+@shared_task
+def reconcile_unread_counters(chunk_size=1000):
+    """Rewrite cached unread counters of recently notified users from the database."""
+    since = timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_UNREAD_TTL)
+    user_ids = list(
+        Notification.objects
+        .filter(created_at__gte=since)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        counts = dict.fromkeys(chunk, 0)
+        counts.update(
+            Notification.objects
+            .filter(user_id__in=chunk, is_read=False)
+            .values('user_id')
+            .annotate(unread=Count('id'))
+            .values_list('user_id', 'unread')
+        )
+        cache.set_many(
+            {unread_key(user_id): count for user_id, count in counts.items()},
+            timeout=settings.NOTIFICATIONS_UNREAD_TTL
+        )
+    return len(user_ids)
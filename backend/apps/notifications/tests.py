@@ -0,0 +1,210 @@
+import json
+from datetime import timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from apps.maintenance.tasks import prune_notifications
+from tests.utils import generate_test_password, query_budget
+from .counters import get_unread_count, unread_key
+from .delivery import flush_digest, notify
+from .models import Notification
+from .serializers import NotificationSerializer
+from .tasks import reconcile_unread_counters
+
+User = get_user_model()
+
+
+def create_user(email, username):
+    return User.objects.create_user(
+        email=email,
+        username=username,
+        first_name='Test',
+        last_name='User',
+        password=generate_test_password()
+    )
+
+
+class NotifyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('test@example.com', 'testuser')
+        self.channel_layer = Mock()
+        self.channel_layer.group_send = AsyncMock()
+        patcher = patch('apps.notifications.delivery.get_channel_layer', return_value=self.channel_layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('apps.notifications.tasks.flush_notification_digest.apply_async')
+        self.flush_apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_notify_stores_and_pushes(self):
+        notification = notify(self.user.pk, 'Hello', 'success')
+
+        self.assertTrue(Notification.objects.filter(pk=notification.pk, is_read=False).exists())
+        group, event = self.channel_layer.group_send.call_args[0]
+        self.assertEqual(group, f'notifications_{self.user.pk}')
+        self.assertEqual(event['type'], 'notification_message')
+        self.assertEqual(event['id'], notification.pk)
+        self.assertEqual(event['notification_type'], 'success')
+        self.assertIsNotNone(event['timestamp'])
+
+    def test_burst_is_coalesced_into_digest(self):
+        for i in range(5):
+            notify(self.user.pk, f'Mention {i}', 'info')
+        notify(self.user.pk, 'Warning', 'warning')
+
+        # One immediate frame per type, the rest wait for one digest flush
+        self.assertEqual(self.channel_layer.group_send.call_count, 2)
+        self.flush_apply_async.assert_called_once()
+        user_id, notification_type, opened_at = self.flush_apply_async.call_args[1]['args']
+        self.assertEqual((user_id, notification_type), (self.user.pk, 'info'))
+
+        self.assertEqual(flush_digest(user_id, notification_type, opened_at), 4)
+        group, event = self.channel_layer.group_send.call_args[0]
+        self.assertEqual(event['type'], 'notification_digest')
+        self.assertEqual(event['count'], 4)
+        self.assertEqual(event['notifications'][-1]['message'], 'Mention 4')
+        # Every notification is still stored and counted
+        self.assertEqual(get_unread_count(self.user.pk), 6)
+
+    def test_unread_counter_is_cached(self):
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        notify(self.user.pk, 'One')
+        notify(self.user.pk, 'Two')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_unread_counter_rebuilt_when_missing(self):
+        notify(self.user.pk, 'One')
+        cache.delete(unread_key(self.user.pk))
+
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+    def test_reconcile_unread_counters(self):
+        other = create_user('other@example.com', 'otheruser')
+        Notification.objects.create(user=self.user, message='One')
+        Notification.objects.create(user=other, message='Two', is_read=True)
+        cache.set(unread_key(self.user.pk), 42)
+        cache.set(unread_key(other.pk), 7)
+
+        self.assertEqual(reconcile_unread_counters(), 2)
+
+        self.assertEqual(cache.get(unread_key(self.user.pk)), 1)
+        self.assertEqual(cache.get(unread_key(other.pk)), 0)
+
+    def test_prune_notifications(self):
+        old = timezone.now() - timedelta(days=365)
+        read = Notification.objects.create(user=self.user, message='Old read', is_read=True)
+        unread = Notification.objects.create(user=self.user, message='Old unread')
+        Notification.objects.filter(pk__in=[read.pk, unread.pk]).update(created_at=old)
+        Notification.objects.create(user=self.user, message='Recent', is_read=True)
+
+        report = prune_notifications()
+
+        self.assertEqual(report['deleted'], 1)
+        self.assertFalse(Notification.objects.filter(pk=read.pk).exists())
+        self.assertTrue(Notification.objects.filter(pk=unread.pk).exists())
+
+
+class NotificationAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('test@example.com', 'testuser')
+        self.other = create_user('other@example.com', 'otheruser')
+        self.first = Notification.objects.create(user=self.user, message='First')
+        self.second = Notification.objects.create(user=self.user, message='Second')
+        Notification.objects.create(user=self.other, message='Not mine')
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_notifications(self):
+        response = self.client.get(reverse('notifications:list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['message'], 'Second')
+
+    def test_list_matches_serializer(self):
+        Notification.objects.create(user=self.user, message='Warned', notification_type='warning', is_read=True)
+        expected = NotificationSerializer(Notification.objects.filter(user=self.user), many=True).data
+
+        response = self.client.get(reverse('notifications:list'))
+
+        self.assertEqual(response.json()['results'], json.loads(JSONRenderer().render(expected)))
+
+    def test_list_query_budget(self):
+        for i in range(20):
+            Notification.objects.create(user=self.user, message=f'Extra {i}')
+
+        # COUNT for pagination and one page of rows, regardless of page size
+        with query_budget(2):
+            response = self.client.get(reverse('notifications:list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_unread_count_query_budget(self):
+        get_unread_count(self.user.pk)
+
+        with query_budget(0):
+            response = self.client.get(reverse('notifications:unread_count'))
+
+        self.assertEqual(response.data['unread_count'], 2)
+
+    def test_list_unread_only(self):
+        self.first.is_read = True
+        self.first.save()
+
+        response = self.client.get(reverse('notifications:list'), {'unread': 'true'})
+
+        self.assertEqual([n['id'] for n in response.data['results']], [self.second.pk])
+
+    def test_unread_count(self):
+        response = self.client.get(reverse('notifications:unread_count'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 2)
+
+    def test_mark_read(self):
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+
+        response = self.client.post(reverse('notifications:mark_read', args=[self.first.pk]))
+        # Marking twice must not decrement again
+        self.client.post(reverse('notifications:mark_read', args=[self.first.pk]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 1)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+        self.first.refresh_from_db()
+        self.assertTrue(self.first.is_read)
+
+    def test_mark_read_other_users_notification(self):
+        notification = Notification.objects.get(user=self.other)
+
+        response = self.client.post(reverse('notifications:mark_read', args=[notification.pk]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_read)
+
+    def test_mark_all_read(self):
+        response = self.client.post(reverse('notifications:mark_all_read'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 0)
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+        self.assertTrue(Notification.objects.filter(user=self.other, is_read=False).exists())
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse('notifications:list'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
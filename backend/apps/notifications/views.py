@@ -0,0 +1,51 @@
+from rest_framework import generics, permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from .counters import decr_unread, get_unread_count, set_unread_count
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+class NotificationListView(generics.ListAPIView):
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(user=self.request.user)
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            queryset = queryset.filter(is_read=False)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Rows straight from values(), rendered by the precompiled fields
+        queryset = NotificationSerializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(NotificationSerializer.represent_values(page))
+        return Response(NotificationSerializer.represent_values(queryset))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def unread_count(request):
+    return Response({'unread_count': get_unread_count(request.user.pk)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_read(request, pk):
+    updated = Notification.objects.filter(pk=pk, user=request.user, is_read=False).update(is_read=True)
+    if updated:
+        decr_unread(request.user.pk, updated)
+    elif not Notification.objects.filter(pk=pk, user=request.user).exists():
+        return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({'unread_count': get_unread_count(request.user.pk)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_all_read(request):
+    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    set_unread_count(request.user.pk, 0)
+    return Response({'unread_count': 0})
@@ -1,6 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+
+from .bulk import ACTIONS, DONE, export_parts, get_job, start_job
 
 User = get_user_model()
 
@@ -11,7 +16,77 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'is_verified')
     search_fields = ('email', 'username', 'first_name', 'last_name')
     ordering = ('email',)
+    actions = ('bulk_verify', 'bulk_deactivate', 'bulk_force_logout', 'bulk_export')
     
     fieldsets = UserAdmin.fieldsets + (
-        ('Additional Info', {'fields': ('is_verified',)}),
-    )
\ No newline at end of file
+        ('Additional Info', {'fields': ('is_verified', 'tokens_valid_after')}),
+    )
+
+    # Bulk actions only record the selection and hand it to a Celery job;
+    # see apps/users/bulk.py
+
+    @admin.action(description='Verify email addresses (in the background)', permissions=['change'])
+    def bulk_verify(self, request, queryset):
+        return self.start_bulk_job(request, 'verify', queryset)
+
+    @admin.action(description='Deactivate and log out (in the background)', permissions=['change'])
+    def bulk_deactivate(self, request, queryset):
+        return self.start_bulk_job(request, 'deactivate', queryset)
+
+    @admin.action(description='Force logout (in the background)', permissions=['change'])
+    def bulk_force_logout(self, request, queryset):
+        return self.start_bulk_job(request, 'force_logout', queryset)
+
+    @admin.action(description='Export as CSV (in the background)', permissions=['view'])
+    def bulk_export(self, request, queryset):
+        return self.start_bulk_job(request, 'export', queryset)
+
+    def start_bulk_job(self, request, action, queryset):
+        job = start_job(action, queryset, request.user)
+        self.message_user(
+            request,
+            f'{ACTIONS[action][0]}: started for {job["total"]} users. You will be notified when it finishes.',
+            messages.INFO
+        )
+        return HttpResponseRedirect(reverse('admin:users_user_bulk_job', args=[job['id']]))
+
+    def get_urls(self):
+        return [
+            path('bulk-jobs/<str:job_id>/', self.admin_site.admin_view(self.bulk_job_view),
+                 name='users_user_bulk_job'),
+            path('bulk-jobs/<str:job_id>/status/', self.admin_site.admin_view(self.bulk_job_status),
+                 name='users_user_bulk_job_status'),
+            path('bulk-jobs/<str:job_id>/download/', self.admin_site.admin_view(self.bulk_job_download),
+                 name='users_user_bulk_job_download'),
+        ] + super().get_urls()
+
+    def get_bulk_job(self, request, job_id):
+        job = get_job(job_id)
+        if job is None or not self.has_view_permission(request):
+            raise Http404('No such job')
+        if job['started_by'] != request.user.pk and not request.user.is_superuser:
+            raise Http404('No such job')
+        return job
+
+    def bulk_job_view(self, request, job_id):
+        job = self.get_bulk_job(request, job_id)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': ACTIONS[job['action']][0],
+            'job': job,
+            'status_url': reverse('admin:users_user_bulk_job_status', args=[job_id]),
+            'download_url': reverse('admin:users_user_bulk_job_download', args=[job_id]),
+        }
+        return TemplateResponse(request, 'admin/users/user/bulk_job.html', context)
+
+    def bulk_job_status(self, request, job_id):
+        return JsonResponse(self.get_bulk_job(request, job_id))
+
+    def bulk_job_download(self, request, job_id):
+        job = self.get_bulk_job(request, job_id)
+        if job['action'] != 'export' or job['status'] != DONE:
+            raise Http404('No export to download')
+        response = StreamingHttpResponse(export_parts(job_id), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="users-{job_id}.csv"'
+        return response
@@ -0,0 +1,215 @@
+"""
+Bulk user administration in the background.
+
+An admin action stores the selected primary keys in the cache, in chunks
+of ``BULK_ADMIN_BATCH_SIZE``, together with the job state, and enqueues
+``run_bulk_user_job``. Each task run applies the action to one chunk with
+``queryset.update()`` in its own short transaction, records progress and
+enqueues the next chunk, so no request or task holds rows for long. The
+admin who started the job follows it on a progress page and gets a
+notification, live over the notifications socket, when it finishes.
+
+Exports are written as one CSV part per chunk under ``BULK_EXPORT_DIR``,
+outside the public media root, and streamed back through the admin.
+"""
+import csv
+import io
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.authentication.refresh import invalidate_user_tokens
+from apps.notifications.delivery import notify
+
+EXPORT_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name', 'is_active', 'is_verified',
+                 'date_joined', 'last_login')
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def job_key(job_id):
+    return f'admin:bulk:{job_id}'
+
+
+def chunk_key(job_id, index):
+    return f'admin:bulk:{job_id}:chunk:{index}'
+
+
+def export_dir(job_id):
+    return Path(settings.BULK_EXPORT_DIR) / str(job_id)
+
+
+def get_job(job_id):
+    return cache.get(job_key(job_id))
+
+
+def _save(job):
+    cache.set(job_key(job['id']), job, timeout=settings.BULK_JOB_TTL)
+
+
+def start_job(action, queryset, started_by):
+    """Store the selection of ``queryset`` and enqueue the first chunk; return the job."""
+    from .tasks import run_bulk_user_job
+
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    if action in ('deactivate', 'force_logout'):
+        # Never lock the acting admin out
+        pks = [pk for pk in pks if pk != started_by.pk]
+    size = settings.BULK_ADMIN_BATCH_SIZE
+    chunks = [pks[start:start + size] for start in range(0, len(pks), size)]
+    job = {
+        'id': uuid.uuid4().hex,
+        'action': action,
+        'started_by': started_by.pk,
+        'status': PENDING,
+        'total': len(pks),
+        'processed': 0,
+        'affected': 0,
+        'chunks': len(chunks),
+        'next_chunk': 0,
+        'created_at': timezone.now().isoformat(),
+        'finished_at': None,
+        'error': None,
+    }
+    cache.set_many(
+        {chunk_key(job['id'], index): chunk for index, chunk in enumerate(chunks)},
+        timeout=settings.BULK_JOB_TTL
+    )
+    _save(job)
+    transaction.on_commit(lambda: run_bulk_user_job.delay(job['id'], 0))
+    return job
+
+
+def _verify(job, index, pks, now):
+    return get_user_model().objects.filter(pk__in=pks, is_verified=False).update(is_verified=True, updated_at=now)
+
+
+def _log_out(job, index, pks, now):
+    updated = get_user_model().objects.filter(pk__in=pks).update(tokens_valid_after=now, updated_at=now)
+    transaction.on_commit(lambda: invalidate_user_tokens(pks, now))
+    return updated
+
+
+def _deactivate(job, index, pks, now):
+    updated = get_user_model().objects.filter(pk__in=pks, is_active=True).update(
+        is_active=False, tokens_valid_after=now, updated_at=now
+    )
+    # Deactivated users' refresh tokens must stop working too
+    transaction.on_commit(lambda: invalidate_user_tokens(pks, now))
+    return updated
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    # Spreadsheets run a cell starting with one of these as a formula
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _export(job, index, pks, now):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = get_user_model().objects.filter(pk__in=pks).order_by('pk').values_list(*EXPORT_FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        count += 1
+    directory = export_dir(job['id'])
+    directory.mkdir(parents=True, exist_ok=True)
+    # Written whole, so a retried chunk replaces its part instead of adding to it
+    (directory / f'part-{index:06d}.csv').write_text(buffer.getvalue(), encoding='utf-8')
+    return count
+
+
+# name: (label, apply(job, chunk index, pks, now) -> rows affected)
+ACTIONS = {
+    'verify': ('Verify email addresses', _verify),
+    'deactivate': ('Deactivate and log out', _deactivate),
+    'force_logout': ('Force logout', _log_out),
+    'export': ('Export as CSV', _export),
+}
+
+
+def run_chunk(job_id, index, last_attempt=True):
+    """Apply the job's action to chunk ``index``; return whether more chunks remain.
+
+    An error in the action is raised again, after failing the job when this
+    is the ``last_attempt``, so the admin is notified instead of polling a
+    job that never finishes.
+    """
+    job = get_job(job_id)
+    if job is None or job['status'] in (DONE, FAILED):
+        return False
+
+    # A redelivered chunk that was already applied only moves the job on
+    if job['next_chunk'] <= index < job['chunks']:
+        pks = cache.get(chunk_key(job_id, index))
+        if pks is None:
+            _finish(job, FAILED, 'The selection expired from the cache before the job finished.')
+            return False
+        try:
+            with transaction.atomic():
+                affected = ACTIONS[job['action']][1](job, index, pks, timezone.now())
+        except Exception as exc:
+            if last_attempt:
+                _finish(job, FAILED, f'{type(exc).__name__}: {exc}')
+            raise
+        job['status'] = RUNNING
+        job['affected'] += affected
+        job['processed'] += len(pks)
+        job['next_chunk'] = index + 1
+
+    if index + 1 < job['chunks']:
+        _save(job)
+        return True
+    _finish(job, DONE)
+    return False
+
+
+def _finish(job, status, error=None):
+    job['status'] = status
+    job['error'] = error
+    job['finished_at'] = timezone.now().isoformat()
+    _save(job)
+    cache.delete_many([chunk_key(job['id'], index) for index in range(job['chunks'])])
+    label = ACTIONS[job['action']][0]
+    if status == DONE:
+        notify(job['started_by'], f'{label}: finished, {job["affected"]} of {job["total"]} users', 'success')
+    else:
+        notify(job['started_by'], f'{label}: failed after {job["processed"]} of {job["total"]} users', 'error')
+
+
+def export_parts(job_id):
+    """The CSV header and part files of an export job, in order, as text chunks."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for part in sorted(export_dir(job_id).glob('part-*.csv')):
+        yield part.read_text(encoding='utf-8')
+
+
+def prune_exports():
+    """Delete export files of jobs older than ``BULK_JOB_TTL``; return how many."""
+    root = Path(settings.BULK_EXPORT_DIR)
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - settings.BULK_JOB_TTL
+    pruned = 0
+    for directory in root.iterdir():
+        if directory.is_dir() and directory.stat().st_mtime < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            pruned += 1
+    return pruned
@@ -0,0 +1,27 @@
+import factory
+from django.contrib.auth import get_user_model
+
+DEFAULT_PASSWORD = 'load-test-password-123'
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    """Users with unique emails and usernames, all with ``DEFAULT_PASSWORD``.
+
+    Hashing the password per user is slow with the production hasher; to
+    seed many users, hash it once and pass the hash through unchanged::
+
+        hashed = factory.Transformer.Force(make_password(DEFAULT_PASSWORD))
+        User.objects.bulk_create(UserFactory.build_batch(1000, prefix='load', password=hashed))
+    """
+
+    class Meta:
+        model = get_user_model()
+
+    class Params:
+        prefix = 'user'
+
+    username = factory.LazyAttributeSequence(lambda o, n: f'{o.prefix}{n}')
+    email = factory.LazyAttribute(lambda o: f'{o.username}@example.com')
+    first_name = 'Load'
+    last_name = factory.Sequence(lambda n: f'User {n}')
+    password = factory.django.Password(DEFAULT_PASSWORD)
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:09
+
+import apps.users.models
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def normalize_emails(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    # The Lower(email) unique index in 0004 cannot be built over these
+    duplicates = list(
+        User.objects.values(normalized=Lower('email'))
+        .annotate(accounts=Count('id'))
+        .filter(accounts__gt=1)
+        .values_list('normalized', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'These emails belong to several accounts that differ only in case; merge or rename them '
+            f'before migrating: {", ".join(duplicates)}'
+        )
+    # Only the mixed-case rows are written
+    User.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', apps.users.models.UserManager()),
+            ],
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:09
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction; building the
+    # indexes this way keeps users_user writable (logins, registrations)
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_normalize_user_emails'),
+    ]
+
+    operations = [
+        core.operations.AddUniqueIndexConcurrently(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_user_email_lower_uniq'),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_verified', False)), fields=['created_at'], name='users_user_unverified_idx'),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='users_user_inactive_idx'),
+        ),
+    ]
@@ -1,5 +1,20 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+class UserManager(DjangoUserManager):
+    @classmethod
+    def normalize_email(cls, email):
+        # Clients send mixed-case addresses; the whole address is compared
+        # case-insensitively, not only the domain
+        return (email or '').strip().lower()
+
+    def get_by_natural_key(self, username):
+        # Uses the Lower(email) index, and still finds a row written with
+        # queryset.update() that skipped normalization
+        return self.get(email__lower=self.normalize_email(username))
 
 
 class User(AbstractUser):
@@ -9,9 +24,32 @@ class User(AbstractUser):
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Tokens issued before this instant are refused (forced logout)
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
+
+    objects = UserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(Lower('email'), name='users_user_email_lower_uniq'),
+        ]
+        # Partial: only the few rows the admin filters and mail tasks look for
+        indexes = [
+            models.Index(fields=['created_at'], condition=Q(is_active=True, is_verified=False),
+                         name='users_user_unverified_idx'),
+            models.Index(fields=['id'], condition=Q(is_active=False), name='users_user_inactive_idx'),
+        ]
+
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+    def save(self, *args, **kwargs):
+        self.email = type(self).objects.normalize_email(self.email)
+        super().save(*args, **kwargs)
+
+
+# email__lower=... compiles to LOWER("email") = ..., matching the functional index
+User._meta.get_field('email').register_lookup(Lower)
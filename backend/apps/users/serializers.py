@@ -1,17 +1,66 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers, status
+from rest_framework.validators import UniqueValidator
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from apps.metrics.mixins import SerializerMetricsMixin
+from core.serializers import FastReadMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PreconditionFailed(exceptions.APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The profile was changed by another request.'
+    default_code = 'precondition_failed'
+
+
+class NormalizedEmailField(serializers.EmailField):
+    """An email address, normalized as the user manager stores it."""
+
+    def to_internal_value(self, data):
+        return User.objects.normalize_email(super().to_internal_value(data))
+
+
+def unique_email_field():
+    # Checked case-insensitively, on the Lower(email) index
+    return NormalizedEmailField(max_length=254, validators=[
+        UniqueValidator(User.objects.all(), message='A user with this email already exists.', lookup='lower'),
+    ])
+
+
+class UserSerializer(FastReadMixin, SerializerMetricsMixin, serializers.ModelSerializer):
+    email = unique_email_field()
+
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_verified', 'created_at')
         read_only_fields = ('id', 'is_verified', 'created_at')
 
+    def update(self, instance, validated_data):
+        # Write only the columns that change; an update changing nothing
+        # runs no query and keeps updated_at (and so the ETag) as it was
+        changed = {attr: value for attr, value in validated_data.items() if getattr(instance, attr) != value}
+        if not changed:
+            return instance
+        for attr, value in changed.items():
+            setattr(instance, attr, value)
+
+        # Set by the view for conditional requests: the updated_at the
+        # client's precondition was checked against
+        expected = self.context.get('expected_updated_at')
+        if expected is None:
+            instance.save(update_fields=[*changed, 'updated_at'])
+            return instance
+        instance.updated_at = timezone.now()
+        if not User.objects.filter(pk=instance.pk, updated_at=expected).update(
+            **changed, updated_at=instance.updated_at
+        ):
+            raise PreconditionFailed()
+        return instance
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
+    email = unique_email_field()
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
 
@@ -0,0 +1,18 @@
+from celery import shared_task
+
+from .bulk import prune_exports, run_chunk
+
+
+# A chunk is one short transaction (or one rewritten export part), so
+# retrying it after a transient database or disk error is safe
+@shared_task(bind=True, autoretry_for=(Exception,), max_retries=3, retry_backoff=True)
+def run_bulk_user_job(self, job_id, index):
+    """Apply a bulk admin job to one chunk of its users, then continue with the next."""
+    if run_chunk(job_id, index, last_attempt=self.request.retries >= self.max_retries):
+        run_bulk_user_job.delay(job_id, index + 1)
+
+
+@shared_task
+def prune_bulk_exports():
+    """Delete bulk export files whose job has expired."""
+    return prune_exports()
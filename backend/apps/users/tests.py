@@ -1,11 +1,36 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from importlib import import_module
+from unittest.mock import Mock, patch
+
+import brotli
+
+from django.apps import apps
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import DatabaseError, IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from rest_framework import status
-from tests.utils import generate_test_password
+from rest_framework import serializers, status
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication.refresh import CachedRefreshToken
+from core.middleware import choose_encoding
+from core.serializers import FastReadMixin
+from tests.utils import generate_test_password, query_budget
+from .bulk import FAILED, chunk_key, get_job, run_chunk, start_job
+from .serializers import UserSerializer
+from .tasks import run_bulk_user_job
 
 User = get_user_model()
 
@@ -118,6 +143,50 @@ class UserModelTest(TestCase):
         self.assertNotEqual(user.updated_at, updated_at)
 
 
+class EmailNormalizationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=' Mixed.Case@Example.COM', username='mixed', first_name='Mixed',
+                                             last_name='Case', password=generate_test_password())
+
+    def test_email_is_lowercased_on_write(self):
+        self.assertEqual(self.user.email, 'mixed.case@example.com')
+
+        self.user.email = 'Changed@Example.com'
+        self.user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'changed@example.com')
+
+    def test_natural_key_lookup_uses_lower_index(self):
+        with CaptureQueriesContext(connection) as captured:
+            found = User.objects.get_by_natural_key('MIXED.case@example.com')
+
+        self.assertEqual(found, self.user)
+        self.assertIn('LOWER("users_user"."email")', captured[0]['sql'])
+
+    def test_case_variants_are_rejected_by_the_database(self):
+        other = User.objects.create_user(email='other@example.com', username='other', first_name='Other',
+                                         last_name='User', password=generate_test_password())
+        # queryset.update() skips normalization; the Lower(email) index still holds
+        with self.assertRaises(IntegrityError):
+            User.objects.filter(pk=other.pk).update(email='MIXED.CASE@example.com')
+
+    def test_migration_normalizes_existing_emails(self):
+        User.objects.filter(pk=self.user.pk).update(email='Legacy@Example.COM')
+        migration = import_module('apps.users.migrations.0003_normalize_user_emails')
+
+        migration.normalize_emails(apps, None)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'legacy@example.com')
+
+    def test_lookup_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        for name in ('users_user_email_lower_uniq', 'users_user_unverified_idx', 'users_user_inactive_idx'):
+            self.assertIn(name, constraints)
+        self.assertTrue(constraints['users_user_email_lower_uniq']['unique'])
+
+
 class UserAPITest(APITestCase):
     def setUp(self):
         test_password = generate_test_password()
@@ -142,6 +211,31 @@ class UserAPITest(APITestCase):
         self.assertEqual(response.data['first_name'], 'Test')
         self.assertEqual(response.data['last_name'], 'User')
 
+    def test_me_query_budget(self):
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        # Only the JWT user lookup
+        with query_budget(1):
+            response = self.client.get(reverse('users:me'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_profile_query_budget(self):
+        self.client.force_authenticate(user=self.user)
+
+        with query_budget(1):
+            response = self.client.patch(self.profile_url, {'first_name': 'Budget'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_responses_match_serializer(self):
+        self.client.force_authenticate(user=self.user)
+        expected = json.loads(JSONRenderer().render(UserSerializer(self.user).data))
+
+        for url in (self.profile_url, reverse('users:me')):
+            self.assertEqual(self.client.get(url).json(), expected)
+
     def test_get_user_profile_unauthenticated(self):
         response = self.client.get(self.profile_url)
         
@@ -197,4 +291,360 @@ class UserAPITest(APITestCase):
         
         response = self.client.patch(self.profile_url, update_data)
         
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProfileConditionalRequestTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cond@example.com', username='cond', first_name='Cond', last_name='Itional',
+            password=generate_test_password()
+        )
+        self.profile_url = reverse('users:profile')
+        self.client.force_authenticate(user=self.user)
+
+    def test_unchanged_profile_is_not_modified(self):
+        response = self.client.get(self.profile_url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        for url in (self.profile_url, reverse('users:me')):
+            with self.assertNumQueries(0):
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(cached['ETag'], etag)
+
+        cached = self.client.get(self.profile_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(COMPRESSION_MIN_SIZE=10)
+    # Without the random header bytes, gzip always shrinks the profile
+    @patch('core.middleware.MAX_RANDOM_BYTES', 0)
+    def test_etag_of_compressed_profile_satisfies_if_match(self):
+        response = self.client.get(self.profile_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        updated = self.client.patch(self.profile_url, {'first_name': 'Zipped'}, HTTP_IF_MATCH=response['ETag'])
+
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+
+    def test_update_changes_etag(self):
+        etag = self.client.get(self.profile_url)['ETag']
+
+        response = self.client.patch(self.profile_url, {'first_name': 'Changed'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_stale_if_match_is_refused(self):
+        stale = self.client.get(self.profile_url)['ETag']
+        self.client.patch(self.profile_url, {'first_name': 'First'})
+
+        response = self.client.patch(self.profile_url, {'first_name': 'Second'}, HTTP_IF_MATCH=stale)
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'First')
+
+    def test_concurrent_update_after_precondition_is_refused(self):
+        etag = self.client.get(self.profile_url)['ETag']
+        # Another request saves between this request's authentication and its write
+        User.objects.get(pk=self.user.pk).save(update_fields=['updated_at'])
+
+        response = self.client.patch(self.profile_url, {'last_name': 'Lost'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_name, 'Itional')
+
+    def test_update_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(self.profile_url, {'first_name': 'Only', 'last_name': 'Itional'})
+
+        self.assertEqual(len(captured), 1)
+        sql = captured[0]['sql']
+        self.assertIn('first_name', sql)
+        self.assertNotIn('last_name', sql)
+        self.assertNotIn('password', sql)
+
+    def test_no_op_update_runs_no_query(self):
+        etag = self.client.get(self.profile_url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.patch(self.profile_url, {'first_name': 'Cond'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], etag)
+
+
+class UserFastReadTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email=f'fast{i}@example.com', username=f'fast{i}', first_name='Fast', last_name=f'Reader {i}',
+                password='unused-password'
+            )
+            for i in range(3)
+        ]
+        self.users[1].is_verified = True
+
+    def test_represent_matches_serializer(self):
+        for user in self.users:
+            fast = UserSerializer.represent(user)
+            data = UserSerializer(user).data
+            self.assertEqual(fast, data)
+            self.assertEqual(list(fast), list(data))
+
+    def test_represent_matches_serializer_in_other_timezone(self):
+        with timezone.override('America/Los_Angeles'):
+            self.assertEqual(UserSerializer.represent(self.users[0]), UserSerializer(self.users[0]).data)
+
+    def test_values_rows_match_serializer(self):
+        queryset = User.objects.order_by('id')
+
+        with self.assertNumQueries(1):
+            fast = UserSerializer.represent_values(UserSerializer.values(queryset))
+
+        self.assertEqual(fast, UserSerializer(queryset, many=True).data)
+        self.assertEqual(UserSerializer.represent_many(queryset), fast)
+
+    def test_refuses_fields_without_fast_path(self):
+        class WithMethod(FastReadMixin, serializers.ModelSerializer):
+            display = serializers.SerializerMethodField()
+
+            class Meta:
+                model = User
+                fields = ('id', 'display')
+
+            def get_display(self, obj):
+                return str(obj)
+
+        with self.assertRaises(ImproperlyConfigured):
+            WithMethod.represent(self.users[0])
+
+
+# Admin pages reference static files, which are not collected for tests
+class ExportStreamingTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', username='admin',
+                                              password=generate_test_password(), is_staff=True)
+        for i in range(7):
+            User.objects.create_user(email=f'user{i}@example.com', username=f'user{i}',
+                                     password=generate_test_password(), is_verified=bool(i % 2))
+        self.url = reverse('users:export')
+        self.client.force_authenticate(user=self.admin)
+
+    def expected(self):
+        return JSONRenderer().render(UserSerializer(User.objects.order_by('pk'), many=True).data)
+
+    @override_settings(STREAMING_BATCH_SIZE=3)
+    def test_streams_same_bytes_as_serializer_in_batches(self):
+        User.objects.filter(username='user0').update(first_name='a\u2028b', last_name='c\u2029d')
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # 8 users in batches of 3, then the closing bracket
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks), self.expected())
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_compressed_with_brotli_or_gzip(self):
+        for accept, encoding, decompress in (('gzip, deflate, br', 'br', brotli.decompress),
+                                             ('gzip, br;q=0', 'gzip', gzip.decompress)):
+            with self.subTest(accept=accept):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=accept)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(decompress(b''.join(response.streaming_content)), self.expected())
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_small_and_html_responses_are_not_compressed(self):
+        response = self.client.get(reverse('users:me'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertNotIn('Content-Encoding', response)
+
+        with override_settings(COMPRESSION_MIN_SIZE=10):
+            response = self.client.get(reverse('users:me'), HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(json.loads(brotli.decompress(response.content)), UserSerializer(self.admin).data)
+
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(choose_encoding('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(choose_encoding('*'), 'br')
+        self.assertIsNone(choose_encoding('identity, deflate'))
+        self.assertIsNone(choose_encoding(''))
+
+    def test_admin_only(self):
+        self.client.force_authenticate(user=User.objects.get(username='user0'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(BULK_ADMIN_BATCH_SIZE=2,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BulkUserAdminTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        settings_patcher = override_settings(BULK_EXPORT_DIR=export_dir)
+        settings_patcher.enable()
+        self.addCleanup(settings_patcher.disable)
+
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', first_name='Ad', last_name='Min',
+            password='unused-password'
+        )
+        self.users = [
+            User.objects.create_user(
+                email=f'bulk{i}@example.com', username=f'bulk{i}', first_name='Bulk', last_name=str(i),
+                password='unused-password'
+            )
+            for i in range(5)
+        ]
+        self.client.force_login(self.admin)
+        self.changelist = reverse('admin:users_user_changelist')
+
+        # Run the chained chunk tasks inline, and record the notifications
+        delay = patch.object(run_bulk_user_job, 'delay', side_effect=lambda *args: run_bulk_user_job(*args))
+        delay.start()
+        self.addCleanup(delay.stop)
+        notify = patch('apps.users.bulk.notify')
+        self.notify = notify.start()
+        self.addCleanup(notify.stop)
+
+    def run_action(self, action, users):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.changelist, {
+                'action': action,
+                '_selected_action': [user.pk for user in users],
+            })
+        self.assertEqual(response.status_code, 302)
+        return response['Location'].rstrip('/').split('/')[-1]
+
+    def test_verify_runs_in_chunks_and_notifies(self):
+        job_id = self.run_action('bulk_verify', self.users)
+
+        self.assertEqual(User.objects.filter(is_verified=True).count(), 5)
+        job = get_job(job_id)
+        self.assertEqual((job['status'], job['processed'], job['affected'], job['chunks']), ('done', 5, 5, 3))
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.args[0], self.admin.pk)
+        self.assertEqual(self.notify.call_args.args[2], 'success')
+
+    def test_progress_page_and_status(self):
+        job_id = self.run_action('bulk_verify', self.users[:1])
+
+        page = self.client.get(reverse('admin:users_user_bulk_job', args=[job_id]))
+        status_response = self.client.get(reverse('admin:users_user_bulk_job_status', args=[job_id]))
+
+        self.assertContains(page, 'bulk-progress')
+        self.assertEqual(status_response.json()['status'], 'done')
+
+    def test_jobs_are_private_to_their_admin(self):
+        job_id = self.run_action('bulk_verify', self.users[:1])
+        other = User.objects.create_user(
+            email='staff@example.com', username='staff', first_name='St', last_name='Aff',
+            password='unused-password', is_staff=True
+        )
+        other.user_permissions.add(*Permission.objects.filter(codename='view_user'))
+        self.client.force_login(other)
+
+        response = self.client.get(reverse('admin:users_user_bulk_job_status', args=[job_id]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_force_logout_refuses_earlier_tokens(self):
+        user = self.users[0]
+        access = AccessToken.for_user(user)
+        access['iat'] -= 10
+        refresh = CachedRefreshToken.for_user(user)
+        refresh['iat'] -= 10
+
+        self.run_action('bulk_force_logout', [user, self.admin])
+
+        me = self.client_class().get(reverse('users:me'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(me.status_code, status.HTTP_401_UNAUTHORIZED)
+        refreshed = self.client_class().post(reverse('auth:token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.admin.refresh_from_db()
+        self.assertIsNone(self.admin.tokens_valid_after)
+
+    def test_force_logout_refuses_tokens_from_the_same_second(self):
+        user = self.users[0]
+        self.run_action('bulk_force_logout', [user])
+        # iat has whole seconds, so an earlier token of that second looks like this
+        issued = int(User.objects.get(pk=user.pk).tokens_valid_after.timestamp())
+        access = AccessToken.for_user(user)
+        access['iat'] = issued
+        refresh = CachedRefreshToken.for_user(user)
+        refresh['iat'] = issued
+
+        me = self.client_class().get(reverse('users:me'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(me.status_code, status.HTTP_401_UNAUTHORIZED)
+        refreshed = self.client_class().post(reverse('auth:token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivate(self):
+        self.run_action('bulk_deactivate', self.users[:3])
+
+        self.assertEqual(User.objects.filter(is_active=False).count(), 3)
+        self.assertIsNotNone(User.objects.get(pk=self.users[0].pk).tokens_valid_after)
+
+    def test_export_streams_selected_users(self):
+        job_id = self.run_action('bulk_export', self.users)
+
+        response = self.client.get(reverse('admin:users_user_bulk_job_download', args=[job_id]))
+
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ['id', 'email'])
+        self.assertEqual([row[1] for row in rows[1:]], [user.email for user in self.users])
+
+    def test_export_escapes_formulas(self):
+        user = self.users[0]
+        User.objects.filter(pk=user.pk).update(first_name='=HYPERLINK("http://x")', last_name='-1+2')
+
+        job_id = self.run_action('bulk_export', [user])
+
+        response = self.client.get(reverse('admin:users_user_bulk_job_download', args=[job_id]))
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[1][3:5], ['\'=HYPERLINK("http://x")', "'-1+2"])
+
+    def test_expired_selection_fails_the_job(self):
+        job = start_job('verify', User.objects.filter(pk__in=[u.pk for u in self.users]), self.admin)
+        cache.delete(chunk_key(job['id'], 0))
+
+        self.assertFalse(run_chunk(job['id'], 0))
+
+        self.assertEqual(get_job(job['id'])['status'], FAILED)
+        self.assertEqual(self.notify.call_args.args[2], 'error')
+
+    def test_failing_action_is_retried_then_fails_the_job(self):
+        job = start_job('verify', User.objects.filter(pk__in=[u.pk for u in self.users]), self.admin)
+        action = Mock(side_effect=DatabaseError('could not extend file'))
+
+        with patch.dict('apps.users.bulk.ACTIONS', {'verify': ('Verify email addresses', action)}):
+            result = run_bulk_user_job.apply(args=(job['id'], 0))
+
+        self.assertTrue(result.failed())
+        self.assertEqual(action.call_count, run_bulk_user_job.max_retries + 1)
+        job = get_job(job['id'])
+        self.assertEqual((job['status'], job['error']), (FAILED, 'DatabaseError: could not extend file'))
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.args[2], 'error')
+
+    def test_redelivered_chunk_is_not_counted_twice(self):
+        job = start_job('verify', User.objects.filter(pk__in=[u.pk for u in self.users]), self.admin)
+
+        run_chunk(job['id'], 0)
+        run_chunk(job['id'], 0)
+
+        self.assertEqual(get_job(job['id'])['processed'], 2)
@@ -6,4 +6,5 @@ app_name = 'users'
 urlpatterns = [
     path('profile/', views.UserProfileView.as_view(), name='profile'),
     path('me/', views.user_profile, name='me'),
+    path('export/', views.export_users, name='export'),
 ]
\ No newline at end of file
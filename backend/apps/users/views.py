@@ -2,10 +2,40 @@ from rest_framework import generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from core.renderers import stream_represented
 from .serializers import UserSerializer
 
 User = get_user_model()
 
+# Headers that make an update conditional on the profile the client has
+PRECONDITION_HEADERS = ('If-Match', 'If-Unmodified-Since')
+
+
+def profile_validators(user):
+    """``(etag, last_modified)`` of ``user``'s profile, both from ``updated_at``."""
+    return f'"{user.pk}-{user.updated_at.timestamp():.6f}"', int(user.updated_at.timestamp())
+
+
+def with_validators(response, user):
+    etag, last_modified = profile_validators(user)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers keep the profile but revalidate it before each use
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional_profile(request, user):
+    """The profile, or ``304 Not Modified`` when the client's copy is current."""
+    etag, last_modified = profile_validators(user)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(UserSerializer.represent(user))
+    return with_validators(response, user)
+
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
@@ -14,9 +44,33 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if any(header in self.request.headers for header in PRECONDITION_HEADERS):
+            context['expected_updated_at'] = self.request.user.updated_at
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_profile(request, self.get_object())
+
+    def update(self, request, *args, **kwargs):
+        user = self.get_object()
+        etag, last_modified = profile_validators(user)
+        # 412 when If-Match/If-Unmodified-Since name an older profile
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().update(request, *args, **kwargs)
+        return with_validators(response, user)
+
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_profile(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
\ No newline at end of file
+    return conditional_profile(request, request.user)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_users(request):
+    """Every user, as one JSON array streamed in batches; see core/renderers.py."""
+    return stream_represented(User.objects.order_by('pk'), UserSerializer)
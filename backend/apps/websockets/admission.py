@@ -0,0 +1,101 @@
+"""
+Admission control for WebSocket handshakes.
+
+After a deploy every client reconnects at once, and each handshake costs a
+JWT decode, a DB lookup, a ``group_add`` and a welcome frame. Each process
+runs at most ``WEBSOCKET_HANDSHAKE_CONCURRENCY`` handshakes at a time and
+lets ``WEBSOCKET_HANDSHAKE_QUEUE`` more wait up to
+``WEBSOCKET_HANDSHAKE_QUEUE_TIMEOUT`` seconds. Anything beyond that is told
+to come back after a random delay within ``WEBSOCKET_RETRY_AFTER`` (a
+``retry_later`` frame, then close code 1013 "Try Again Later"), so the
+reconnects spread out instead of piling onto the database and Redis.
+"""
+import asyncio
+import random
+import weakref
+
+from channels.exceptions import StopConsumer
+from django.conf import settings
+
+# RFC 6455 "Try Again Later"
+RETRY_LATER = 1013
+
+_gates = weakref.WeakKeyDictionary()
+
+
+class HandshakeGate:
+    def __init__(self, limit, queue_size):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.queue_size = queue_size
+        self.waiting = 0
+
+    async def acquire(self, timeout):
+        """Take a handshake slot; False if the queue is full or the wait times out."""
+        if not self.semaphore.locked():
+            await self.semaphore.acquire()
+            return True
+        if self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        acquire = asyncio.ensure_future(self.semaphore.acquire())
+        acquired = False
+        try:
+            await asyncio.wait({acquire}, timeout=timeout)
+            acquired = acquire.done() and not acquire.cancelled()
+            return acquired
+        finally:
+            self.waiting -= 1
+            if not acquire.done():
+                acquire.cancel()
+            elif not acquired and not acquire.cancelled():
+                # Got the slot as this wait was cancelled; nobody will release it
+                self.semaphore.release()
+
+    def release(self):
+        self.semaphore.release()
+
+
+def handshake_gate():
+    """The gate for the running event loop, i.e. this process."""
+    loop = asyncio.get_running_loop()
+    gate = _gates.get(loop)
+    if gate is None:
+        gate = _gates[loop] = HandshakeGate(
+            settings.WEBSOCKET_HANDSHAKE_CONCURRENCY, settings.WEBSOCKET_HANDSHAKE_QUEUE
+        )
+    return gate
+
+
+def retry_delay():
+    low, high = settings.WEBSOCKET_RETRY_AFTER
+    return round(random.uniform(low, high), 1)
+
+
+class AdmissionControlMixin:
+    """Run ``connect`` only with a handshake slot; otherwise ask the client to retry."""
+
+    admission_rejected = False
+
+    async def websocket_connect(self, message):
+        gate = handshake_gate()
+        if not await gate.acquire(settings.WEBSOCKET_HANDSHAKE_QUEUE_TIMEOUT):
+            await self.reject_busy()
+            return
+        try:
+            await super().websocket_connect(message)
+        finally:
+            gate.release()
+
+    async def reject_busy(self):
+        # Accept so the client can read the hint; a pre-accept close is a
+        # bare HTTP 403 with no way to carry a delay.
+        self.admission_rejected = True
+        await self.accept()
+        await self.send_json({'type': 'retry_later', 'retry_after': retry_delay()})
+        await self.close(code=RETRY_LATER)
+
+    async def websocket_disconnect(self, message):
+        if self.admission_rejected:
+            # connect() never ran, so there is nothing to leave
+            raise StopConsumer()
+        await super().websocket_disconnect(message)
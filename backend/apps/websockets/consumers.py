@@ -1,18 +1,55 @@
+import asyncio
 import json
+import time
+from collections import deque
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from jwt.exceptions import DecodeError
+from apps.metrics.mixins import ConsumerMetricsMixin
+from apps.notifications.counters import get_unread_count
+from apps.notifications.delivery import serialize_notification
+from apps.notifications.models import Notification
+from .admission import AdmissionControlMixin
+from .fanout import SHARED_FRAMES, LocalGroupMixin
+from .heartbeat import HeartbeatMixin
+from .identity import group_name, load_socket_user
+from .sequencing import SequencedGroupMixin
 
 User = get_user_model()
 
+# Routing and bookkeeping keys of group events, not shown to clients
+EVENT_KEYS = ('type', 'group', 'seq', 'sent_at', SHARED_FRAMES)
+
+
+class NotificationConsumer(
+    ConsumerMetricsMixin, AdmissionControlMixin, HeartbeatMixin, SequencedGroupMixin, LocalGroupMixin,
+    AsyncWebsocketConsumer
+):
+    frame_types = frozenset({
+        'ping', 'pong', 'resume', 'connection_established', 'notification', 'notification_digest',
+        'resume_complete', 'resync_required', 'retry_later', 'heartbeat', 'heartbeat_ack', 'error'
+    })
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Token bucket capping notification frames per second on this socket;
+        # frames over the cap are held and merged into one digest frame.
+        self.frame_allowance = settings.NOTIFICATIONS_MAX_FRAMES_PER_SECOND
+        self.frame_checked_at = time.monotonic()
+        self.held_count = 0
+        # Created on the first held frame; most sockets never need one
+        self.held_items = None
+        self.held_seq_start = None
+        self.held_seq = None
+        self.release_task = None
 
-class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.room_group_name = f'notifications_{self.user_id}'
+        self.room_group_name = group_name('notifications', self.user_id)
         
         # Authenticate user
         user = await self.get_user_from_token()
@@ -23,41 +60,51 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         self.user = user
         
         # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.join_group(self.room_group_name)
         
         await self.accept()
         
-        # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        # A client reconnecting with ?after=<seq> gets only the events it
+        # missed; otherwise (or if those are gone) the inbox snapshot.
+        last, missed = await self.missed(self.requested_resume())
+        frame = {
             'type': 'connection_established',
-            'message': f'Connected to notifications for user {self.user_id}'
-        }))
+            'message': f'Connected to notifications for user {self.user_id}',
+            'seq': last,
+            'resumed': missed is not None
+        }
+        if missed is None:
+            frame['unread_count'], frame['notifications'] = await self.get_inbox_snapshot()
+        await self.send_json(frame)
+        if missed:
+            await self.replay(missed)
 
     async def disconnect(self, close_code):
+        if self.release_task:
+            self.release_task.cancel()
+
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.leave_group(self.room_group_name)
 
     async def receive(self, text_data):
         try:
             text_data_json = json.loads(text_data)
             message_type = text_data_json.get('type')
+            self.record_inbound(message_type)
             
             if message_type == 'ping':
-                await self.send(text_data=json.dumps({
+                await self.send_json({
                     'type': 'pong',
                     'timestamp': text_data_json.get('timestamp')
-                }))
+                })
+            elif message_type == 'resume':
+                await self.resume(text_data_json.get('after'))
         except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            self.record_inbound('invalid')
+            await self.send_json({
                 'type': 'error',
                 'message': 'Invalid JSON format'
-            }))
+            })
 
     # Receive message from room group
     async def notification_message(self, event):
@@ -65,12 +112,83 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         notification_type = event.get('notification_type', 'info')
         
         # Send message to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_notification_frame({
             'type': 'notification',
+            'id': event.get('id'),
             'notification_type': notification_type,
             'message': message,
-            'timestamp': event.get('timestamp')
-        }))
+            'timestamp': event.get('timestamp'),
+            'seq': event.get('seq')
+        }, [event], 1)
+
+    # Receive a coalesced burst from room group
+    async def notification_digest(self, event):
+        await self.send_notification_frame(
+            self.build_digest(event['notifications'], event['count'], event.get('seq')),
+            event['notifications'],
+            event['count']
+        )
+
+    def build_digest(self, items, count, seq=None, seq_start=None):
+        types = {item.get('notification_type', 'info') for item in items}
+        return {
+            'type': 'notification_digest',
+            'notification_type': types.pop() if len(types) == 1 else 'info',
+            'count': count,
+            'message': f'{count} new notifications',
+            'notifications': [
+                {key: value for key, value in item.items() if key not in EVENT_KEYS}
+                for item in items
+            ],
+            'timestamp': items[-1].get('timestamp') if items else None,
+            'seq': seq,
+            'seq_start': seq_start if seq_start is not None else seq
+        }
+
+    def take_frame_token(self):
+        rate = settings.NOTIFICATIONS_MAX_FRAMES_PER_SECOND
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        self.frame_allowance = min(rate, self.frame_allowance + (now - self.frame_checked_at) * rate)
+        self.frame_checked_at = now
+        if self.frame_allowance >= 1:
+            self.frame_allowance -= 1
+            return True
+        return False
+
+    async def send_notification_frame(self, frame, items, count):
+        """Send ``frame`` now, or hold ``items`` for a digest if over the frame cap"""
+        if not self.held_count and self.take_frame_token():
+            await self.send_json(frame)
+            return
+
+        if not self.held_count:
+            self.held_seq_start = frame.get('seq_start', frame.get('seq'))
+        self.held_seq = frame.get('seq')
+        self.held_count += count
+        if self.held_items is None:
+            self.held_items = deque(maxlen=settings.NOTIFICATIONS_DIGEST_PREVIEW)
+        self.held_items.extend(items)
+        if self.release_task is None:
+            self.release_task = asyncio.ensure_future(self.release_held_frames())
+
+    async def release_held_frames(self):
+        rate = settings.NOTIFICATIONS_MAX_FRAMES_PER_SECOND
+        while not self.take_frame_token():
+            await asyncio.sleep((1 - self.frame_allowance) / rate)
+
+        count, items = self.held_count, list(self.held_items)
+        self.held_count = 0
+        self.held_items = None
+        self.release_task = None
+        await self.send_json(self.build_digest(items, count, self.held_seq, self.held_seq_start))
+
+    @database_sync_to_async
+    def get_inbox_snapshot(self):
+        """Unread count and the latest notifications for the connected user"""
+        latest = Notification.objects.filter(user_id=self.user.id)[:settings.NOTIFICATIONS_SNAPSHOT_SIZE]
+        return get_unread_count(self.user.id), [serialize_notification(n) for n in latest]
 
     async def get_user_from_token(self):
         """Extract user from JWT token in query string"""
@@ -91,18 +209,25 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             access_token = AccessToken(token)
             user_id = access_token['user_id']
             
-            # Get user from database
-            user = await database_sync_to_async(User.objects.get)(id=user_id)
-            return user
+            # Only the fields the consumer uses, not a User instance
+            return await database_sync_to_async(load_socket_user)(user_id, access_token.get('iat', 0))
             
         except (InvalidToken, TokenError, DecodeError, User.DoesNotExist, Exception):
             return None
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(
+    ConsumerMetricsMixin, AdmissionControlMixin, HeartbeatMixin, SequencedGroupMixin, LocalGroupMixin,
+    AsyncWebsocketConsumer
+):
+    frame_types = frozenset({
+        'chat_message', 'typing_start', 'typing_stop', 'resume', 'connection_established', 'user_joined',
+        'user_left', 'resume_complete', 'resync_required', 'retry_later', 'heartbeat', 'heartbeat_ack', 'error'
+    })
+
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
-        self.room_group_name = f'chat_{self.room_name}'
+        self.room_group_name = group_name('chat', self.room_name)
         
         # Authenticate user
         user = await self.get_user_from_token()
@@ -113,63 +238,65 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.user = user
         
         # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.join_group(self.room_group_name)
         
         await self.accept()
+
+        # Replay what a reconnecting client missed, if still available
+        last, missed = await self.missed(self.requested_resume())
+        await self.send_json({
+            'type': 'connection_established',
+            'seq': last,
+            'resumed': missed is not None
+        })
+        if missed:
+            await self.replay(missed)
         
         # Notify room that user joined
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_joined',
-                'user': self.user.username,
-                'user_id': self.user.id
-            }
-        )
+        await self.group_send_sequenced({
+            'type': 'user_joined',
+            'user': self.user.username,
+            'user_id': self.user.id
+        })
 
     async def disconnect(self, close_code):
         # Notify room that user left
         if hasattr(self, 'user'):
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_left',
-                    'user': self.user.username,
-                    'user_id': self.user.id
-                }
-            )
+            await self.group_send_sequenced({
+                'type': 'user_left',
+                'user': self.user.username,
+                'user_id': self.user.id
+            })
         
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.leave_group(self.room_group_name)
 
     async def receive(self, text_data):
         try:
             text_data_json = json.loads(text_data)
+            if text_data_json.get('type') == 'resume':
+                self.record_inbound('resume')
+                await self.resume(text_data_json.get('after'))
+                return
+
             message = text_data_json['message']
             message_type = text_data_json.get('type', 'chat_message')
+            self.record_inbound(message_type)
             
             # Send message to room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'user': self.user.username,
-                    'user_id': self.user.id,
-                    'message_type': message_type
-                }
-            )
+            await self.group_send_sequenced({
+                'type': 'chat_message',
+                'message': message,
+                'user': self.user.username,
+                'user_id': self.user.id,
+                'message_type': message_type
+            })
         except (json.JSONDecodeError, KeyError):
-            await self.send(text_data=json.dumps({
+            self.record_inbound('invalid')
+            await self.send_json({
                 'type': 'error',
                 'message': 'Invalid message format'
-            }))
+            })
 
     # Receive message from room group
     async def chat_message(self, event):
@@ -179,27 +306,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
         message_type = event.get('message_type', 'chat_message')
         
         # Send message to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_event_frame(event, {
             'type': message_type,
             'message': message,
             'user': user,
             'user_id': user_id,
-            'timestamp': event.get('timestamp')
-        }))
+            'timestamp': event.get('timestamp'),
+            'seq': event.get('seq')
+        })
 
     async def user_joined(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event_frame(event, {
             'type': 'user_joined',
             'user': event['user'],
-            'user_id': event['user_id']
-        }))
+            'user_id': event['user_id'],
+            'timestamp': event.get('timestamp'),
+            'seq': event.get('seq')
+        })
 
     async def user_left(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event_frame(event, {
             'type': 'user_left',
             'user': event['user'],
-            'user_id': event['user_id']
-        }))
+            'user_id': event['user_id'],
+            'timestamp': event.get('timestamp'),
+            'seq': event.get('seq')
+        })
 
     async def get_user_from_token(self):
         """Extract user from JWT token in query string"""
@@ -220,9 +352,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             access_token = AccessToken(token)
             user_id = access_token['user_id']
             
-            # Get user from database
-            user = await database_sync_to_async(User.objects.get)(id=user_id)
-            return user
+            # Only the fields the consumer uses, not a User instance
+            return await database_sync_to_async(load_socket_user)(user_id, access_token.get('iat', 0))
             
         except (InvalidToken, TokenError, DecodeError, User.DoesNotExist, Exception):
             return None
\ No newline at end of file
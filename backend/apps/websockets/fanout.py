@@ -0,0 +1,180 @@
+"""
+Process-local fan-out of group events.
+
+Instead of adding every socket's channel to a channel layer group, each
+process subscribes one relay channel per group and dispatches incoming
+events in memory to its local members. A broadcast to a room with N
+sockets on this process then costs one channel layer message and one
+deserialization instead of N, and frames identical for every member are
+serialized once.
+
+Events are routed by their ``group`` key, which ``sequencing.stamp`` sets
+on everything sent through ``group_send_sequenced``. They are queued with
+the socket's own client messages and dispatched by the consumer's loop,
+so a consumer still handles one message at a time, in arrival order.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Key of the per-delivery cache of serialized frames shared by local members
+SHARED_FRAMES = '_shared_frames'
+
+# Seconds the relay and sweep loops wait after a channel layer error
+ERROR_BACKOFF = 1.0
+
+_registries = weakref.WeakKeyDictionary()
+
+
+class LocalGroups:
+    """Local members of each group, behind one channel layer subscription."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.members = defaultdict(set)
+        self.channel = None
+        self.relay_task = None
+        self.sweep_task = None
+        self.lock = asyncio.Lock()
+
+    async def add(self, group, consumer):
+        async with self.lock:
+            if self.channel is None:
+                self.channel = await self.layer.new_channel()
+                self.relay_task = asyncio.ensure_future(self.relay())
+                self.sweep_task = asyncio.ensure_future(self.sweep())
+            if not self.members[group]:
+                await self.layer.group_add(group, self.channel)
+            self.members[group].add(consumer)
+
+    async def discard(self, group, consumer):
+        async with self.lock:
+            members = self.members.get(group)
+            if members is None:
+                return
+            members.discard(consumer)
+            if not members:
+                del self.members[group]
+                await self.layer.group_discard(group, self.channel)
+
+    async def relay(self):
+        # Every local socket depends on this loop, so an error (e.g. Redis
+        # briefly unreachable) must not end it
+        while True:
+            try:
+                message = await self.layer.receive(self.channel)
+            except Exception:
+                logger.exception('Receiving on relay channel %s failed', self.channel)
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            await self.deliver(message)
+
+    async def deliver(self, message):
+        members = self.members.get(message.get('group'))
+        if not members:
+            return
+        message[SHARED_FRAMES] = {}
+        for consumer in list(members):
+            consumer.local_events.put_nowait(message)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(settings.WEBSOCKET_GROUP_SWEEP_INTERVAL)
+            try:
+                await self.sweep_once()
+            except Exception:
+                # Live groups would otherwise reach the layer's group expiry
+                logger.exception('Sweeping local groups failed')
+                await asyncio.sleep(ERROR_BACKOFF)
+
+    async def sweep_once(self):
+        """Drop members that stopped answering heartbeats; refresh live groups.
+
+        Members normally leave on disconnect or when their own heartbeat
+        reaps them; this catches any that slipped through. Re-adding the
+        relay channel keeps live groups from reaching the layer's group
+        expiry, while groups of a dead process expire on their own.
+        """
+        async with self.lock:
+            for group, members in list(self.members.items()):
+                for consumer in [member for member in members if member.is_stale()]:
+                    members.discard(consumer)
+                if members:
+                    await self.layer.group_add(group, self.channel)
+                else:
+                    del self.members[group]
+                    await self.layer.group_discard(group, self.channel)
+
+    async def close(self):
+        for task in (self.relay_task, self.sweep_task):
+            if task:
+                task.cancel()
+
+
+def local_groups(layer):
+    """The registry for ``layer`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    registries = _registries.setdefault(loop, {})
+    if id(layer) not in registries:
+        registries[id(layer)] = LocalGroups(layer)
+    return registries[id(layer)]
+
+
+class LocalGroupMixin:
+    """Join and leave groups through the process-local registry.
+
+    With ``WEBSOCKET_LOCAL_FANOUT`` off (the Pub/Sub layer already fans out
+    per process) the consumer's own channel joins the group as usual.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Client messages and relayed group events, in arrival order
+        self.local_events = asyncio.Queue()
+
+    async def __call__(self, scope, receive, send):
+        if not settings.WEBSOCKET_LOCAL_FANOUT:
+            return await super().__call__(scope, receive, send)
+
+        async def pump():
+            while True:
+                message = await receive()
+                self.local_events.put_nowait(message)
+                if message['type'] == 'websocket.disconnect':
+                    return
+
+        pump_task = asyncio.ensure_future(pump())
+        try:
+            return await super().__call__(scope, self.local_events.get, send)
+        finally:
+            pump_task.cancel()
+
+    async def join_group(self, group):
+        if settings.WEBSOCKET_LOCAL_FANOUT:
+            await local_groups(self.channel_layer).add(group, self)
+        else:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+    async def leave_group(self, group):
+        if settings.WEBSOCKET_LOCAL_FANOUT:
+            await local_groups(self.channel_layer).discard(group, self)
+        else:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def send_event_frame(self, event, frame):
+        """Send ``frame`` built from ``event``; local members share one serialization."""
+        shared = event.get(SHARED_FRAMES)
+        if shared is None:
+            await self.send_json(frame)
+            return
+        text = shared.get(frame['type'])
+        if text is None:
+            text = shared[frame['type']] = json.dumps(frame)
+        self.count_frame('out', frame['type'])
+        await self.send(text_data=text)
@@ -0,0 +1,75 @@
+"""
+Server-driven heartbeats.
+
+Every ``WEBSOCKET_HEARTBEAT_INTERVAL`` seconds the server sends
+``{"type": "heartbeat"}``; clients answer ``{"type":"heartbeat_ack"}``.
+Any inbound frame counts as a sign of life. A socket silent for
+``WEBSOCKET_HEARTBEAT_MISSES`` intervals is half-open: it leaves its group
+and is closed with code 4000, so it stops costing a send on every
+broadcast.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+
+from apps.metrics.instrumentation import WEBSOCKET_REAPED, enabled
+
+HEARTBEAT_ACK = '{"type":"heartbeat_ack"}'
+HEARTBEAT_TIMEOUT = 4000
+
+
+class HeartbeatMixin:
+    heartbeat_task = None
+    last_seen = None
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        if (settings.WEBSOCKET_HEARTBEAT_INTERVAL > 0 and self.heartbeat_task is None
+                and not getattr(self, 'admission_rejected', False)):
+            self.last_seen = time.monotonic()
+            self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+
+    async def websocket_receive(self, message):
+        self.last_seen = time.monotonic()
+        if message.get('text') == HEARTBEAT_ACK:
+            self.count_frame('in', 'heartbeat_ack')
+            return
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        await super().websocket_disconnect(message)
+
+    def is_stale(self):
+        if self.last_seen is None:
+            return False
+        allowed = settings.WEBSOCKET_HEARTBEAT_INTERVAL * settings.WEBSOCKET_HEARTBEAT_MISSES
+        return time.monotonic() - self.last_seen > allowed
+
+    async def heartbeat(self):
+        interval = settings.WEBSOCKET_HEARTBEAT_INTERVAL
+        refreshed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            if self.is_stale():
+                await self.reap()
+                return
+            await self.send_json({'type': 'heartbeat'})
+
+            group = getattr(self, 'room_group_name', None)
+            if group and not settings.WEBSOCKET_LOCAL_FANOUT \
+                    and time.monotonic() - refreshed_at >= settings.WEBSOCKET_GROUP_SWEEP_INTERVAL:
+                # Keep this socket's membership from expiring in the layer;
+                # with local fan-out the registry sweep does this per process
+                await self.channel_layer.group_add(group, self.channel_name)
+                refreshed_at = time.monotonic()
+
+    async def reap(self):
+        if enabled():
+            WEBSOCKET_REAPED.inc(consumer=type(self).__name__)
+        group = getattr(self, 'room_group_name', None)
+        if group:
+            await self.leave_group(group)
+        await self.close(code=HEARTBEAT_TIMEOUT)
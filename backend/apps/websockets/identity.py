@@ -0,0 +1,52 @@
+"""
+Compact per-socket state.
+
+A consumer lives as long as its socket, so everything it holds is paid for
+once per open connection. Consumers keep a ``SocketUser`` (id and username,
+the only fields they use) instead of a ``User`` instance with its model
+state and every column, and share one interned string per group name.
+"""
+import sys
+
+from django.contrib.auth import get_user_model
+
+
+class SocketUser:
+    """The connected user's identity, as much as a consumer needs."""
+
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def __eq__(self, other):
+        return isinstance(other, SocketUser) and (self.id, self.username) == (other.id, other.username)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'SocketUser(id={self.id!r}, username={self.username!r})'
+
+
+def load_socket_user(user_id, issued_at=0):
+    """``SocketUser`` for an active ``user_id``, or ``None``; no model instance is built.
+
+    ``None`` too when the user was logged out after ``issued_at``, the
+    token's ``iat``.
+    """
+    row = (
+        get_user_model().objects
+        .filter(id=user_id, is_active=True)
+        .values_list('id', 'username', 'tokens_valid_after')
+        .first()
+    )
+    if row is None or (row[2] is not None and issued_at <= int(row[2].timestamp())):
+        return None
+    return SocketUser(row[0], row[1])
+
+
+def group_name(prefix, key):
+    """Interned ``{prefix}_{key}``, so sockets in one group share the string."""
+    return sys.intern(f'{prefix}_{key}')
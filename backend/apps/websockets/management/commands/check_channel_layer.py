@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that the configured channel layer behaves the way the '
+        'consumers rely on: group_send reaches every member, group_discard '
+        'stops delivery to the discarded channel only, and direct sends '
+        'reach a specific channel. Run after changing CHANNEL_LAYER_MODE '
+        'or CHANNEL_REDIS_URLS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=2.0,
+                            help='Seconds to wait for each expected message')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        self.stdout.write(f'Channel layer: {type(layer).__module__}.{type(layer).__name__}')
+        failures = async_to_sync(self.run_checks)(layer, options['timeout'])
+        if failures:
+            raise CommandError(f'{len(failures)} check(s) failed: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Channel layer is compatible with the consumers'))
+
+    async def run_checks(self, layer, timeout):
+        group = f'layer_check_{uuid.uuid4().hex}'
+        first = await layer.new_channel()
+        second = await layer.new_channel()
+        failures = []
+
+        async def received(channel, marker):
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), timeout)
+            except asyncio.TimeoutError:
+                return False
+            return message.get('marker') == marker
+
+        async def check(name, passed):
+            self.stdout.write(f'  {"ok  " if passed else "FAIL"} {name}')
+            if not passed:
+                failures.append(name)
+
+        try:
+            await layer.group_add(group, first)
+            await layer.group_add(group, second)
+            await layer.group_send(group, {'type': 'layer.check', 'marker': 'both'})
+            results = await asyncio.gather(received(first, 'both'), received(second, 'both'))
+            await check('group_send reaches every member', all(results))
+
+            await layer.group_discard(group, second)
+            await layer.group_send(group, {'type': 'layer.check', 'marker': 'after-discard'})
+            await check('group_send reaches remaining member', await received(first, 'after-discard'))
+            await check('group_discard stops delivery', not await received(second, 'after-discard'))
+
+            await layer.send(second, {'type': 'layer.check', 'marker': 'direct'})
+            await check('send reaches a specific channel', await received(second, 'direct'))
+        finally:
+            await layer.group_discard(group, first)
+        return failures
@@ -0,0 +1,116 @@
+"""
+Sequence numbers, server timestamps and replay for group events.
+
+Every event sent to a group takes the next value of a per-group counter
+(cache INCR, so it is shared by all processes) and a server timestamp,
+and is kept for ``WEBSOCKET_REPLAY_TTL`` seconds. A client that sees a
+gap in ``seq`` (or reconnects with ``?after=<seq>``) gets exactly the
+missing events replayed; if they are no longer available it is told to
+resync instead.
+"""
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+
+def sequence_key(group):
+    return f'ws:seq:{group}'
+
+
+def _event_key(group, seq):
+    return f'ws:event:{group}:{seq}'
+
+
+def _sequence_timeout():
+    # Room names are chosen by clients, so counters must expire. After this
+    # long idle every stored event has expired too, and a client resuming
+    # past a restarted counter is told to resync.
+    return max(settings.CHANNEL_GROUP_EXPIRY, settings.WEBSOCKET_REPLAY_TTL)
+
+
+def next_sequence(group):
+    key = sequence_key(group)
+    timeout = _sequence_timeout()
+    try:
+        seq = cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=timeout)
+        return cache.incr(key)
+    cache.touch(key, timeout)
+    return seq
+
+
+def last_sequence(group):
+    return cache.get(sequence_key(group)) or 0
+
+
+def stamp(group, event):
+    """Return ``event`` with ``group``, ``seq``, ``sent_at`` and ``timestamp`` set, stored for replay."""
+    seq = next_sequence(group)
+    now = datetime.now(timezone.utc)
+    event = {**event, 'group': group, 'seq': seq, 'sent_at': now.timestamp()}
+    event.setdefault('timestamp', now.isoformat())
+    cache.set(_event_key(group, seq), event, timeout=settings.WEBSOCKET_REPLAY_TTL)
+    return event
+
+
+def missed_events(group, after):
+    """``(last_seq, events)`` for events after ``after``; events is None if any are gone."""
+    last = last_sequence(group)
+    if after > last or last - after > settings.WEBSOCKET_REPLAY_SIZE:
+        # Counter reset, or more was missed than is kept
+        return last, None
+    keys = [_event_key(group, seq) for seq in range(after + 1, last + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return last, None
+    return last, [found[key] for key in keys]
+
+
+def query_param(scope, name):
+    values = parse_qs(scope.get('query_string', b'').decode()).get(name)
+    return values[0] if values else None
+
+
+class SequencedGroupMixin:
+    """Send sequenced events to ``room_group_name`` and replay missed ones.
+
+    Replayed events go straight to the consumer's handler for their
+    ``type``, so they produce the same frames as live delivery.
+    """
+
+    async def group_send_sequenced(self, event):
+        event = await sync_to_async(stamp, thread_sensitive=False)(self.room_group_name, event)
+        await self.channel_layer.group_send(self.room_group_name, event)
+
+    def requested_resume(self):
+        """The ``after`` sequence number the client reconnected with, if any."""
+        after = query_param(self.scope, 'after')
+        return int(after) if after and after.isdigit() else None
+
+    async def missed(self, after):
+        """``(last_seq, events)``; events is None when ``after`` is None or they are gone."""
+        if after is None:
+            return await sync_to_async(last_sequence, thread_sensitive=False)(self.room_group_name), None
+        return await sync_to_async(missed_events, thread_sensitive=False)(self.room_group_name, after)
+
+    async def replay(self, events):
+        for event in events:
+            await getattr(self, event['type'])(event)
+
+    async def resume(self, after):
+        """Handle a client's request for everything after ``after``."""
+        if isinstance(after, bool) or not isinstance(after, int) or after < 0:
+            await self.send_json({'type': 'error', 'message': 'Invalid resume request'})
+            return
+
+        last, events = await self.missed(after)
+        if events is not None:
+            await self.replay(events)
+        await self.send_json({
+            'type': 'resume_complete' if events is not None else 'resync_required',
+            'seq': last
+        })
@@ -1,10 +1,26 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken
 from .consumers import NotificationConsumer, ChatConsumer
 from unittest.mock import Mock, patch, AsyncMock
 import asyncio
+import json
+import time
+from channels.consumer import AsyncConsumer
+from channels.exceptions import StopConsumer
+from channels.utils import await_many_dispatch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+from apps.metrics.registry import registry
+from channels.layers import InMemoryChannelLayer
+from .admission import RETRY_LATER, HandshakeGate
+from .fanout import LocalGroupMixin, local_groups
+from .heartbeat import HEARTBEAT_ACK, HEARTBEAT_TIMEOUT
+from .identity import SocketUser, group_name, load_socket_user
+from .sequencing import missed_events, stamp
 from tests.utils import generate_test_password
 
 User = get_user_model()
@@ -107,6 +123,45 @@ class NotificationConsumerTest(WebSocketConsumerTest):
         finally:
             loop.close()
 
+    def test_inbox_snapshot(self):
+        from apps.notifications.models import Notification
+        Notification.objects.create(user=self.user1, message='Older')
+        Notification.objects.create(user=self.user1, message='Newer', is_read=True)
+        Notification.objects.create(user=self.user2, message='Other user')
+        self.consumer.user = self.user1
+
+        # Call the wrapped sync function so the query runs in the test transaction
+        unread_count, notifications = NotificationConsumer.get_inbox_snapshot.__wrapped__(self.consumer)
+
+        self.assertEqual(unread_count, 1)
+        self.assertEqual([n['message'] for n in notifications], ['Newer', 'Older'])
+
+    @override_settings(NOTIFICATIONS_MAX_FRAMES_PER_SECOND=2)
+    def test_notification_frames_are_capped(self):
+        consumer = NotificationConsumer()
+        consumer.send = AsyncMock()
+        events = [
+            {'message': f'Mention {i}', 'notification_type': 'info', 'id': i}
+            for i in range(10)
+        ]
+
+        async def burst():
+            for event in events:
+                await consumer.notification_message(event)
+            await consumer.release_task
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(burst())
+        finally:
+            loop.close()
+
+        frames = [json.loads(c[1]['text_data']) for c in consumer.send.call_args_list]
+        self.assertEqual([f['type'] for f in frames], ['notification', 'notification', 'notification_digest'])
+        self.assertEqual(frames[-1]['count'], 8)
+        self.assertEqual(frames[-1]['notifications'][-1]['message'], 'Mention 9')
+
     def test_notification_message_structure(self):
         # Test the notification message structure
         event = {
@@ -313,4 +368,529 @@ class ChatConsumerTest(WebSocketConsumerTest):
             self.assertIn('error', text_data)
             self.assertIn('Invalid message format', text_data)
         finally:
-            loop.close()
\ No newline at end of file
+            loop.close()
+
+
+@override_settings(WEBSOCKET_LOCAL_FANOUT=False, WEBSOCKET_HEARTBEAT_INTERVAL=0)
+class ConsumerMetricsTest(WebSocketConsumerTest):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.consumer = ChatConsumer()
+        self.consumer.scope = {
+            'type': 'websocket',
+            'url_route': {'kwargs': {'room_name': 'testroom'}},
+            'query_string': f'token={self.token1}'.encode()
+        }
+        self.consumer.channel_name = 'test-channel'
+        self.consumer.channel_layer = Mock()
+        self.consumer.channel_layer.group_add = AsyncMock()
+        self.consumer.channel_layer.group_send = AsyncMock()
+        self.consumer.channel_layer.group_discard = AsyncMock()
+        self.consumer.base_send = AsyncMock()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def value(self, name, **labels):
+        metric = registry.snapshot()[name]
+        return metric['values'].get(tuple(labels[label] for label in metric['labelnames']), 0)
+
+    def test_connect_and_disconnect_track_sockets(self):
+        self.consumer.get_user_from_token = AsyncMock(return_value=self.user1)
+
+        self.loop.run_until_complete(self.consumer.dispatch({'type': 'websocket.connect'}))
+
+        self.assertEqual(self.value('websocket_connections', consumer='ChatConsumer'), 1)
+        self.assertEqual(self.value('websocket_groups', consumer='ChatConsumer'), 1)
+        self.assertEqual(self.value('websocket_handshakes_total', consumer='ChatConsumer', result='accepted'), 1)
+        handshake = self.value('websocket_handshake_duration_seconds', consumer='ChatConsumer')
+        self.assertEqual(handshake[2], 1)
+
+        with self.assertRaises(StopConsumer):
+            self.loop.run_until_complete(self.consumer.dispatch({'type': 'websocket.disconnect', 'code': 1000}))
+
+        self.assertEqual(self.value('websocket_connections', consumer='ChatConsumer'), 0)
+        self.assertEqual(self.value('websocket_groups', consumer='ChatConsumer'), 0)
+
+    def test_rejected_handshake(self):
+        self.consumer.get_user_from_token = AsyncMock(return_value=None)
+
+        self.loop.run_until_complete(self.consumer.dispatch({'type': 'websocket.connect'}))
+
+        self.assertEqual(self.value('websocket_handshakes_total', consumer='ChatConsumer', result='rejected'), 1)
+        self.assertEqual(self.value('websocket_connections', consumer='ChatConsumer'), 0)
+
+    def test_frames_counted_by_type(self):
+        self.consumer.user = self.user1
+        self.consumer.room_group_name = 'chat_testroom'
+
+        self.loop.run_until_complete(self.consumer.dispatch({
+            'type': 'websocket.receive',
+            'text': json.dumps({'type': 'chat_message', 'message': 'Hi'})
+        }))
+        self.loop.run_until_complete(self.consumer.dispatch({
+            'type': 'websocket.receive',
+            'text': json.dumps({'type': 'made_up', 'message': 'Hi'})
+        }))
+        self.loop.run_until_complete(self.consumer.dispatch({
+            'type': 'chat_message', 'message': 'Hi', 'user': 'user1', 'user_id': 1,
+            'message_type': 'chat_message', 'sent_at': time.time() - 0.05
+        }))
+
+        self.assertEqual(self.value('websocket_messages_total', consumer='ChatConsumer',
+                                    direction='in', type='chat_message'), 1)
+        self.assertEqual(self.value('websocket_messages_total', consumer='ChatConsumer',
+                                    direction='in', type='other'), 1)
+        self.assertEqual(self.value('websocket_messages_total', consumer='ChatConsumer',
+                                    direction='out', type='chat_message'), 1)
+        latency = self.value('websocket_delivery_latency_seconds', consumer='ChatConsumer', type='chat_message')
+        self.assertEqual(latency[2], 1)
+        self.assertGreaterEqual(latency[1], 0.05)
+
+
+@override_settings(WEBSOCKET_LOCAL_FANOUT=False, WEBSOCKET_HEARTBEAT_INTERVAL=0)
+class SequencingTest(WebSocketConsumerTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def chat_event(self, message):
+        return {'type': 'chat_message', 'message': message, 'user': 'user1', 'user_id': self.user1.id}
+
+    def test_stamp_numbers_events_per_group(self):
+        first = stamp('chat_a', self.chat_event('one'))
+        second = stamp('chat_a', {**self.chat_event('two'), 'timestamp': '2024-01-01T00:00:00Z'})
+        other = stamp('chat_b', self.chat_event('three'))
+
+        self.assertEqual((first['seq'], second['seq'], other['seq']), (1, 2, 1))
+        self.assertIsNotNone(first['timestamp'])
+        self.assertEqual(second['timestamp'], '2024-01-01T00:00:00Z')
+        self.assertIn('sent_at', first)
+
+    @override_settings(CHANNEL_GROUP_EXPIRY=900, WEBSOCKET_REPLAY_TTL=300)
+    def test_sequence_counter_expires_when_idle(self):
+        with patch.object(cache, 'add', wraps=cache.add) as add, \
+                patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            stamp('chat_a', self.chat_event('one'))
+            stamp('chat_a', self.chat_event('two'))
+
+        add.assert_called_once_with('ws:seq:chat_a', 0, timeout=900)
+        touch.assert_called_once_with('ws:seq:chat_a', 900)
+
+    def test_missed_events(self):
+        for i in range(3):
+            stamp('chat_a', self.chat_event(f'm{i}'))
+
+        last, events = missed_events('chat_a', 1)
+        self.assertEqual(last, 3)
+        self.assertEqual([e['message'] for e in events], ['m1', 'm2'])
+        self.assertEqual(missed_events('chat_a', 3), (3, []))
+        # Ahead of the counter means it was reset
+        self.assertEqual(missed_events('chat_a', 5), (3, None))
+
+        with override_settings(WEBSOCKET_REPLAY_SIZE=1):
+            self.assertEqual(missed_events('chat_a', 1), (3, None))
+
+        cache.delete('ws:event:chat_a:2')
+        self.assertEqual(missed_events('chat_a', 1), (3, None))
+
+    def test_resume_replays_missing_frames(self):
+        consumer = ChatConsumer()
+        consumer.room_group_name = 'chat_testroom'
+        consumer.send = AsyncMock()
+        for i in range(3):
+            stamp('chat_testroom', self.chat_event(f'm{i}'))
+
+        self.loop.run_until_complete(consumer.resume(1))
+
+        frames = [json.loads(c[1]['text_data']) for c in consumer.send.call_args_list]
+        self.assertEqual([(f['type'], f['seq']) for f in frames],
+                         [('chat_message', 2), ('chat_message', 3), ('resume_complete', 3)])
+
+    @override_settings(WEBSOCKET_REPLAY_SIZE=1)
+    def test_resume_too_far_behind_requires_resync(self):
+        consumer = ChatConsumer()
+        consumer.room_group_name = 'chat_testroom'
+        consumer.send = AsyncMock()
+        for i in range(3):
+            stamp('chat_testroom', self.chat_event(f'm{i}'))
+
+        self.loop.run_until_complete(consumer.resume(0))
+
+        frames = [json.loads(c[1]['text_data']) for c in consumer.send.call_args_list]
+        self.assertEqual(frames, [{'type': 'resync_required', 'seq': 3}])
+
+    def test_reconnect_with_after_skips_snapshot(self):
+        consumer = NotificationConsumer()
+        consumer.scope = {
+            'url_route': {'kwargs': {'user_id': str(self.user1.id)}},
+            'query_string': f'token={self.token1}&after=1'.encode()
+        }
+        consumer.channel_name = 'test-channel'
+        consumer.channel_layer = Mock()
+        consumer.channel_layer.group_add = AsyncMock()
+        consumer.base_send = AsyncMock()
+        consumer.send = AsyncMock()
+        consumer.get_user_from_token = AsyncMock(return_value=self.user1)
+        consumer.get_inbox_snapshot = AsyncMock()
+        group = f'notifications_{self.user1.id}'
+        for i in range(2):
+            stamp(group, {'type': 'notification_message', 'id': i, 'message': f'n{i}', 'notification_type': 'info'})
+
+        self.loop.run_until_complete(consumer.connect())
+
+        frames = [json.loads(c[1]['text_data']) for c in consumer.send.call_args_list]
+        consumer.get_inbox_snapshot.assert_not_called()
+        self.assertEqual(frames[0]['type'], 'connection_established')
+        self.assertEqual((frames[0]['seq'], frames[0]['resumed']), (2, True))
+        self.assertNotIn('notifications', frames[0])
+        self.assertEqual([(f['type'], f['seq']) for f in frames[1:]], [('notification', 2)])
+
+
+class ChannelLayerCheckTest(TestCase):
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_in_memory_layer_passes(self):
+        out = StringIO()
+
+        call_command('check_channel_layer', timeout=0.2, stdout=out)
+
+        self.assertIn('InMemoryChannelLayer', out.getvalue())
+        self.assertNotIn('FAIL', out.getvalue())
+        self.assertIn('compatible with the consumers', out.getvalue())
+
+
+class LocalFanoutTest(WebSocketConsumerTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.layer = InMemoryChannelLayer()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def chat_consumer(self):
+        consumer = ChatConsumer()
+        consumer.channel_layer = self.layer
+        consumer.channel_name = f'specific.test!{id(consumer)}'
+        consumer.room_group_name = 'chat_testroom'
+        consumer.send = AsyncMock()
+        return consumer
+
+    def dispatch_loops(self, consumers):
+        """Stand-ins for the consumers' own loops, which read ``local_events``."""
+        return [
+            asyncio.ensure_future(await_many_dispatch([consumer.local_events.get], consumer.dispatch))
+            for consumer in consumers
+        ]
+
+    def test_broadcast_delivered_once_per_process(self):
+        consumers = [self.chat_consumer() for _ in range(3)]
+
+        async def scenario():
+            loops = self.dispatch_loops(consumers)
+            for consumer in consumers:
+                await consumer.join_group('chat_testroom')
+            # Only the relay channel is a member of the layer group
+            self.assertEqual(len(self.layer.groups['chat_testroom']), 1)
+
+            await consumers[0].group_send_sequenced({
+                'type': 'chat_message', 'message': 'Hi', 'user': 'user1',
+                'user_id': self.user1.id, 'message_type': 'chat_message'
+            })
+            registry = local_groups(self.layer)
+            while any(not consumer.send.called for consumer in consumers):
+                await asyncio.sleep(0.01)
+            await registry.close()
+            for loop in loops:
+                loop.cancel()
+
+        self.loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+
+        texts = [consumer.send.call_args[1]['text_data'] for consumer in consumers]
+        # Serialized once and shared by every local member
+        self.assertTrue(all(text is texts[0] for text in texts))
+        frame = json.loads(texts[0])
+        self.assertEqual((frame['type'], frame['message'], frame['seq']), ('chat_message', 'Hi', 1))
+        self.assertNotIn('group', frame)
+
+    @patch('apps.websockets.fanout.ERROR_BACKOFF', 0)
+    def test_relay_survives_layer_errors(self):
+        consumer = self.chat_consumer()
+        receive = self.layer.receive
+        failures = [ConnectionError('Redis unavailable')]
+
+        async def flaky_receive(channel):
+            if failures:
+                raise failures.pop()
+            return await receive(channel)
+
+        async def scenario():
+            loops = self.dispatch_loops([consumer])
+            with patch.object(self.layer, 'receive', side_effect=flaky_receive):
+                await consumer.join_group('chat_testroom')
+                await consumer.group_send_sequenced({
+                    'type': 'chat_message', 'message': 'Hi', 'user': 'user1',
+                    'user_id': self.user1.id, 'message_type': 'chat_message'
+                })
+                while not consumer.send.called:
+                    await asyncio.sleep(0.01)
+            await local_groups(self.layer).close()
+            loops[0].cancel()
+
+        with self.assertLogs('apps.websockets.fanout', 'ERROR'):
+            self.loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+
+        self.assertEqual(json.loads(consumer.send.call_args[1]['text_data'])['message'], 'Hi')
+
+    @override_settings(WEBSOCKET_GROUP_SWEEP_INTERVAL=0.01)
+    @patch('apps.websockets.fanout.ERROR_BACKOFF', 0)
+    def test_sweep_survives_layer_errors(self):
+        consumer = self.chat_consumer()
+        consumer.is_stale = Mock(return_value=False)
+        group_add = self.layer.group_add
+        calls = []
+
+        async def flaky_group_add(group, channel):
+            calls.append(group)
+            if len(calls) == 2:
+                raise ConnectionError('Redis unavailable')
+            await group_add(group, channel)
+
+        async def scenario():
+            with patch.object(self.layer, 'group_add', side_effect=flaky_group_add):
+                await consumer.join_group('chat_testroom')
+                # The join, a failing sweep, then sweeps refreshing the group again
+                while len(calls) < 4:
+                    await asyncio.sleep(0.01)
+            groups = local_groups(self.layer)
+            self.assertFalse(groups.sweep_task.done())
+            await groups.close()
+
+        with self.assertLogs('apps.websockets.fanout', 'ERROR'):
+            self.loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+
+        self.assertEqual(calls[3], 'chat_testroom')
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_group_events_wait_for_the_consumer(self):
+        class RecordingConsumer(LocalGroupMixin, AsyncConsumer):
+            handled = []
+
+            async def websocket_receive(self, message):
+                self.handled.append('client frame')
+                await asyncio.sleep(0.05)
+                self.handled.append('client frame done')
+
+            async def chat_message(self, event):
+                self.handled.append('group event')
+
+            async def websocket_disconnect(self, message):
+                raise StopConsumer()
+
+        consumer = RecordingConsumer()
+        client = asyncio.Queue()
+
+        async def scenario():
+            task = asyncio.ensure_future(consumer({'type': 'websocket'}, client.get, AsyncMock()))
+            while not hasattr(consumer, 'channel_name'):
+                await asyncio.sleep(0)
+            await consumer.join_group('chat_order')
+            groups = local_groups(consumer.channel_layer)
+
+            await client.put({'type': 'websocket.receive', 'text': 'hello'})
+            while not consumer.handled:
+                await asyncio.sleep(0)
+            # Arrives while the client frame is still being handled
+            await groups.deliver({'type': 'chat.message', 'group': 'chat_order'})
+            await client.put({'type': 'websocket.disconnect', 'code': 1000})
+            await task
+            await groups.close()
+
+        self.loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+
+        self.assertEqual(consumer.handled, ['client frame', 'client frame done', 'group event'])
+
+    def test_last_member_leaving_unsubscribes(self):
+        first, second = self.chat_consumer(), self.chat_consumer()
+
+        async def scenario():
+            await first.join_group('chat_testroom')
+            await second.join_group('chat_testroom')
+            await first.leave_group('chat_testroom')
+            self.assertEqual(len(self.layer.groups['chat_testroom']), 1)
+            await second.leave_group('chat_testroom')
+            await local_groups(self.layer).close()
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertNotIn('chat_testroom', self.layer.groups)
+
+
+class AdmissionControlTest(WebSocketConsumerTest):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def test_gate_queues_then_rejects(self):
+        async def scenario():
+            gate = HandshakeGate(limit=1, queue_size=1)
+            self.assertTrue(await gate.acquire(timeout=1))
+            waiter = asyncio.ensure_future(gate.acquire(timeout=1))
+            await asyncio.sleep(0)
+            # Slot taken and the one queue place used
+            self.assertFalse(await gate.acquire(timeout=1))
+            gate.release()
+            self.assertTrue(await waiter)
+            self.assertFalse(await gate.acquire(timeout=0.01))
+
+        self.loop.run_until_complete(scenario())
+
+    def test_timed_out_or_cancelled_wait_keeps_no_slot(self):
+        async def scenario():
+            gate = HandshakeGate(limit=1, queue_size=2)
+            self.assertTrue(await gate.acquire(timeout=1))
+            self.assertFalse(await gate.acquire(timeout=0.01))
+
+            waiter = asyncio.ensure_future(gate.acquire(timeout=5))
+            await asyncio.sleep(0)
+            # The slot passes to the waiter just as its handshake is cancelled
+            gate.release()
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+            self.assertEqual(gate.waiting, 0)
+            self.assertTrue(await gate.acquire(timeout=0.01))
+            self.assertFalse(await gate.acquire(timeout=0.01))
+
+        self.loop.run_until_complete(scenario())
+
+    @override_settings(WEBSOCKET_HANDSHAKE_CONCURRENCY=1, WEBSOCKET_HANDSHAKE_QUEUE=0,
+                       WEBSOCKET_RETRY_AFTER=(2.0, 4.0))
+    def test_busy_handshake_gets_retry_hint(self):
+        consumer = ChatConsumer()
+        consumer.scope = {'type': 'websocket', 'url_route': {'kwargs': {'room_name': 'testroom'}}}
+        consumer.base_send = AsyncMock()
+        consumer.get_user_from_token = AsyncMock()
+
+        async def scenario():
+            gate = HandshakeGate(limit=1, queue_size=0)
+            await gate.acquire(timeout=1)
+            with patch('apps.websockets.admission.handshake_gate', return_value=gate):
+                await consumer.dispatch({'type': 'websocket.connect'})
+            with self.assertRaises(StopConsumer):
+                await consumer.dispatch({'type': 'websocket.disconnect', 'code': RETRY_LATER})
+
+        self.loop.run_until_complete(scenario())
+
+        sent = [c[0][0] for c in consumer.base_send.call_args_list]
+        self.assertEqual([m['type'] for m in sent], ['websocket.accept', 'websocket.send', 'websocket.close'])
+        hint = json.loads(sent[1]['text'])
+        self.assertEqual(hint['type'], 'retry_later')
+        self.assertTrue(2.0 <= hint['retry_after'] <= 4.0)
+        self.assertEqual(sent[2]['code'], RETRY_LATER)
+        consumer.get_user_from_token.assert_not_called()
+        handshakes = registry.snapshot()['websocket_handshakes_total']['values']
+        self.assertEqual(handshakes, {('ChatConsumer', 'throttled'): 1})
+        self.assertEqual(registry.snapshot()['websocket_connections']['values'].get(('ChatConsumer',), 0), 0)
+
+
+@override_settings(WEBSOCKET_HEARTBEAT_INTERVAL=0.01, WEBSOCKET_HEARTBEAT_MISSES=2)
+class HeartbeatTest(WebSocketConsumerTest):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def chat_consumer(self):
+        consumer = ChatConsumer()
+        consumer.room_group_name = 'chat_testroom'
+        consumer.base_send = AsyncMock()
+        consumer.leave_group = AsyncMock()
+        return consumer
+
+    def test_silent_socket_is_reaped(self):
+        consumer = self.chat_consumer()
+
+        async def scenario():
+            await consumer.accept()
+            await asyncio.wait_for(consumer.heartbeat_task, 5)
+
+        self.loop.run_until_complete(scenario())
+
+        sent = [c[0][0] for c in consumer.base_send.call_args_list]
+        self.assertEqual(json.loads(sent[1]['text']), {'type': 'heartbeat'})
+        self.assertEqual(sent[-1], {'type': 'websocket.close', 'code': HEARTBEAT_TIMEOUT})
+        consumer.leave_group.assert_awaited_once_with('chat_testroom')
+        self.assertEqual(registry.snapshot()['websocket_reaped_total']['values'], {('ChatConsumer',): 1})
+
+    def test_ack_keeps_socket_alive(self):
+        consumer = self.chat_consumer()
+        consumer.receive = AsyncMock()
+
+        async def scenario():
+            await consumer.accept()
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                await consumer.dispatch({'type': 'websocket.receive', 'text': HEARTBEAT_ACK})
+            self.assertFalse(consumer.heartbeat_task.done())
+            consumer.heartbeat_task.cancel()
+
+        self.loop.run_until_complete(scenario())
+
+        consumer.receive.assert_not_called()
+        consumer.leave_group.assert_not_called()
+
+    def test_sweep_drops_stale_members(self):
+        layer = InMemoryChannelLayer()
+        live, stale = Mock(), Mock()
+        live.is_stale.return_value = False
+        stale.is_stale.return_value = True
+
+        async def scenario():
+            groups = local_groups(layer)
+            await groups.add('chat_live', live)
+            await groups.add('chat_live', stale)
+            await groups.add('chat_dead', stale)
+            await groups.sweep_once()
+            await groups.close()
+            return groups
+
+        groups = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(groups.members, {'chat_live': {live}})
+        self.assertIn('chat_live', layer.groups)
+        self.assertNotIn('chat_dead', layer.groups)
+
+
+class SocketIdentityTest(WebSocketConsumerTest):
+    def test_load_socket_user(self):
+        with self.assertNumQueries(1):
+            identity = load_socket_user(self.user1.id)
+        self.assertEqual(identity, SocketUser(self.user1.id, 'user1'))
+        self.assertFalse(hasattr(identity, '__dict__'))
+        self.assertIsNone(load_socket_user(0))
+
+    def test_load_socket_user_refuses_logged_out_tokens(self):
+        logged_out_at = timezone.now()
+        User.objects.filter(pk=self.user1.pk).update(tokens_valid_after=logged_out_at)
+
+        self.assertIsNone(load_socket_user(self.user1.id, int(logged_out_at.timestamp()) - 10))
+        self.assertIsNone(load_socket_user(self.user1.id, int(logged_out_at.timestamp())))
+        self.assertIsNotNone(load_socket_user(self.user1.id, int(logged_out_at.timestamp()) + 10))
+
+        User.objects.filter(pk=self.user1.pk).update(is_active=False)
+        self.assertIsNone(load_socket_user(self.user1.id, int(logged_out_at.timestamp()) + 10))
+
+    def test_group_names_are_interned(self):
+        room = ''.join(['test', 'room'])
+        self.assertIs(group_name('chat', room), group_name('chat', 'testroom'))
@@ -0,0 +1,127 @@
+"""
+Response compression for API payloads.
+
+Like Django's ``GZipMiddleware``, with these differences:
+
+- Brotli is used when the client accepts ``br`` and the ``brotli`` package
+  is installed, gzip otherwise.
+- Only ``COMPRESSION_CONTENT_TYPES`` are compressed. HTML, which can carry
+  a CSRF token next to reflected input (BREACH), is left alone.
+- Responses under ``COMPRESSION_MIN_SIZE`` bytes are sent as they are.
+- Streaming responses are compressed chunk by chunk, and each chunk is
+  flushed, so a client receives every batch as soon as it is rendered.
+
+nginx does not compress a response again when it already has a
+``Content-Encoding``.
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# GZipMiddleware's BREACH mitigation: a random-length gzip header
+MAX_RANDOM_BYTES = 100
+
+re_coding = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """The codings named in an ``Accept-Encoding`` header with a non-zero quality."""
+    accepted = set()
+    for part in header.split(','):
+        match = re_coding.match(part)
+        if match:
+            try:
+                quality = float(match.group(2) or 1)
+            except ValueError:
+                continue
+            if quality > 0:
+                accepted.add(match.group(1).lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def gzip_sequence(sequence):
+    # Django's compress_sequence only yields when zlib's buffer fills; a
+    # sync flush per chunk sends each one on. Streamed rows are data, not
+    # secrets next to reflected input, so the random header is not needed.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for item in sequence:
+        data = compressor.compress(item) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress JSON and CSV responses with brotli or gzip."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES or response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                # Rare here (no async views); left to the proxy
+                return response
+            if encoding == 'br':
+                response.streaming_content = brotli_sequence(
+                    response.streaming_content, settings.COMPRESSION_BROTLI_QUALITY
+                )
+            else:
+                response.streaming_content = gzip_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=MAX_RANDOM_BYTES)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # ETags are left as the view set them. Ours name a version of the
+        # resource (e.g. the profile's updated_at), whatever the encoding, and
+        # If-Match compares them strongly, so a weakened one would always fail.
+        response.headers['Content-Encoding'] = encoding
+        return response
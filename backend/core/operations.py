@@ -0,0 +1,104 @@
+"""
+Migration operations that build indexes without blocking writes.
+
+On PostgreSQL, ``CREATE INDEX`` blocks every write to the table until the
+build finishes. ``CREATE INDEX CONCURRENTLY`` only waits for transactions
+already running and lets inserts and updates continue. Django's
+``AddIndexConcurrently`` is PostgreSQL-only, and ``AddConstraint`` has no
+concurrent form for unique constraints that are really indexes (on
+expressions or with a condition). The operations here build concurrently
+on PostgreSQL and run the plain statement elsewhere (SQLite in development
+and tests). Migrations using them must set ``atomic = False``.
+
+A concurrent build that fails or is interrupted leaves an INVALID index
+behind. Rerunning the migration drops it first.
+"""
+from django.db import NotSupportedError
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+def _concurrent(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return False
+    if schema_editor.connection.in_atomic_block:
+        raise NotSupportedError('Concurrent index builds cannot run in a transaction; set atomic = False on the migration.')
+    return True
+
+
+def _drop_invalid_index(schema_editor, name):
+    if schema_editor.collect_sql:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE c.relname = %s AND NOT i.indisvalid',
+            [name],
+        )
+        invalid = cursor.fetchone()
+    if invalid:
+        schema_editor.execute(schema_editor.sql_delete_index_concurrently % {'name': schema_editor.quote_name(name)})
+
+
+class AddIndexConcurrently(AddIndex):
+    """``AddIndex``, built with ``CREATE INDEX CONCURRENTLY`` on PostgreSQL."""
+
+    atomic = False
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _concurrent(schema_editor):
+            _drop_invalid_index(schema_editor, self.index.name)
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _concurrent(schema_editor):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class AddUniqueIndexConcurrently(AddConstraint):
+    """``AddConstraint`` for an index-backed ``UniqueConstraint``, built concurrently on PostgreSQL."""
+
+    atomic = False
+
+    def __init__(self, model_name, constraint):
+        if not (constraint.expressions or constraint.condition):
+            raise ValueError(
+                f'{constraint.name}: only unique constraints on expressions or with a condition are indexes'
+            )
+        super().__init__(model_name, constraint)
+
+    def describe(self):
+        return f'Concurrently create unique index {self.constraint.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _concurrent(schema_editor):
+            schema_editor.add_constraint(model, self.constraint)
+            return
+        _drop_invalid_index(schema_editor, self.constraint.name)
+        statement = self.constraint.create_sql(model, schema_editor)
+        statement.template = statement.template.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+        schema_editor.execute(statement, params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _concurrent(schema_editor):
+            schema_editor.execute(schema_editor._delete_index_sql(model, self.constraint.name, concurrently=True))
+        else:
+            schema_editor.remove_constraint(model, self.constraint)
@@ -0,0 +1,102 @@
+"""
+Precompiled read-only representations for DRF model serializers.
+
+A ``ModelSerializer`` rebuilds its fields by model introspection on every
+instantiation, then renders each field through ``get_attribute`` and
+``to_representation``. ``FastReadMixin`` compiles a serializer's readable
+fields once per class into ``(name, source, convert)`` triples, and renders
+model instances, or the rows of a ``values()`` queryset, with one loop over
+them. The output equals ``.data``; the tests of every serializer using the
+mixin compare the two.
+
+Only plain model fields are supported. Nested serializers, relations and
+method fields raise ``ImproperlyConfigured`` when the class is compiled.
+"""
+import time
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields, relations, serializers
+
+from apps.metrics.instrumentation import current_stats, record_serializer
+
+# Exact field classes whose to_representation of a non-None value is a
+# plain conversion; any other field keeps its own to_representation
+CONVERTERS = {
+    fields.IntegerField: int,
+    fields.CharField: str,
+    fields.EmailField: str,
+    fields.SlugField: str,
+    fields.BooleanField: bool,
+}
+
+
+@lru_cache(maxsize=None)
+def compile_fields(serializer_class):
+    """``[(name, source, convert), ...]`` for the readable fields of ``serializer_class``."""
+    compiled = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, relations.RelatedField,
+                              relations.ManyRelatedField, fields.SerializerMethodField)):
+            raise ImproperlyConfigured(
+                f'{serializer_class.__name__}.{name}: {type(field).__name__} has no fast read path'
+            )
+        if len(field.source_attrs) != 1:
+            raise ImproperlyConfigured(
+                f'{serializer_class.__name__}.{name}: only single-attribute sources have a fast read path'
+            )
+        convert = CONVERTERS.get(type(field), field.to_representation)
+        compiled.append((name, field.source, convert))
+    return compiled
+
+
+def _measured(render):
+    if current_stats.get() is None:
+        return render()
+    started = time.perf_counter()
+    try:
+        return render()
+    finally:
+        record_serializer(time.perf_counter() - started)
+
+
+class FastReadMixin:
+    """Render a model serializer's output without instantiating it.
+
+        UserSerializer.represent(user)
+        NotificationSerializer.represent_values(NotificationSerializer.values(queryset))
+    """
+
+    @classmethod
+    def represent(cls, instance):
+        return _measured(lambda: cls._represent_one(instance))
+
+    @classmethod
+    def represent_many(cls, instances):
+        return _measured(lambda: [cls._represent_one(instance) for instance in instances])
+
+    @classmethod
+    def values(cls, queryset):
+        """``queryset`` selecting only the serialized columns, as dicts."""
+        return queryset.values(*(source for _name, source, _convert in compile_fields(cls)))
+
+    @classmethod
+    def represent_values(cls, rows):
+        """Render rows of :meth:`values`, skipping model instantiation."""
+        compiled = compile_fields(cls)
+        return _measured(lambda: [
+            {
+                name: None if (value := row[source]) is None else convert(value)
+                for name, source, convert in compiled
+            }
+            for row in rows
+        ])
+
+    @classmethod
+    def _represent_one(cls, instance):
+        return {
+            name: None if (value := getattr(instance, source)) is None else convert(value)
+            for name, source, convert in compile_fields(cls)
+        }
@@ -3,6 +3,7 @@ from pathlib import Path
 from decouple import config
 import dj_database_url
 from datetime import timedelta
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -12,8 +13,11 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1').split(',')
 
-DJANGO_APPS = [
-    'daphne',
+# The daphne app only swaps in an ASGI runserver, but importing it loads
+# Twisted; production WSGI workers, Celery and the daphne server skip it.
+ASGI_RUNSERVER = config('ASGI_RUNSERVER', default=DEBUG, cast=bool)
+
+DJANGO_APPS = (['daphne'] if ASGI_RUNSERVER else []) + [
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -34,12 +38,18 @@ LOCAL_APPS = [
     'apps.users',
     'apps.authentication',
     'apps.websockets',
+    'apps.notifications',
+    'apps.metrics',
+    'apps.benchmarks',
+    'apps.maintenance',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.metrics.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -50,6 +60,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Response compression (core/middleware.py): JSON and CSV bodies of at least
+# COMPRESSION_MIN_SIZE bytes, and all streaming ones, are sent with brotli
+# (quality 0-11) when the client accepts it, or gzip.
+COMPRESSION_CONTENT_TYPES = ('application/json', 'text/csv')
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+
+# Development only: log repeated SQL templates (N+1) per request
+QUERY_INSPECTION = config('QUERY_INSPECTION', default=False, cast=bool)
+QUERY_INSPECTION_THRESHOLD = config('QUERY_INSPECTION_THRESHOLD', default=3, cast=int)
+if QUERY_INSPECTION:
+    MIDDLEWARE.insert(1, 'apps.metrics.middleware.QueryInspectionMiddleware')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -128,16 +151,42 @@ AUTH_USER_MODEL = 'users.User'
 # Django Rest Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    # Applies to views with a throttle_scope (login, register, resend_verification); see
+    # apps/authentication/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'apps.authentication.throttling.SlidingWindowThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('THROTTLE_LOGIN_IP', default='20/min'),
+        'login_email': config('THROTTLE_LOGIN_EMAIL', default='5/min'),
+        'register_ip': config('THROTTLE_REGISTER_IP', default='10/hour'),
+        'register_email': config('THROTTLE_REGISTER_EMAIL', default='5/hour'),
+        'resend_verification_ip': config('THROTTLE_RESEND_VERIFICATION_IP', default='10/hour'),
+        'resend_verification_user': config('THROTTLE_RESEND_VERIFICATION_USER', default='3/hour'),
+    },
+    # Hops (nginx) appending to X-Forwarded-For in front of the app
+    'NUM_PROXIES': config('NUM_PROXIES', default=1, cast=int),
 }
 
+# Seconds a client stays locked out after exceeding a throttle
+AUTH_THROTTLE_LOCKOUT = config('AUTH_THROTTLE_LOCKOUT', default=300, cast=int)
+
 # JWT Settings
+# JWT signing (apps/authentication/keys.py). HS256 signs with SECRET_KEY;
+# RS256, ES256 and EdDSA sign with the private key JWT_SIGNING_KID from
+# JWT_KEYS_DIR, and processes holding only public keys can verify.
+JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
+JWT_KEYS_DIR = config('JWT_KEYS_DIR', default=str(BASE_DIR / 'keys'))
+JWT_SIGNING_KID = config('JWT_SIGNING_KID', default='')
+JWKS_MAX_AGE = config('JWKS_MAX_AGE', default=300, cast=int)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -145,7 +194,7 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
 
-    'ALGORITHM': 'HS256',
+    'ALGORITHM': JWT_ALGORITHM,
     'SIGNING_KEY': SECRET_KEY,
     'VERIFYING_KEY': None,
     'AUDIENCE': None,
@@ -163,6 +212,11 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Refresh rotation state is kept in the cache (apps/authentication/refresh.py).
+# Refreshing an already rotated token within this many seconds (a second tab)
+# returns the same new pair instead of failing.
+REFRESH_ROTATION_GRACE = config('REFRESH_ROTATION_GRACE', default=10, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -174,24 +228,222 @@ CORS_ALLOW_CREDENTIALS = True
 # Redis Configuration
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
+# Cache Configuration
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='apps.metrics.cache.RedisCache'),
+        'LOCATION': config('CACHE_URL', default=REDIS_URL),
+    },
+}
+
 # Celery Configuration
-CELERY_BROKER_URL = REDIS_URL
-CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=REDIS_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Results are only stored for tasks that opt in with ignore_result=False,
+# and expire instead of piling up in Redis.
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_RESULT_EXPIRES = timedelta(seconds=config('CELERY_RESULT_EXPIRES', default=3600, cast=int))
+
+# Queues: "realtime" for latency-sensitive fan-out, "default" for
+# user-facing work and "bulk" for exports and housekeeping. Each queue
+# group runs in its own worker (see docker-compose.prod.yml).
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'apps.authentication.tasks.*': {'queue': 'default'},
+    'apps.notifications.tasks.send_notification': {'queue': 'realtime'},
+    'apps.notifications.tasks.flush_notification_digest': {'queue': 'realtime'},
+    'apps.notifications.tasks.reconcile_unread_counters': {'queue': 'bulk'},
+    'apps.maintenance.tasks.*': {'queue': 'bulk'},
+    'apps.users.tasks.*': {'queue': 'bulk'},
+}
+
+# Priorities 0 (highest) to 9 within a queue; Redis emulates them with
+# one list per priority step.
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+    # Must exceed the longest countdown/ETA, otherwise acks_late tasks
+    # are redelivered while still waiting.
+    'visibility_timeout': config('CELERY_VISIBILITY_TIMEOUT', default=3600, cast=int),
+}
+
+# Acknowledge after the task finishes so a killed worker's task is
+# redelivered, and prefetch one message per process so priorities and
+# fair scheduling hold across long and short tasks.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = config('CELERY_WORKER_PREFETCH_MULTIPLIER', default=1, cast=int)
+CELERY_WORKER_MAX_TASKS_PER_CHILD = config('CELERY_WORKER_MAX_TASKS_PER_CHILD', default=1000, cast=int)
+
 # Channels Configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [REDIS_URL],
+# Channels traffic can run on its own Redis instances, apart from the
+# cache and Celery: CHANNEL_REDIS_URLS is a comma-separated list, and
+# groups and per-process channels are hashed across the hosts.
+CHANNEL_REDIS_URLS = [
+    url.strip() for url in config('CHANNEL_REDIS_URLS', default=REDIS_URL).split(',') if url.strip()
+]
+# 'core' queues every message per channel, so group_send writes once per
+# member; 'pubsub' publishes once per group and each process fans out to
+# its own sockets, which is far cheaper for large rooms but keeps no
+# backlog for a process that is not listening.
+CHANNEL_LAYER_MODE = config('CHANNEL_LAYER_MODE', default='core')
+# Group memberships not refreshed for this long are dropped by the core
+# layer; live processes refresh theirs every WEBSOCKET_GROUP_SWEEP_INTERVAL.
+CHANNEL_GROUP_EXPIRY = config('CHANNEL_GROUP_EXPIRY', default=900, cast=int)
+if CHANNEL_LAYER_MODE == 'pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_URLS,
+            },
         },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_URLS,
+                'capacity': config('CHANNEL_LAYER_CAPACITY', default=100, cast=int),
+                'group_expiry': CHANNEL_GROUP_EXPIRY,
+            },
+        },
+    }
+
+# Deliver group events once per process and fan out to local sockets in
+# memory; redundant with the Pub/Sub layer, which already does this.
+WEBSOCKET_LOCAL_FANOUT = config('WEBSOCKET_LOCAL_FANOUT', default=CHANNEL_LAYER_MODE == 'core', cast=bool)
+
+# Server heartbeats: a socket that sends nothing (not even a heartbeat_ack)
+# for WEBSOCKET_HEARTBEAT_MISSES intervals is closed and leaves its group.
+WEBSOCKET_HEARTBEAT_INTERVAL = config('WEBSOCKET_HEARTBEAT_INTERVAL', default=25, cast=float)
+WEBSOCKET_HEARTBEAT_MISSES = config('WEBSOCKET_HEARTBEAT_MISSES', default=2, cast=int)
+WEBSOCKET_GROUP_SWEEP_INTERVAL = config('WEBSOCKET_GROUP_SWEEP_INTERVAL', default=300, cast=float)
+
+# Handshake admission control per process: at most N concurrent handshakes,
+# a short wait queue, and beyond that a "retry after" hint (seconds, drawn
+# uniformly from WEBSOCKET_RETRY_AFTER_MIN..MAX) so reconnect storms spread out.
+WEBSOCKET_HANDSHAKE_CONCURRENCY = config('WEBSOCKET_HANDSHAKE_CONCURRENCY', default=50, cast=int)
+WEBSOCKET_HANDSHAKE_QUEUE = config('WEBSOCKET_HANDSHAKE_QUEUE', default=200, cast=int)
+WEBSOCKET_HANDSHAKE_QUEUE_TIMEOUT = config('WEBSOCKET_HANDSHAKE_QUEUE_TIMEOUT', default=2.0, cast=float)
+WEBSOCKET_RETRY_AFTER = (
+    config('WEBSOCKET_RETRY_AFTER_MIN', default=1.0, cast=float),
+    config('WEBSOCKET_RETRY_AFTER_MAX', default=15.0, cast=float),
+)
+
+# Group events carry a per-group sequence number; the last
+# WEBSOCKET_REPLAY_SIZE events (kept WEBSOCKET_REPLAY_TTL seconds) can be
+# replayed to a client that reports a gap or reconnects.
+WEBSOCKET_REPLAY_SIZE = config('WEBSOCKET_REPLAY_SIZE', default=200, cast=int)
+WEBSOCKET_REPLAY_TTL = config('WEBSOCKET_REPLAY_TTL', default=300, cast=int)
+
+# Periodic tasks run by celery-beat
+CELERY_BEAT_SCHEDULE = {
+    'flush-expired-tokens': {
+        'task': 'apps.maintenance.tasks.flush_expired_tokens',
+        'schedule': crontab(minute=15),
+    },
+    'flush-expired-sessions': {
+        'task': 'apps.maintenance.tasks.flush_expired_sessions',
+        'schedule': crontab(minute=45),
+    },
+    'prune-notifications': {
+        'task': 'apps.maintenance.tasks.prune_notifications',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'snapshot-refresh-revocations': {
+        'task': 'apps.authentication.tasks.snapshot_refresh_revocations',
+        'schedule': timedelta(minutes=1),
+    },
+    'reconcile-unread-counters': {
+        'task': 'apps.notifications.tasks.reconcile_unread_counters',
+        'schedule': timedelta(minutes=10),
+    },
+    'analyze-tables': {
+        'task': 'apps.maintenance.tasks.analyze_tables',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'prune-bulk-exports': {
+        'task': 'apps.users.tasks.prune_bulk_exports',
+        'schedule': crontab(hour=4, minute=0),
     },
 }
 
+# Bulk admin actions on users (apps/users/bulk.py) run in the background,
+# BULK_ADMIN_BATCH_SIZE users per task. Job state and exports are kept for
+# BULK_JOB_TTL seconds; exports live outside MEDIA_ROOT, which nginx serves.
+BULK_ADMIN_BATCH_SIZE = config('BULK_ADMIN_BATCH_SIZE', default=1000, cast=int)
+BULK_JOB_TTL = config('BULK_JOB_TTL', default=86400, cast=int)
+BULK_EXPORT_DIR = config('BULK_EXPORT_DIR', default=str(BASE_DIR / 'exports'))
+
+# Streaming JSON endpoints (core/renderers.py) read and render this many
+# rows at a time
+STREAMING_BATCH_SIZE = config('STREAMING_BATCH_SIZE', default=500, cast=int)
+
+# Housekeeping deletes MAINTENANCE_BATCH_SIZE rows per transaction and
+# stops after MAINTENANCE_TIME_BUDGET seconds, continuing in a new task.
+MAINTENANCE_BATCH_SIZE = config('MAINTENANCE_BATCH_SIZE', default=1000, cast=int)
+MAINTENANCE_TIME_BUDGET = config('MAINTENANCE_TIME_BUDGET', default=30, cast=int)
+MAINTENANCE_CONTINUATION_DELAY = config('MAINTENANCE_CONTINUATION_DELAY', default=5, cast=int)
+MAINTENANCE_VACUUM_THRESHOLD = config('MAINTENANCE_VACUUM_THRESHOLD', default=0.2, cast=float)
+MAINTENANCE_ANALYZE_MODELS = [
+    'users.User',
+    'token_blacklist.OutstandingToken',
+    'token_blacklist.BlacklistedToken',
+    'sessions.Session',
+    'notifications.Notification',
+]
+
+# Notifications
+NOTIFICATIONS_UNREAD_TTL = config('NOTIFICATIONS_UNREAD_TTL', default=60 * 60 * 24, cast=int)
+NOTIFICATIONS_SNAPSHOT_SIZE = config('NOTIFICATIONS_SNAPSHOT_SIZE', default=20, cast=int)
+NOTIFICATIONS_RETENTION_DAYS = config('NOTIFICATIONS_RETENTION_DAYS', default=90, cast=int)
+
+# Same-type notifications for a user within NOTIFICATIONS_COALESCE_WINDOW
+# seconds are merged into one digest frame; each socket additionally sends
+# at most NOTIFICATIONS_MAX_FRAMES_PER_SECOND notification frames.
+NOTIFICATIONS_COALESCE_WINDOW = config('NOTIFICATIONS_COALESCE_WINDOW', default=5, cast=float)
+NOTIFICATIONS_MAX_FRAMES_PER_SECOND = config('NOTIFICATIONS_MAX_FRAMES_PER_SECOND', default=5, cast=float)
+NOTIFICATIONS_DIGEST_PREVIEW = config('NOTIFICATIONS_DIGEST_PREVIEW', default=5, cast=int)
+
+# Metrics
+# Fraction of requests and consumer messages instrumented (0 disables).
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=1.0, cast=float)
+METRICS_PUBLISH_INTERVAL = config('METRICS_PUBLISH_INTERVAL', default=10, cast=int)
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>"; with DEBUG off
+# and no token it is refused.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Email Configuration
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent_emails'))
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@localhost')
+
+# Outbound mail is buffered for EMAIL_BATCH_WINDOW seconds and delivered
+# EMAIL_BATCH_SIZE messages per SMTP connection.
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
+EMAIL_BATCH_WINDOW = config('EMAIL_BATCH_WINDOW', default=5, cast=int)
+
+# Email Verification
+EMAIL_VERIFICATION_URL = config(
+    'EMAIL_VERIFICATION_URL',
+    default='http://localhost:3000/verify-email?token={token}'
+)
+EMAIL_VERIFICATION_TOKEN_MAX_AGE = config('EMAIL_VERIFICATION_TOKEN_MAX_AGE', default=60 * 60 * 24 * 3, cast=int)
+
 # Security Settings for Production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
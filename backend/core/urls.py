@@ -7,6 +7,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('apps.authentication.urls')),
     path('api/users/', include('apps.users.urls')),
+    path('api/notifications/', include('apps.notifications.urls')),
+    path('metrics/', include('apps.metrics.urls')),
 ]
 
 if settings.DEBUG:
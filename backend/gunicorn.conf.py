@@ -0,0 +1,31 @@
+"""
+Gunicorn settings, read from the working directory on start.
+
+With ``GUNICORN_PRELOAD`` (the default) the master imports the application
+once and forks workers from it: a worker starts without importing Django
+again, and the imported modules stay shared copy-on-write across workers.
+Turn it off to restart workers with fresh code on ``HUP``.
+
+Every module-level name is read as a gunicorn setting, hence
+``decouple.config`` rather than importing ``config`` (a setting name).
+"""
+import gc
+
+import decouple
+
+bind = decouple.config('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = decouple.config('GUNICORN_WORKERS', default=3, cast=int)
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=0, cast=int)
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=0, cast=int)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach; otherwise
+    # a worker's first full collection writes to (and un-shares) every page
+    # holding a preloaded object
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    worker.log.info('Worker ready (pid: %s)', worker.pid)
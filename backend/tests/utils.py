@@ -1,9 +1,11 @@
 """
-Test utilities for secure password generation and other common test functionality.
+Test utilities for secure password generation, query budgets and other common test functionality.
 """
 import secrets
 import string
 
+from apps.metrics.queries import query_budget  # noqa: F401
+
 
 def generate_test_password():
     """Generate a secure test password"""
@@ -4,6 +4,7 @@ import { useAuthStore } from '~/stores/auth'
 
 interface ChatMessage {
   id: string
+  seq?: number
   type: 'chat_message' | 'user_joined' | 'user_left' | 'system'
   message: string
   user: string
@@ -28,21 +29,20 @@ export const useChat = (roomName: string) => {
   const {
     isConnected,
     isConnecting,
-    lastMessage,
     connectionError,
     connect,
     disconnect,
-    send
+    send,
+    onMessage
   } = useWebSocket(wsUrl)
 
-  // Watch for new chat messages
-  watch(lastMessage, (message) => {
-    if (!message) return
-
+  // Frames arrive in sequence order, gaps already filled by useWebSocket
+  onMessage((message) => {
     switch (message.type) {
       case 'chat_message':
         const chatMessage: ChatMessage = {
-          id: Date.now().toString(),
+          id: message.seq !== undefined ? `seq-${message.seq}` : Date.now().toString(),
+          seq: message.seq,
           type: message.type,
           message: message.message,
           user: message.user,
@@ -76,7 +76,7 @@ export const useChat = (roomName: string) => {
           message: `${message.user} joined the chat`,
           user: 'System',
           user_id: 0,
-          timestamp: new Date().toISOString()
+          timestamp: message.timestamp || new Date().toISOString()
         })
         break
 
@@ -93,6 +93,18 @@ export const useChat = (roomName: string) => {
           message: `${message.user} left the chat`,
           user: 'System',
           user_id: 0,
+          timestamp: message.timestamp || new Date().toISOString()
+        })
+        break
+
+      case 'resync_required':
+        // Messages sent while we were away are no longer available
+        messages.value.push({
+          id: Date.now().toString(),
+          type: 'system',
+          message: 'Some messages may be missing',
+          user: 'System',
+          user_id: 0,
           timestamp: new Date().toISOString()
         })
         break
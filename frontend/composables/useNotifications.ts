@@ -3,7 +3,7 @@ import { useWebSocket } from './useWebSocket'
 import { useAuthStore } from '~/stores/auth'
 
 interface Notification {
-  id: string
+  id: number
   type: 'info' | 'success' | 'warning' | 'error'
   message: string
   timestamp: string
@@ -12,7 +12,9 @@ interface Notification {
 
 export const useNotifications = () => {
   const authStore = useAuthStore()
+  const { $api } = useNuxtApp()
   const notifications = ref<Notification[]>([])
+  const unreadCount = ref(0)
 
   const userId = computed(() => authStore.user?.id)
   const wsUrl = computed(() => `ws/notifications/${userId.value}/`)
@@ -20,49 +22,78 @@ export const useNotifications = () => {
   const {
     isConnected,
     isConnecting,
-    lastMessage,
     connectionError,
     connect,
     disconnect,
-    send
+    send,
+    onMessage
   } = useWebSocket(wsUrl.value)
 
-  // Watch for new notification messages
-  watch(lastMessage, (message) => {
-    if (message && message.type === 'notification') {
-      const notification: Notification = {
-        id: Date.now().toString(),
-        type: message.notification_type || 'info',
-        message: message.message,
-        timestamp: message.timestamp || new Date().toISOString(),
-        read: false
-      }
-      
-      notifications.value.unshift(notification)
-      
-      // Keep only last 50 notifications
-      if (notifications.value.length > 50) {
-        notifications.value = notifications.value.slice(0, 50)
+  const toNotification = (item: any): Notification => ({
+    id: item.id,
+    type: item.notification_type || 'info',
+    message: item.message,
+    timestamp: item.timestamp || new Date().toISOString(),
+    read: item.is_read ?? false
+  })
+
+  // Items from the snapshot may arrive again as live frames
+  const prepend = (items: Notification[]) => {
+    const known = new Set(notifications.value.map(n => n.id))
+    notifications.value.unshift(...items.filter(n => !known.has(n.id)))
+  }
+
+  const refresh = async () => {
+    const [list, count] = await Promise.all([
+      $api.get('/notifications/'),
+      $api.get('/notifications/unread-count/')
+    ])
+    notifications.value = (list.data.results ?? list.data).map(toNotification)
+    unreadCount.value = count.data.unread_count
+  }
+
+  // Frames arrive in sequence order, gaps already filled by useWebSocket
+  onMessage((message) => {
+    if (message.type === 'connection_established') {
+      // A fresh connection carries the unread count and latest items; a
+      // resumed one is followed by replays of whatever was missed
+      if (!message.resumed) {
+        notifications.value = (message.notifications || []).map(toNotification)
+        unreadCount.value = message.unread_count ?? 0
       }
+    } else if (message.type === 'resync_required') {
+      refresh()
+    } else if (message.type === 'notification') {
+      prepend([toNotification(message)])
+      unreadCount.value++
+    } else if (message.type === 'notification_digest') {
+      // A coalesced burst: `count` notifications, the latest few included
+      prepend((message.notifications || []).map(toNotification).reverse())
+      unreadCount.value += message.count
     }
-  })
 
-  const unreadCount = computed(() => {
-    return notifications.value.filter(n => !n.read).length
+    // Keep only last 50 notifications
+    if (notifications.value.length > 50) {
+      notifications.value = notifications.value.slice(0, 50)
+    }
   })
 
-  const markAsRead = (notificationId: string) => {
+  const markAsRead = async (notificationId: number) => {
     const notification = notifications.value.find(n => n.id === notificationId)
     if (notification) {
       notification.read = true
     }
+    const response = await $api.post(`/notifications/${notificationId}/read/`)
+    unreadCount.value = response.data.unread_count
   }
 
-  const markAllAsRead = () => {
+  const markAllAsRead = async () => {
     notifications.value.forEach(n => n.read = true)
+    unreadCount.value = 0
+    await $api.post('/notifications/read-all/')
   }
 
-  const removeNotification = (notificationId: string) => {
+  const removeNotification = (notificationId: number) => {
     const index = notifications.value.findIndex(n => n.id === notificationId)
     if (index > -1) {
       notifications.value.splice(index, 1)
@@ -1,10 +1,14 @@
-import { ref, onUnmounted, computed } from 'vue'
+import { ref, onUnmounted } from 'vue'
 import { useAuthStore } from '~/stores/auth'
 
 interface WebSocketMessage {
   type: string
   message?: string
   timestamp?: string
+  // Per-group sequence number stamped by the server; frames covering a
+  // range (digests) also carry seq_start
+  seq?: number
+  seq_start?: number
   [key: string]: any
 }
 
@@ -32,14 +36,110 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
   const connectionError = ref<string | null>(null)
 
   let reconnectAttempts = 0
+  // Seconds the server asked us to wait before reconnecting (busy handshake)
+  let retryAfter: number | null = null
   let heartbeatTimer: NodeJS.Timeout | null = null
   let reconnectTimer: NodeJS.Timeout | null = null
 
-  const wsUrl = computed(() => {
+  // Highest sequence number applied. Sent as ?after= on reconnect and in
+  // 'resume' requests so the server replays only the missing range.
+  let lastSeq: number | null = null
+  let resuming = false
+  let held: WebSocketMessage[] = []
+  const listeners = new Set<(message: WebSocketMessage) => void>()
+
+  const buildUrl = () => {
     const baseUrl = config.public.apiBaseUrl.replace('http', 'ws')
     const token = useCookie('access_token').value
-    return `${baseUrl.replace('/api', '')}/${url}?token=${token}`
-  })
+    const after = lastSeq !== null ? `&after=${lastSeq}` : ''
+    return `${baseUrl.replace('/api', '')}/${url}?token=${token}${after}`
+  }
+
+  const deliver = (message: WebSocketMessage) => {
+    lastMessage.value = message
+    messages.value.push(message)
+
+    // Keep only last 100 messages in memory
+    if (messages.value.length > 100) {
+      messages.value = messages.value.slice(-100)
+    }
+    listeners.forEach(listener => listener(message))
+  }
+
+  const drainHeld = () => {
+    const queued = held.sort((a, b) => (a.seq as number) - (b.seq as number))
+    held = []
+    queued.forEach(receive)
+  }
+
+  const receive = (message: WebSocketMessage) => {
+    if (message.type === 'heartbeat') {
+      // The server closes sockets that stop answering its heartbeats
+      send({ type: 'heartbeat_ack' })
+      return
+    }
+
+    if (message.type === 'retry_later') {
+      // Followed by close code 1013; reconnect after the suggested delay
+      retryAfter = message.retry_after
+      return
+    }
+
+    if (message.type === 'connection_established') {
+      // A resumed connection replays from our lastSeq; otherwise the
+      // frame carries fresh state that starts at message.seq
+      if (!message.resumed) lastSeq = message.seq ?? null
+      resuming = false
+      held = []
+      deliver(message)
+      return
+    }
+
+    if (message.type === 'resync_required') {
+      // The missed range is gone; the listener refetches state
+      lastSeq = message.seq ?? null
+      resuming = false
+      deliver(message)
+      drainHeld()
+      return
+    }
+
+    if (message.type === 'resume_complete') {
+      resuming = false
+      drainHeld()
+      return
+    }
+
+    if (typeof message.seq !== 'number') {
+      deliver(message)
+      return
+    }
+
+    if (resuming) {
+      held.push(message)
+      return
+    }
+
+    // Already applied (replay overlapping live delivery)
+    if (lastSeq !== null && message.seq <= lastSeq) return
+
+    const start = message.seq_start ?? message.seq
+    if (lastSeq !== null && start > lastSeq + 1) {
+      // Gap: hold this frame and ask for the missing range
+      resuming = true
+      held.push(message)
+      send({ type: 'resume', after: lastSeq })
+      return
+    }
+
+    lastSeq = message.seq
+    deliver(message)
+  }
+
+  const onMessage = (listener: (message: WebSocketMessage) => void) => {
+    listeners.add(listener)
+    return () => listeners.delete(listener)
+  }
 
   const connect = () => {
     if (isConnecting.value || isConnected.value) return
@@ -53,7 +153,7 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
       isConnecting.value = true
       connectionError.value = null
 
-      ws.value = new WebSocket(wsUrl.value)
+      ws.value = new WebSocket(buildUrl())
 
       ws.value.onopen = () => {
         isConnected.value = true
@@ -66,14 +166,7 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
 
       ws.value.onmessage = (event) => {
         try {
-          const message: WebSocketMessage = JSON.parse(event.data)
-          lastMessage.value = message
-          messages.value.push(message)
-          
-          // Keep only last 100 messages in memory
-          if (messages.value.length > 100) {
-            messages.value = messages.value.slice(-100)
-          }
+          receive(JSON.parse(event.data))
         } catch (error) {
           console.error('Failed to parse WebSocket message:', error)
         }
@@ -82,6 +175,7 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
       ws.value.onclose = (event) => {
         isConnected.value = false
         isConnecting.value = false
+        resuming = false
         stopHeartbeat()
 
         if (event.code !== 1000) { // Not a normal closure
@@ -133,17 +227,31 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
   }
 
   const attemptReconnect = () => {
+    if (retryAfter !== null) {
+      // The server was busy: its delay is already jittered, and being
+      // turned away does not count as a failed attempt
+      const delay = retryAfter * 1000
+      retryAfter = null
+      console.log(`Server busy, reconnecting in ${delay}ms`)
+      reconnectTimer = setTimeout(connect, delay)
+      return
+    }
+
     if (reconnectAttempts >= maxReconnectAttempts) {
       connectionError.value = `Max reconnection attempts (${maxReconnectAttempts}) reached`
       return
     }
 
     reconnectAttempts++
-    console.log(`Attempting to reconnect... (${reconnectAttempts}/${maxReconnectAttempts})`)
+    // Exponential backoff with jitter, so clients dropped together do not
+    // all come back at the same instant
+    const backoff = Math.min(reconnectInterval * 2 ** (reconnectAttempts - 1), 30000)
+    const delay = Math.round(backoff * (0.5 + Math.random()))
+    console.log(`Attempting to reconnect in ${delay}ms... (${reconnectAttempts}/${maxReconnectAttempts})`)
 
     reconnectTimer = setTimeout(() => {
       connect()
-    }, reconnectInterval)
+    }, delay)
   }
 
   const startHeartbeat = () => {
@@ -193,6 +301,7 @@ export const useWebSocket = (url: string, options: WebSocketOptions = {}) => {
     connect,
     disconnect,
     send,
+    onMessage,
     clearMessages
   }
 }
\ No newline at end of file
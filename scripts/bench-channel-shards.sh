@@ -0,0 +1,44 @@
+#!/bin/bash
+
+# Channel layer sharding benchmark
+# Starts local Redis instances and runs bench_channel_layer against
+# 1, 2 and 4 of them, appending one JSON report per run.
+# Usage: ./scripts/bench-channel-shards.sh [output-file]
+set -e
+
+OUTPUT=${1:-channel-shards.jsonl}
+BASE_PORT=${BENCH_REDIS_PORT:-6400}
+SHARD_COUNTS=${BENCH_SHARD_COUNTS:-"1 2 4"}
+MAX_SHARDS=$(echo $SHARD_COUNTS | tr ' ' '\n' | sort -n | tail -1)
+
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+print_status() {
+    echo -e "${GREEN}[INFO]${NC} $1"
+}
+
+cleanup() {
+    for i in $(seq 0 $((MAX_SHARDS - 1))); do
+        redis-cli -p $((BASE_PORT + i)) shutdown nosave >/dev/null 2>&1 || true
+    done
+}
+trap cleanup EXIT
+
+for i in $(seq 0 $((MAX_SHARDS - 1))); do
+    redis-server --port $((BASE_PORT + i)) --save "" --appendonly no --daemonize yes >/dev/null
+done
+sleep 1
+
+cd "$(dirname "$0")/../backend"
+
+for shards in $SHARD_COUNTS; do
+    hosts=""
+    for i in $(seq 0 $((shards - 1))); do
+        hosts="${hosts:+$hosts,}redis://127.0.0.1:$((BASE_PORT + i))/0"
+    done
+    print_status "Benchmarking $shards shard(s)"
+    python manage.py bench_channel_layer --hosts "$hosts" --label "shards-$shards" --output "$OUTPUT" "${@:2}"
+done
+
+print_status "Reports appended to backend/$OUTPUT"